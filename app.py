@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for, Response, stream_with_context
 try:
     from flask_cors import CORS
     CORS_AVAILABLE = True
@@ -15,7 +15,13 @@ import logging
 from typing import Dict, List, Any
 
 from config import Config
-from main import AnomalyDetectionFramework, LogPreprocessor
+from main import AnomalyDetectionFramework, LogPreprocessor, SCORE_HISTOGRAM_BINS
+from jobs import JobManager, AnalysisJob, JOB_COMPLETED
+from streaming import chunk_lines_for_budget
+from upload_stream import UploadManager, UPLOAD_RECEIVING
+from log_readers import strip_compression_suffix
+from log_parser import validate_log_patterns
+from profiler import MetricsRegistry, CAPTURE_MODES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,12 +37,40 @@ if CORS_AVAILABLE:
 # Ensure upload directory exists
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
-# Global variables to store current analysis results
-current_results = {}
-current_framework = None
+# Analyses run as background jobs; each job keeps its own framework and results
+job_manager = JobManager(
+    max_workers=Config.JOB_CONFIG['max_workers'],
+    max_pending=Config.JOB_CONFIG['max_pending'],
+    max_jobs=Config.JOB_CONFIG['max_jobs']
+)
+
+# Streaming uploads are parsed while they arrive, into per-user aggregates when streaming is enabled
+# and into the parse cache otherwise
+upload_manager = UploadManager(
+    Config.UPLOAD_FOLDER,
+    parser=None,  # Each upload parses with the current Config.LOG_PATTERNS
+    chunk_lines=chunk_lines_for_budget(Config.STREAMING_CONFIG['chunk_lines'], Config.STREAMING_CONFIG['memory_budget_mb']),
+    max_completed=Config.UPLOAD_STREAM_CONFIG['max_completed'],
+    session_timeout=Config.UPLOAD_STREAM_CONFIG['session_timeout']
+)
+
+# Per-stage profiles of the most recent analyses, exposed by /api/metrics
+metrics_registry = MetricsRegistry(max_runs=Config.PROFILING_CONFIG['max_runs'])
+
+# Upper bound on users returned by one /api/results page
+MAX_PAGE_SIZE = 1000
+
+# Server paths PUT /api/config cannot change (None locks the whole setting). Model bundles and
+# checkpoints are unpickled when loaded, so they must never point into a folder clients can write to
+READ_ONLY_SETTINGS = {
+    'upload_folder': None,
+    'model_config': {'bundle_path'},
+    'incremental_config': {'checkpoint_folder'}
+}
 
 def allowed_file(filename):
-    """Check if file extension is allowed"""
+    """Check if file extension is allowed (optionally followed by .gz, .bz2 or .zst)"""
+    filename = strip_compression_suffix(filename)
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
@@ -73,53 +107,276 @@ def upload_file():
         logger.error(f"Upload error: {str(e)}")
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+@app.route('/api/uploads', methods=['POST'])
+def start_upload():
+    """Start a chunked, resumable upload (plain, gzip or zstd) that is parsed while it is received"""
+    try:
+        data = request.get_json() or {}
+        filename = secure_filename(data.get('filename', ''))
+        
+        if not filename or not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type'}), 400
+        
+        session = upload_manager.create(filename)
+        return jsonify({**session.to_dict(), 'chunk_bytes': Config.UPLOAD_STREAM_CONFIG['chunk_bytes']}), 201
+        
+    except Exception as e:
+        logger.error(f"Upload error: {str(e)}")
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def handle_upload(upload_id):
+    """Get an upload's offset (to resume), append the next chunk at ?offset=, or abort it"""
+    session = upload_manager.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    if request.method == 'GET':
+        return jsonify(session.to_dict())
+    
+    if request.method == 'DELETE':
+        upload_manager.remove(upload_id)
+        return jsonify(session.to_dict())
+    
+    try:
+        offset = request.args.get('offset', type=int)
+        with session.lock:
+            if session.status != UPLOAD_RECEIVING:
+                return jsonify({'error': f'Upload is {session.status}', **session.to_dict()}), 409
+            if offset is not None and offset != session.received:
+                # The client resumes from the offset the server actually has
+                return jsonify({'error': 'Offset mismatch', **session.to_dict()}), 409
+            
+            read_bytes = Config.UPLOAD_STREAM_CONFIG['read_bytes']
+            for block in iter(lambda: request.stream.read(read_bytes), b''):
+                session.append(block)
+            
+            return jsonify(session.to_dict())
+        
+    except Exception as e:
+        logger.error(f"Upload error: {str(e)}")
+        with session.lock:
+            session.abort(str(e))
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 400
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finish an upload; its aggregates or cached parse are used by the next analysis of the file"""
+    session = upload_manager.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    try:
+        with session.lock:
+            if session.status != UPLOAD_RECEIVING:
+                return jsonify({'error': f'Upload is {session.status}', **session.to_dict()}), 409
+            session.finish()
+        
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'filepath': session.path,
+            **session.to_dict()
+        })
+        
+    except Exception as e:
+        logger.error(f"Upload error: {str(e)}")
+        with session.lock:
+            session.abort(str(e))
+        return jsonify({'error': f'Upload failed: {str(e)}'}), 400
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_logs():
-    """Analyze uploaded log files"""
-    global current_results, current_framework
-    
+    """Queue an analysis of uploaded log files as a background job"""
     try:
         data = request.get_json()
         files = data.get('files', [])
-        threshold = data.get('threshold', Config.DEFAULT_THRESHOLD)
-        contamination = data.get('contamination', Config.DEFAULT_CONTAMINATION)
         
         if not files:
             return jsonify({'error': 'No files provided for analysis'}), 400
         
-        # Create file paths
-        file_paths = [os.path.join(Config.UPLOAD_FOLDER, f) for f in files]
+        params = {
+            'file_paths': [os.path.join(Config.UPLOAD_FOLDER, f) for f in files],
+            # None lets the framework use the default of the run's mode
+            'threshold': data.get('threshold'),
+            'contamination': data.get('contamination', Config.DEFAULT_CONTAMINATION),
+            'incremental': data.get('incremental', False),
+            'retrain': data.get('retrain', False),
+            'score_only': data.get('score_only', False),
+            'windowed': data.get('windowed', False),
+            'window_seconds': data.get('window_seconds'),
+            'slide_seconds': data.get('slide_seconds'),
+            'save_model': data.get('save_model', True),
+            'profile': data.get('profile')
+        }
         
-        # Initialize framework
-        current_framework = AnomalyDetectionFramework(
-            threshold=threshold,
-            contamination=contamination
-        )
+        if params['profile'] is not None and params['profile'] not in CAPTURE_MODES:
+            return jsonify({'error': f"profile must be one of {', '.join(CAPTURE_MODES)}"}), 400
         
-        # Process logs
-        current_results = current_framework.process_logs(file_paths)
-        
-        if not current_results:
-            return jsonify({'error': 'No results generated'}), 500
-        
-        # Prepare response data
-        response_data = {
-            'total_users': len(current_results['classifications']),
-            'normal_users': len(current_results['normal_users']),
-            'abnormal_users': len(current_results['abnormal_users']),
-            'anomaly_rate': len(current_results['abnormal_users']) / len(current_results['classifications']) * 100,
-            'threshold': threshold,
-            'contamination': contamination,
-            'analysis_timestamp': datetime.now().isoformat()
-        }
+        if params['score_only'] and not os.path.exists(Config.MODEL_CONFIG['bundle_path']):
+            return jsonify({'error': 'No saved model available for score-only analysis'}), 404
         
-        return jsonify(response_data)
+        if params['windowed']:
+            if params['score_only'] or params['incremental']:
+                return jsonify({'error': 'windowed cannot be combined with score_only or incremental'}), 400
+            window_seconds = params['window_seconds'] or Config.WINDOW_CONFIG['window_seconds']
+            slide_seconds = params['slide_seconds'] or Config.WINDOW_CONFIG['slide_seconds'] or window_seconds
+            if not 0 < slide_seconds <= window_seconds:
+                return jsonify({'error': 'slide_seconds must be positive and at most window_seconds'}), 400
+            # The window model scores windows rather than whole histories, so it is not saved
+            params['save_model'] = False
+        
+        if params['score_only']:
+            stages = ['loading_model', 'preprocessing', 'feature_extraction', 'scoring', 'classification']
+        elif params['windowed']:
+            stages = ['preprocessing', 'feature_extraction', 'window_features', 'training', 'scoring',
+                      'classification']
+        else:
+            stages = ['preprocessing', 'feature_extraction', 'training', 'scoring', 'classification']
+            if params['save_model']:
+                stages.append('saving_model')
+        
+        job = job_manager.submit(run_analysis, params, stages)
+        if job is None:
+            return jsonify({'error': 'Too many analyses queued, try again later'}), 503
+        
+        return jsonify({'job_id': job.id, 'status': job.status}), 202
         
     except Exception as e:
         logger.error(f"Analysis error: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+def run_analysis(job: AnalysisJob) -> Dict[str, Any]:
+    """Run one analysis job; its framework and results stay attached to the job"""
+    params = job.params
+    framework = AnomalyDetectionFramework(
+        threshold=params['threshold'],
+        contamination=params['contamination']
+    )
+    framework.stage_callback = job.start_stage
+    framework.profile_capture = params['profile']
+    job.framework = framework
+    
+    # Process logs (incremental runs parse only what was appended since the last checkpoint;
+    # score-only runs use the saved model bundle without fitting; windowed runs score every
+    # user in every time window; files sent through /api/uploads were already parsed while
+    # they were received, into aggregates that streaming runs use, or else into the parse
+    # cache that exact runs read)
+    aggregates = None
+    if Config.STREAMING_CONFIG['enabled']:
+        aggregates = upload_manager.completed_aggregates(params['file_paths'])
+    try:
+        if params['score_only']:
+            mode = 'score_only'
+            results = framework.score_logs(params['file_paths'], aggregates=aggregates)
+        elif params['incremental']:
+            mode = 'incremental'
+            results = framework.process_logs_incremental(params['file_paths'], retrain=params['retrain'])
+        elif params['windowed']:
+            mode = 'windowed'
+            results = framework.process_logs_windowed(params['file_paths'], window_seconds=params['window_seconds'],
+                                                      slide_seconds=params['slide_seconds'])
+        else:
+            mode = 'full'
+            results = framework.process_logs(params['file_paths'], aggregates=aggregates)
+    finally:
+        # Stops a capture left running by a run that failed or was cancelled
+        framework.stop_profile()
+    
+    if not results:
+        raise ValueError('No results generated')
+    
+    metrics_registry.record(job.id, results['profile'], {'mode': mode})
+    
+    if not params['score_only'] and params['save_model']:
+        job.start_stage('saving_model')
+        results['model'] = framework.save_model()
+    
+    # Summary returned with the job status
+    return {
+        'total_users': len(results['classifications']),
+        'normal_users': len(results['normal_users']),
+        'abnormal_users': len(results['abnormal_users']),
+        'anomaly_rate': len(results['abnormal_users']) / len(results['classifications']) * 100,
+        'threshold': results['threshold'],
+        'contamination': params['contamination'],
+        'parse_throughput': results['parse_throughput'],
+        'parse_cache': results['parse_cache'],
+        'feature_plan': results['feature_plan'],
+        'feature_source': results['feature_source'],
+        'incremental': results.get('incremental'),
+        'windows': window_summary(results.get('windows')),
+        'model': results.get('model'),
+        'profile': results['profile'],
+        'analysis_timestamp': datetime.now().isoformat()
+    }
+
+def window_summary(windows: Dict[str, Any]) -> Dict[str, Any]:
+    """Window settings and counts of a windowed run, without its feature rows"""
+    if windows is None:
+        return None
+    summary = {key: value for key, value in windows.items() if key not in ('features', 'anomaly_scores')}
+    summary['user_windows'] = len(windows['features'])
+    return summary
+
+def get_job_framework():
+    """Get the framework of the job named by ?job_id=, or of the latest completed job"""
+    job_id = request.args.get('job_id')
+    job = job_manager.get(job_id) if job_id else job_manager.latest_completed()
+    if job is None or job.status != JOB_COMPLETED:
+        return None
+    return job.framework
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def handle_job(job_id):
+    """Get a job's status, progress and stage timings, or cancel it (DELETE)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if request.method == 'DELETE':
+        job = job_manager.cancel(job_id)
+    
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/score', methods=['POST'])
+def score_users():
+    """Score one user or a micro-batch with the fitted (or saved) model"""
+    current_framework = get_job_framework()
+    
+    try:
+        data = request.get_json()
+        user_ids = data.get('user_ids', [])
+        feature_rows = data.get('features', [])
+        
+        if user_ids:
+            if not current_framework:
+                return jsonify({'error': 'No analysis performed yet'}), 404
+            scores = current_framework.score_users(user_ids)
+        elif feature_rows:
+            framework = current_framework or AnomalyDetectionFramework(
+                threshold=data.get('threshold', Config.DEFAULT_THRESHOLD)
+            )
+            if not framework.isolation_forest.is_fitted and not os.path.exists(Config.MODEL_CONFIG['bundle_path']):
+                return jsonify({'error': 'No fitted or saved model available'}), 404
+            scores = framework.score_feature_rows(feature_rows)
+        else:
+            return jsonify({'error': 'Provide user_ids or features to score'}), 400
+        
+        return jsonify({'scores': scores})
+        
+    except Exception as e:
+        logger.error(f"Scoring error: {str(e)}")
+        return jsonify({'error': f'Scoring failed: {str(e)}'}), 500
+
 @app.route('/api/generate-sample', methods=['POST'])
 def generate_sample_data():
     """Generate sample log data"""
@@ -127,16 +384,23 @@ def generate_sample_data():
         data = request.get_json()
         num_users = data.get('num_users', Config.DEFAULT_NUM_USERS)
         logs_per_user = data.get('logs_per_user', Config.DEFAULT_LOGS_PER_USER)
+        seed = data.get('seed')
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+            return jsonify({'error': 'seed must be a non-negative integer'}), 400
         
+        # Written to the upload folder so /api/analyze finds it by name
         preprocessor = LogPreprocessor()
         sample_files = preprocessor.create_sample_logs(
             num_users=num_users,
-            logs_per_user=logs_per_user
+            logs_per_user=logs_per_user,
+            output_path=os.path.join(Config.UPLOAD_FOLDER, 'sample_logs.txt'),
+            seed=seed
         )
         
         return jsonify({
             'message': 'Sample data generated successfully',
-            'files': sample_files,
+            'files': [os.path.basename(path) for path in sample_files],
+            'seed': seed,
             'num_users': num_users,
             'logs_per_user': logs_per_user
         })
@@ -145,15 +409,34 @@ def generate_sample_data():
         logger.error(f"Sample generation error: {str(e)}")
         return jsonify({'error': f'Sample generation failed: {str(e)}'}), 500
 
+def results_query_args() -> Dict[str, Any]:
+    """Read the filter and sort query parameters shared by the results endpoints"""
+    return {
+        'classification': request.args.get('classification') or None,
+        'min_score': request.args.get('min_score', type=float),
+        'max_score': request.args.get('max_score', type=float),
+        'sort': request.args.get('sort', 'score_desc')
+    }
+
 @app.route('/api/results')
 def get_results():
-    """Get current analysis results"""
-    global current_results
+    """Get one page of analysis results (?page=&page_size=&sort=&classification=&min_score=&max_score=)"""
+    current_framework = get_job_framework()
     
-    if not current_results:
+    if not current_framework:
         return jsonify({'error': 'No results available'}), 404
+    current_results = current_framework.results
     
     try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = request.args.get('page_size', Config.UI_CONFIG['max_display_users'], type=int)
+        page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+        include_logs = request.args.get('include_logs', 'true').lower() == 'true'
+        
+        total, positions = current_framework.query_users(
+            offset=(page - 1) * page_size, limit=page_size, **results_query_args()
+        )
+        
         # Prepare detailed results
         results_data = {
             'summary': {
@@ -162,24 +445,117 @@ def get_results():
                 'abnormal_users': len(current_results['abnormal_users']),
                 'anomaly_rate': len(current_results['abnormal_users']) / len(current_results['classifications']) * 100
             },
-            'users': []
+            'pagination': {
+                'page': page,
+                'page_size': page_size,
+                'total': total,
+                'pages': (total + page_size - 1) // page_size
+            },
+            'users': list(current_framework.iter_user_results(positions, include_logs=include_logs))
         }
         
-        # Add user details
-        for user_id in current_results['classifications']:
-            user_details = current_framework.get_user_details(user_id)
-            results_data['users'].append(user_details)
-        
         return jsonify(results_data)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Results retrieval error: {str(e)}")
         return jsonify({'error': f'Failed to retrieve results: {str(e)}'}), 500
 
+@app.route('/api/results/export')
+def export_results():
+    """Stream all (filtered, sorted) results as NDJSON, or as a chunked JSON array with ?format=json"""
+    current_framework = get_job_framework()
+    
+    if not current_framework:
+        return jsonify({'error': 'No results available'}), 404
+    
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        include_logs = request.args.get('include_logs', 'false').lower() == 'true'
+        _, positions = current_framework.query_users(**results_query_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    users = current_framework.iter_user_results(positions, include_logs=include_logs)
+    
+    def generate_ndjson():
+        for user in users:
+            yield json.dumps(user, default=str) + '\n'
+    
+    def generate_json():
+        yield '['
+        for index, user in enumerate(users):
+            yield (',' if index else '') + json.dumps(user, default=str)
+        yield ']'
+    
+    if export_format == 'json':
+        return Response(stream_with_context(generate_json()), mimetype='application/json')
+    if export_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return jsonify({'error': f'Unknown export format: {export_format}'}), 400
+
+@app.route('/api/top-anomalies')
+def get_top_anomalies():
+    """Get the k most anomalous users (?k=, default 10)"""
+    current_framework = get_job_framework()
+    
+    if not current_framework:
+        return jsonify({'error': 'No results available'}), 404
+    
+    k = request.args.get('k', 10, type=int)
+    if k is None or k < 0:
+        return jsonify({'error': 'k must be a non-negative integer'}), 400
+    
+    classifications = current_framework.results['classifications']
+    return jsonify({
+        'k': k,
+        'users': [
+            {'rank': rank, 'user_id': user_id, 'anomaly_score': score, 'classification': classifications[user_id]}
+            for rank, (user_id, score) in enumerate(current_framework.top_anomalies(k), start=1)
+        ]
+    })
+
+@app.route('/api/reclassify', methods=['POST'])
+def reclassify_users():
+    """Re-apply a new threshold or target anomaly rate to the current scores without re-running the analysis"""
+    current_framework = get_job_framework()
+    
+    if not current_framework:
+        return jsonify({'error': 'No results available'}), 404
+    
+    try:
+        data = request.get_json()
+        summary = current_framework.reclassify(
+            threshold=data.get('threshold'),
+            target_rate=data.get('target_rate')
+        )
+        return jsonify(summary)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Reclassification error: {str(e)}")
+        return jsonify({'error': f'Reclassification failed: {str(e)}'}), 500
+
+@app.route('/api/score-histogram')
+def get_score_histogram():
+    """Get the anomaly score histogram (?bins=, default 100) for previewing thresholds"""
+    current_framework = get_job_framework()
+    
+    if not current_framework:
+        return jsonify({'error': 'No results available'}), 404
+    
+    bins = request.args.get('bins', SCORE_HISTOGRAM_BINS, type=int)
+    if not 1 <= bins <= 10000:
+        return jsonify({'error': 'bins must be between 1 and 10000'}), 400
+    
+    return jsonify(current_framework.score_histogram(bins))
+
 @app.route('/api/user/<user_id>')
 def get_user_details(user_id):
     """Get detailed information about a specific user"""
-    global current_framework
+    current_framework = get_job_framework()
     
     if not current_framework:
         return jsonify({'error': 'No analysis performed yet'}), 404
@@ -195,6 +571,38 @@ def get_user_details(user_id):
         logger.error(f"User details error: {str(e)}")
         return jsonify({'error': f'Failed to get user details: {str(e)}'}), 500
 
+@app.route('/api/user/<user_id>/windows')
+def get_user_windows(user_id):
+    """Get a user's anomaly score in each time window of a windowed analysis"""
+    current_framework = get_job_framework()
+    
+    if not current_framework:
+        return jsonify({'error': 'No analysis performed yet'}), 404
+    if 'windows' not in current_framework.results:
+        return jsonify({'error': 'The analysis was not windowed'}), 404
+    
+    try:
+        series = current_framework.get_user_windows(user_id)
+        if not series:
+            return jsonify({'error': 'User not found'}), 404
+        
+        windows = current_framework.results['windows']
+        return jsonify({
+            'user_id': user_id,
+            'window_seconds': windows['window_seconds'],
+            'slide_seconds': windows['slide_seconds'],
+            'windows': series
+        })
+        
+    except Exception as e:
+        logger.error(f"User windows error: {str(e)}")
+        return jsonify({'error': f'Failed to get user windows: {str(e)}'}), 500
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Per-stage wall time, CPU time, peak RSS and rows of recent analyses (Prometheus text format)"""
+    return Response(metrics_registry.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/config', methods=['GET', 'PUT'])
 def handle_config():
     """Get or update configuration"""
@@ -204,8 +612,19 @@ def handle_config():
     elif request.method == 'PUT':
         try:
             config_updates = request.get_json()
+            for section, values in config_updates.items():
+                locked = READ_ONLY_SETTINGS.get(section.lower(), set())
+                if locked is None or (isinstance(values, dict) and locked & set(values)):
+                    return jsonify({'error': f'{section} paths cannot be changed through the API'}), 403
+            if 'log_patterns' in config_updates:
+                # Rejected before anything is applied; parsers pick up valid patterns on their next run
+                if not isinstance(config_updates['log_patterns'], dict):
+                    raise ValueError('log_patterns must map field names to patterns')
+                validate_log_patterns({**Config.LOG_PATTERNS, **config_updates['log_patterns']})
             Config.update_config(config_updates)
             return jsonify({'message': 'Configuration updated successfully'})
+        except ValueError as e:
+            return jsonify({'error': f'Invalid configuration: {str(e)}'}), 400
         except Exception as e:
             logger.error(f"Config update error: {str(e)}")
             return jsonify({'error': f'Configuration update failed: {str(e)}'}), 500
@@ -213,7 +632,7 @@ def handle_config():
 @app.route('/api/report')
 def generate_report():
     """Generate and return analysis report"""
-    global current_framework
+    current_framework = get_job_framework()
     
     if not current_framework:
         return jsonify({'error': 'No analysis performed yet'}), 404
@@ -229,7 +648,7 @@ def generate_report():
 @app.route('/api/download-report')
 def download_report():
     """Download analysis report as text file"""
-    global current_framework
+    current_framework = get_job_framework()
     
     if not current_framework:
         return jsonify({'error': 'No analysis performed yet'}), 404
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Tuple
+
+from feature_registry import FEATURE_COLUMNS, FeaturePlan, build_feature_plan
+from log_store import ColumnarLogStore, TIMESTAMP_MISSING, INT_MISSING
+
+
+def _segment_starts(group_codes: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the start index and length of each group's run in sorted group codes"""
+    counts = np.bincount(group_codes, minlength=n_groups)
+    starts = np.zeros(n_groups, dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return starts, counts
+
+
+def segment_reduce(ufunc: np.ufunc, values: np.ndarray, group_codes: np.ndarray,
+                   n_groups: int, empty_value: float = np.nan) -> np.ndarray:
+    """Reduce values over contiguous runs of sorted group codes (empty groups get empty_value)"""
+    result = np.full(n_groups, empty_value, dtype=np.float64)
+    if len(values) == 0:
+        return result
+
+    starts, counts = _segment_starts(group_codes, n_groups)
+    present = counts > 0
+    result[present] = ufunc.reduceat(values, starts[present])
+    return result
+
+
+def segment_sum(values: np.ndarray, group_codes: np.ndarray, n_groups: int) -> np.ndarray:
+    """Sum values over contiguous runs of sorted group codes.
+
+    Segments of equal length are gathered into one 2-D array and summed along
+    rows, so every segment is summed exactly like ndarray.sum() on its own slice
+    (NumPy's pairwise summation). This keeps the result bit-identical to the
+    per-user pandas path, which np.add.reduceat does not.
+    """
+    result = np.zeros(n_groups, dtype=np.float64)
+    if len(values) == 0:
+        return result
+
+    starts, counts = _segment_starts(group_codes, n_groups)
+    for length in np.unique(counts[counts > 0]):
+        groups = np.flatnonzero(counts == length)
+        rows = starts[groups][:, None] + np.arange(length)
+        result[groups] = values[rows].sum(axis=1)
+    return result
+
+
+def distinct_counts(group_codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Count distinct values per group"""
+    if len(values) == 0:
+        return np.zeros(n_groups, dtype=np.int64)
+
+    values = values.astype(np.int64)
+    low = values.min()
+    span = int(values.max() - low) + 1
+    keys = np.unique(group_codes.astype(np.int64) * span + (values - low))
+    return np.bincount(keys // span, minlength=n_groups)
+
+
+class BatchFeatureExtractor:
+    """Computes the per-user features for every user in one vectorized pass over a ColumnarLogStore"""
+
+    def extract(self, store: ColumnarLogStore, plan: FeaturePlan = None) -> pd.DataFrame:
+        """Extract the feature matrix for all users in the store (only the groups in plan)"""
+        if plan is None:
+            plan = build_feature_plan()
+        n_users = len(store)
+        columns = store.columns
+        user_codes = columns['user_id']
+        total = np.diff(store.user_offsets)
+        denominator = np.maximum(total, 1).astype(np.float64)
+
+        group_features = {
+            'volume': lambda: {'total_logs': total},
+            'time': lambda: self._time_features(columns, user_codes, total, denominator, n_users),
+            'action': lambda: self._action_features(store, user_codes, denominator, n_users),
+            'resource': lambda: self._resource_features(store, user_codes, denominator, n_users),
+            'status': lambda: self._status_features(columns, user_codes, denominator, n_users),
+            'response_time': lambda: self._response_time_features(columns, user_codes, n_users),
+            'ip': lambda: self._ip_features(columns, user_codes, denominator, n_users),
+            'session': lambda: self._session_features(columns, user_codes, total, n_users)
+        }
+        features: Dict[str, np.ndarray] = {}
+        for group in plan.group_names:
+            features.update(group_features[group]())
+
+        feature_df = pd.DataFrame({name: features[name] for name in FEATURE_COLUMNS if name in features})
+        feature_df['user_id'] = list(store)
+        return feature_df
+
+    def _time_features(self, columns, user_codes, total, denominator, n_users) -> Dict[str, np.ndarray]:
+        timestamps = columns['timestamp']
+        valid = timestamps != TIMESTAMP_MISSING
+        days = timestamps[valid] // 86400
+        hours = (timestamps[valid] // 3600) % 24
+        weekdays = (days + 3) % 7  # 1970-01-01 was a Thursday
+        valid_codes = user_codes[valid]
+
+        # A missing timestamp counts as one extra distinct "day" (NaT), as with pandas' unique()
+        has_missing = np.bincount(user_codes[~valid], minlength=n_users) > 0
+        unique_days = distinct_counts(valid_codes, days, n_users) + has_missing
+
+        night = np.bincount(valid_codes[(hours >= 22) | (hours <= 6)], minlength=n_users)
+        weekend = np.bincount(valid_codes[weekdays >= 5], minlength=n_users)
+
+        return {
+            'unique_days': unique_days,
+            'avg_logs_per_day': total / np.maximum(unique_days, 1),
+            'night_activity_ratio': night / denominator,
+            'weekend_activity_ratio': weekend / denominator
+        }
+
+    def _action_features(self, store, user_codes, denominator, n_users) -> Dict[str, np.ndarray]:
+        actions = store.columns['action']
+        vocab = store.vocabs['action']
+
+        def ratio(action: str) -> np.ndarray:
+            if action not in vocab:
+                return np.zeros(n_users)
+            return np.bincount(user_codes[actions == vocab.index(action)], minlength=n_users) / denominator
+
+        valid = actions >= 0
+        return {
+            'failed_login_ratio': ratio('FAILED_LOGIN'),
+            'delete_ratio': ratio('DELETE'),
+            'admin_action_ratio': ratio('POST'),
+            'unique_actions': distinct_counts(user_codes[valid], actions[valid], n_users)
+        }
+
+    def _resource_features(self, store, user_codes, denominator, n_users) -> Dict[str, np.ndarray]:
+        resources = store.columns['resource']
+        valid = resources >= 0
+        unique_resources = distinct_counts(user_codes[valid], resources[valid], n_users)
+
+        # Evaluate the substring test once per distinct resource, then look it up per row
+        is_admin = np.array(['/admin' in resource for resource in store.vocabs['resource']] + [False])
+        admin = np.bincount(user_codes[is_admin[resources]], minlength=n_users)
+
+        return {
+            'unique_resources': unique_resources,
+            'admin_access_ratio': admin / denominator,
+            'resource_diversity': unique_resources / denominator
+        }
+
+    def _status_features(self, columns, user_codes, denominator, n_users) -> Dict[str, np.ndarray]:
+        status = columns['status_code']
+        valid = status != INT_MISSING
+
+        return {
+            'error_rate': np.bincount(user_codes[valid & (status >= 400)], minlength=n_users) / denominator,
+            'success_rate': np.bincount(user_codes[valid & (status < 400)], minlength=n_users) / denominator,
+            'unique_status_codes': distinct_counts(user_codes[valid], status[valid], n_users)
+        }
+
+    def _response_time_features(self, columns, user_codes, n_users) -> Dict[str, np.ndarray]:
+        valid = columns['response_time'] != INT_MISSING
+        if not valid.any():
+            # extract_user_features omits these keys entirely when no response times exist
+            return {}
+
+        response_times = columns['response_time'][valid].astype(np.float64)
+        codes = user_codes[valid]
+        counts = np.bincount(codes, minlength=n_users)
+
+        mean = segment_sum(response_times, codes, n_users) / np.where(counts > 0, counts, np.nan)
+        squared_deviation = (mean[codes] - response_times) ** 2
+        variance = segment_sum(squared_deviation, codes, n_users) / np.where(counts > 1, counts - 1, np.nan)
+        slow = np.bincount(codes[response_times > 5000], minlength=n_users)
+
+        std = np.sqrt(variance)
+        # Users with a single response time have an undefined std, which the per-user path fills with 0
+        std[counts == 1] = 0.0
+
+        return {
+            'avg_response_time': mean,
+            'max_response_time': segment_reduce(np.maximum, response_times, codes, n_users),
+            'response_time_std': std,
+            'slow_requests_ratio': slow / np.where(counts > 0, counts, np.nan)
+        }
+
+    def _ip_features(self, columns, user_codes, denominator, n_users) -> Dict[str, np.ndarray]:
+        ips = columns['ip_address']
+        valid = ips >= 0
+        unique_ips = distinct_counts(user_codes[valid], ips[valid], n_users)
+
+        return {
+            'unique_ips': unique_ips,
+            'ip_diversity': unique_ips / denominator
+        }
+
+    def _session_features(self, columns, user_codes, total, n_users) -> Dict[str, np.ndarray]:
+        timestamps = columns['timestamp']
+        valid = timestamps != TIMESTAMP_MISSING
+        codes = user_codes[valid]
+        timestamps = timestamps[valid]
+
+        # Sort by user, then timestamp, and take gaps between consecutive events of the same user
+        order = np.lexsort((timestamps, codes))
+        codes = codes[order]
+        timestamps = timestamps[order]
+        same_user = codes[1:] == codes[:-1]
+        gaps = np.diff(timestamps)[same_user].astype(np.float64)
+        gap_codes = codes[1:][same_user]
+
+        gap_counts = np.bincount(gap_codes, minlength=n_users)
+        avg_gap = np.bincount(gap_codes, weights=gaps, minlength=n_users) / np.where(gap_counts > 0, gap_counts, np.nan)
+        max_gap = segment_reduce(np.maximum, gaps, gap_codes, n_users)
+
+        # Users with a single event (or without two timestamped events) get 0
+        avg_gap = np.where((total > 1) & (gap_counts > 0), avg_gap, 0.0)
+        max_gap = np.where((total > 1) & (gap_counts > 0), max_gap, 0.0)
+
+        return {
+            'avg_session_length': avg_gap,
+            'max_idle_time': max_gap
+        }
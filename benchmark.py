@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the User Behavior Anomaly Detection System
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import sklearn
+from sklearn.metrics import roc_auc_score
+
+from config import Config
+from log_generator import ANOMALY_PROFILES, SEEDED_END_TIME, SyntheticLogGenerator
+from main import LogPreprocessor, UserFeatureExtractor, ExtendedIsolationForest, AnomalyDetectionFramework
+from log_store import NUMERIC_COLUMNS
+from feature_matrix import FeatureMatrix
+from feature_registry import FEATURE_COLUMNS
+from streaming import StreamingFeatureAggregator
+
+# Stages faster than this in the baseline are too noisy to flag as regressions
+MIN_COMPARED_SECONDS = 0.05
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    """Call func and return its result with the elapsed wall time in seconds"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def compare_feature_frames(expected: pd.DataFrame, actual: pd.DataFrame) -> Dict[str, Any]:
+    """Compare two feature matrices column by column"""
+    same_layout = list(expected.columns) == list(actual.columns) and \
+        list(expected['user_id']) == list(actual['user_id'])
+    if not same_layout:
+        return {'same_layout': False, 'identical': False, 'max_abs_diff': None}
+
+    feature_columns = [col for col in expected.columns if col != 'user_id']
+    left = expected[feature_columns].to_numpy(dtype=np.float64)
+    right = actual[feature_columns].to_numpy(dtype=np.float64)
+    both_nan = np.isnan(left) & np.isnan(right)
+    diff = np.where(both_nan, 0.0, np.abs(left - right))
+
+    return {
+        'same_layout': True,
+        'identical': bool(np.array_equal(left, right, equal_nan=True)),
+        'max_abs_diff': float(np.nanmax(diff)) if diff.size else 0.0
+    }
+
+
+def benchmark_feature_extraction(num_users: int, logs_per_user: int) -> Dict[str, Any]:
+    """Compare per-user and batched feature extraction on generated sample logs"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        preprocessor = LogPreprocessor()
+        log_files = preprocessor.create_sample_logs(
+            num_users=num_users,
+            logs_per_user=logs_per_user,
+            output_path=os.path.join(tmp_dir, 'benchmark_logs.txt')
+        )
+        store = preprocessor.preprocess_log_files(log_files)
+
+        extractor = UserFeatureExtractor()
+        per_user_df, per_user_seconds = timed(extractor.extract_all_features, store, batched=False)
+        batched_df, batched_seconds = timed(extractor.extract_all_features, store, batched=True)
+
+    return {
+        'num_users': num_users,
+        'logs_per_user': logs_per_user,
+        'per_user_seconds': per_user_seconds,
+        'batched_seconds': batched_seconds,
+        'speedup': per_user_seconds / batched_seconds if batched_seconds > 0 else float('inf'),
+        **compare_feature_frames(per_user_df, batched_df)
+    }
+
+
+def benchmark_isolation_forest(num_users: int, logs_per_user: int, backends: List[str],
+                               seed: int) -> List[Dict[str, Any]]:
+    """Compare fit/score time and detection quality of the isolation forest backends.
+
+    Logs come from the seeded generator with every anomaly kind mixed in, and
+    the users it made anomalous are the ground truth (rather than a feature the
+    model itself sees).
+    """
+    generator = SyntheticLogGenerator(num_users=num_users, logs_per_user=logs_per_user, seed=seed,
+                                      anomaly_mix={kind: 1.0 for kind in ANOMALY_PROFILES})
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = os.path.join(tmp_dir, 'benchmark_logs.txt')
+        generator.write(log_file)
+        store = LogPreprocessor().preprocess_log_files([log_file])
+
+    extractor = UserFeatureExtractor()
+    feature_df = extractor.extract_all_features(store)
+    is_anomalous = feature_df['user_id'].isin(list(generator.anomalous_users())).to_numpy()
+
+    rows = []
+    for backend in backends:
+        forest = ExtendedIsolationForest(backend=backend)
+        _, fit_seconds = timed(forest.fit, feature_df, extractor.feature_names)
+        scores, score_seconds = timed(forest.predict_anomaly_scores, feature_df)
+
+        # Precision among the top-k scored users, with k the number of true anomalies
+        k = max(int(is_anomalous.sum()), 1)
+        top_k = np.argsort(-scores, kind='stable')[:k]
+        rows.append({
+            'num_users': num_users,
+            'backend': backend,
+            'fit_seconds': fit_seconds,
+            'score_seconds': score_seconds,
+            'roc_auc': float(roc_auc_score(is_anomalous, scores)) if 0 < is_anomalous.sum() < len(scores) else None,
+            'precision_at_k': float(is_anomalous[top_k].mean())
+        })
+    return rows
+
+
+def benchmark_feature_matrix(num_users: int, seed: int) -> List[Dict[str, Any]]:
+    """Peak memory and time of fit, score and predict from a feature frame vs one shared FeatureMatrix.
+
+    Features are random, since only the matrix size matters. Each frame call
+    builds and scales its own matrix; the shared matrix is built and scaled
+    once. Memory is the peak traced by tracemalloc on top of the frame.
+    """
+    rng = np.random.default_rng(seed)
+    feature_df = pd.DataFrame({name: rng.random(num_users) for name in FEATURE_COLUMNS})
+    feature_df['user_id'] = [f"user{code}" for code in range(num_users)]
+
+    def frame_path():
+        forest = ExtendedIsolationForest()
+        forest.fit(feature_df, FEATURE_COLUMNS)
+        return forest.predict_anomaly_scores(feature_df), forest.predict(feature_df)
+
+    def matrix_path():
+        forest = ExtendedIsolationForest()
+        features = FeatureMatrix.from_frame(feature_df, FEATURE_COLUMNS)
+        forest.fit(features)
+        return forest.predict_anomaly_scores(features), forest.predict(features)
+
+    rows = []
+    results = {}
+    for path, run in (('frame', frame_path), ('shared_matrix', matrix_path)):
+        tracemalloc.start()
+        (scores, labels), seconds = timed(run)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[path] = scores
+        rows.append({
+            'num_users': num_users,
+            'path': path,
+            'seconds': seconds,
+            'peak_mb': peak / 1024 / 1024,
+            'frame_mb': feature_df[FEATURE_COLUMNS].memory_usage(index=False).sum() / 1024 / 1024,
+            'anomalies': int((labels == -1).sum())
+        })
+    for row in rows:
+        row['same_scores'] = bool(np.array_equal(results['frame'], results[row['path']]))
+    return rows
+
+
+def random_feature_matrix(num_users: int, seed: int, spill_folder: str = None) -> FeatureMatrix:
+    """Random float32 features (log-normal total_logs) written block by block, without a feature frame"""
+    rng = np.random.default_rng(seed)
+    shape = (num_users, len(FEATURE_COLUMNS))
+    if spill_folder is None:
+        values = np.empty(shape, dtype=np.float32)
+    else:
+        with tempfile.TemporaryFile(dir=spill_folder) as spill_file:
+            values = np.memmap(spill_file, dtype=np.float32, mode='w+', shape=shape)
+    volume = FEATURE_COLUMNS.index('total_logs')
+    for start in range(0, num_users, 1 << 20):
+        block = values[start:start + (1 << 20)]
+        block[:] = rng.random(block.shape, dtype=np.float32)
+        block[:, volume] = np.floor(np.exp(rng.normal(3.0, 1.5, len(block))))
+    return FeatureMatrix(values, FEATURE_COLUMNS, pd.RangeIndex(num_users))
+
+
+def benchmark_training_sample(num_users: int, sample_size: int, seed: int, spill: bool) -> List[Dict[str, Any]]:
+    """Fit and batched scoring of every user, with the trees grown on all users vs a stratified sample.
+
+    Memory is the peak traced by tracemalloc while fitting and scoring; a
+    spilled (memory-mapped) matrix is not traced, only what is read from it.
+    """
+    rows = []
+    configured_size = Config.MODEL_CONFIG['training_sample_size']
+    for mode, size in (('full', None), ('sampled', sample_size)):
+        Config.MODEL_CONFIG['training_sample_size'] = size
+        with tempfile.TemporaryDirectory() as spill_folder:
+            features = random_feature_matrix(num_users, seed, spill_folder if spill else None)
+            forest = ExtendedIsolationForest(random_state=seed)
+            tracemalloc.start()
+            _, fit_seconds = timed(forest.fit, features)
+            scores, score_seconds = timed(forest.predict_anomaly_scores, features)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        rows.append({
+            'num_users': num_users,
+            'mode': mode,
+            'training_users': forest.training_users,
+            'fit_seconds': fit_seconds,
+            'score_seconds': score_seconds,
+            'peak_mb': peak / 1024 / 1024,
+            'matrix_mb': features.nbytes / 1024 / 1024,
+            'anomaly_rate': float((forest.predict(features) == -1).mean())
+        })
+        del features, scores
+    Config.MODEL_CONFIG['training_sample_size'] = configured_size
+    return rows
+
+
+def benchmark_user_lookup(num_users: int, logs_per_user: int) -> Dict[str, Any]:
+    """Time user details for every user (as /api/results does) and the report"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        framework = AnomalyDetectionFramework()
+        log_files = framework.preprocessor.create_sample_logs(
+            num_users=num_users,
+            logs_per_user=logs_per_user,
+            output_path=os.path.join(tmp_dir, 'benchmark_logs.txt')
+        )
+        framework.process_logs(log_files)
+        user_ids = list(framework.results['classifications'])
+
+        _, details_seconds = timed(lambda: [framework.get_user_details(user_id) for user_id in user_ids])
+        _, report_seconds = timed(framework.generate_report)
+
+    return {
+        'num_users': num_users,
+        'details_seconds': details_seconds,
+        'per_user_ms': details_seconds / max(len(user_ids), 1) * 1000,
+        'report_seconds': report_seconds
+    }
+
+
+def benchmark_pipeline(lines: int, logs_per_user: int, seed: int, streaming: bool) -> Dict[str, Any]:
+    """Generate lines seeded log lines and time each stage of a full pipeline run over them"""
+    num_users = max(lines // logs_per_user, 1)
+    generator = SyntheticLogGenerator(num_users=num_users, logs_per_user=logs_per_user, seed=seed,
+                                      end_time=SEEDED_END_TIME)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_file = os.path.join(tmp_dir, 'benchmark_logs.txt')
+        generated = generator.write(log_file)
+
+        framework = AnomalyDetectionFramework()
+        cache_config = Config.PARSE_CACHE_CONFIG
+        Config.PARSE_CACHE_CONFIG = {**cache_config, 'enabled': False}
+        try:
+            results = framework.process_logs([log_file], streaming=streaming)
+        finally:
+            Config.PARSE_CACHE_CONFIG = cache_config
+            framework.stop_profile()
+
+    profile = results['profile']
+    return {
+        'lines': generator.num_lines,
+        'users': num_users,
+        'streaming': streaming,
+        'end_time': generator.end_time.isoformat(),
+        'file_bytes': generated['bytes'],
+        'generate_seconds': generated['seconds'],
+        'wall_seconds': profile['wall_seconds'],
+        'peak_rss_bytes': profile['peak_rss_bytes'],
+        'stages': profile['stages']
+    }
+
+
+def high_cardinality_chunks(num_users: int, events_per_user: int, seed: int,
+                            chunk_lines: int = 1000000) -> Tuple[Dict[str, List[str]], List[Dict[str, np.ndarray]]]:
+    """Parsed log columns for long-lived accounts that touch many IPs, days and (Zipf-distributed) resources"""
+    rng = np.random.default_rng(seed)
+    num_ips, num_resources, num_days = 1 << 20, 100000, 3650
+    vocabs = {
+        'user_id': [f"svc{user:05d}" for user in range(num_users)],
+        'ip_address': [f"10.{ip >> 16}.{(ip >> 8) & 255}.{ip & 255}" for ip in range(num_ips)],
+        'action': ['GET', 'POST'],
+        'resource': [f"/api/item/{resource}" for resource in range(num_resources)]
+    }
+
+    chunks = []
+    total = num_users * events_per_user
+    for start in range(0, total, chunk_lines):
+        n = min(chunk_lines, total - start)
+        chunk = {name: np.zeros(n, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        chunk['user_id'] = (np.arange(start, start + n) % num_users).astype(np.int32)
+        # Each user draws from its own slice of a shared pool, so users overlap
+        chunk['ip_address'] = ((chunk['user_id'] * 7919 + rng.integers(0, num_ips // 4, n)) % num_ips).astype(np.int32)
+        chunk['resource'] = ((rng.zipf(1.2, n) - 1) % num_resources).astype(np.int32)
+        chunk['action'] = rng.integers(0, 2, n).astype(np.int32)
+        chunk['timestamp'] = rng.integers(0, num_days * 86400, n) + 1262304000
+        chunk['status_code'][:] = 200
+        chunk['response_time'][:] = rng.integers(10, 500, n)
+        chunks.append(chunk)
+    return vocabs, chunks
+
+
+def benchmark_distinct_sketches(num_users: int, events_per_user: int,
+                                seed: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Compare exact and sketched distinct counts and top resources: state size, fold time and error.
+
+    Returns one row per distinct-count feature, and one row for the heavy hitters.
+    """
+    vocabs, chunks = high_cardinality_chunks(num_users, events_per_user, seed)
+    frames = {}
+    runs = {}
+    for sketches in (False, True):
+        aggregates = StreamingFeatureAggregator(sketches=sketches)
+        aggregates.vocabs = {field: {value: code for code, value in enumerate(values)}
+                             for field, values in vocabs.items()}
+        _, fold_seconds = timed(lambda: [aggregates.fold(chunk) for chunk in chunks])
+        frames[sketches] = aggregates.to_frame()
+        runs[sketches] = (aggregates, fold_seconds)
+
+    rows = []
+    for feature, field in (('unique_days', 'days'), ('unique_resources', 'resources'), ('unique_ips', 'ips')):
+        exact = frames[False][feature].to_numpy(dtype=np.float64)
+        relative_error = np.abs(frames[True][feature].to_numpy(dtype=np.float64) - exact) / np.maximum(exact, 1)
+        rows.append({
+            'feature': feature,
+            'mean_distinct': float(exact.mean()),
+            'exact_bytes': runs[False][0].distinct[field].nbytes,
+            'sketch_bytes': runs[True][0].distinct[field].nbytes,
+            'mean_rel_error': float(relative_error.mean()),
+            'max_rel_error': float(relative_error.max())
+        })
+
+    # Heavy hitters: recall of each user's true top resources and undercount against the bound
+    sketched = runs[True][0]
+    users = np.concatenate([chunk['user_id'] for chunk in chunks]).astype(np.int64)
+    resources = np.concatenate([chunk['resource'] for chunk in chunks]).astype(np.int64)
+    keys, counts = np.unique((users << 32) | resources, return_counts=True)
+    k = sketched.top_resources.k
+    recalls, undercounts, bounds = [], [], []
+    for user in range(num_users):
+        mine = (keys >> 32) == user
+        true_counts = dict(zip((keys[mine] & 0xFFFFFFFF).tolist(), counts[mine].tolist()))
+        true_top = sorted(true_counts, key=true_counts.get, reverse=True)[:k]
+        summary = dict(sketched.top_resources.top(user))
+        recalls.append(len(set(true_top) & set(summary)) / len(true_top))
+        undercounts.append(max(true_counts[value] - count for value, count in summary.items()))
+        bounds.append(sketched.top_resources.error_bound(user))
+    heavy_hitters = {
+        'top_k': k,
+        'mean_recall': float(np.mean(recalls)),
+        'min_recall': float(np.min(recalls)),
+        'max_undercount': int(max(undercounts)),
+        'max_undercount_bound': int(max(bounds)),
+        'exact_bytes': runs[False][0].distinct['resources'].nbytes,
+        'sketch_bytes': sketched.top_resources.nbytes
+    }
+    for row in rows:
+        row.update({'exact_fold_seconds': runs[False][1], 'sketch_fold_seconds': runs[True][1]})
+    return rows, heavy_hitters
+
+
+def environment_info() -> Dict[str, Any]:
+    """Versions and hardware recorded with benchmark results so runs are comparable"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare_pipeline_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                             tolerance: float) -> List[Dict[str, Any]]:
+    """Compare stage wall times of runs with the same line count; slower by more than tolerance is a regression"""
+    baseline_runs = {(run['lines'], run['streaming']): run for run in baseline['runs']}
+    rows = []
+    for run in current['runs']:
+        old_run = baseline_runs.get((run['lines'], run['streaming']))
+        if old_run is None:
+            continue
+        stages = [(name, values['wall_seconds']) for name, values in run['stages'].items()]
+        stages.append(('total', run['wall_seconds']))
+        old_seconds_by_stage = {name: values['wall_seconds'] for name, values in old_run['stages'].items()}
+        old_seconds_by_stage['total'] = old_run['wall_seconds']
+
+        for name, seconds in stages:
+            old_seconds = old_seconds_by_stage.get(name)
+            if old_seconds is None:
+                continue
+            ratio = seconds / old_seconds if old_seconds > 0 else float('inf')
+            rows.append({
+                'lines': run['lines'],
+                'stage': name,
+                'baseline_seconds': old_seconds,
+                'seconds': seconds,
+                'ratio': ratio,
+                'regression': old_seconds >= MIN_COMPARED_SECONDS and ratio > 1 + tolerance
+            })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]) -> None:
+    """Print benchmark rows as an aligned text table"""
+    def fmt(value):
+        return f"{value:.4f}" if isinstance(value, float) else str(value)
+
+    widths = [max(len(col), *(len(fmt(row[col])) for row in rows)) for col in columns]
+    print('  '.join(col.ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(fmt(row[col]).ljust(width) for col, width in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UBADS benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    features_parser = subparsers.add_parser('features', help='Per-user vs batched feature extraction')
+    features_parser.add_argument('--users', type=int, nargs='+', default=[100, 1000, 5000])
+    features_parser.add_argument('--logs-per-user', type=int, default=50)
+
+    forest_parser = subparsers.add_parser('forest', help='sklearn vs native extended isolation forest')
+    forest_parser.add_argument('--users', type=int, nargs='+', default=[10000, 100000])
+    forest_parser.add_argument('--logs-per-user', type=int, default=10)
+    forest_parser.add_argument('--backends', nargs='+', default=['sklearn', 'native'])
+    forest_parser.add_argument('--seed', type=int, default=42)
+
+    lookup_parser = subparsers.add_parser('lookup', help='User details for all users and report generation')
+    lookup_parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 50000])
+    lookup_parser.add_argument('--logs-per-user', type=int, default=5)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help='Per-stage time and memory of the full pipeline, saved as JSON')
+    pipeline_parser.add_argument('--lines', type=int, nargs='+', default=[10000, 100000, 1000000])
+    pipeline_parser.add_argument('--logs-per-user', type=int, default=100)
+    pipeline_parser.add_argument('--seed', type=int, default=42)
+    pipeline_parser.add_argument('--streaming', action='store_true', help='Fold lines into per-user aggregates '
+                                 '(needed for 10^7 lines and more)')
+    pipeline_parser.add_argument('--output', help='Results file (default: benchmark_results/pipeline-<time>.json)')
+    pipeline_parser.add_argument('--compare', help='Earlier results file to compare stage times against')
+    pipeline_parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a stage '
+                                 'counts as a regression')
+
+    matrix_parser = subparsers.add_parser('matrix', help='Fit/score/predict memory: feature frame vs shared float32 matrix')
+    matrix_parser.add_argument('--users', type=int, nargs='+', default=[100000, 1000000])
+    matrix_parser.add_argument('--seed', type=int, default=42)
+
+    training_parser = subparsers.add_parser('training', help='Fit on all users vs a stratified sample, scoring everyone in batches')
+    training_parser.add_argument('--users', type=int, nargs='+', default=[100000, 1000000])
+    training_parser.add_argument('--sample-size', type=int, default=100000)
+    training_parser.add_argument('--spill', action='store_true', help='Memory-map the feature matrix from a temporary file')
+    training_parser.add_argument('--seed', type=int, default=42)
+
+    sketches_parser = subparsers.add_parser('sketches', help='Exact vs HyperLogLog / heavy-hitter distinct features')
+    sketches_parser.add_argument('--users', type=int, default=200)
+    sketches_parser.add_argument('--events-per-user', type=int, default=20000)
+    sketches_parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.command == 'features':
+        rows = [benchmark_feature_extraction(num_users, args.logs_per_user) for num_users in args.users]
+        print_table(rows, ['num_users', 'logs_per_user', 'per_user_seconds', 'batched_seconds',
+                           'speedup', 'identical', 'max_abs_diff'])
+    elif args.command == 'forest':
+        rows = [row for num_users in args.users
+                for row in benchmark_isolation_forest(num_users, args.logs_per_user, args.backends, args.seed)]
+        print_table(rows, ['num_users', 'backend', 'fit_seconds', 'score_seconds', 'roc_auc', 'precision_at_k'])
+    elif args.command == 'lookup':
+        rows = [benchmark_user_lookup(num_users, args.logs_per_user) for num_users in args.users]
+        print_table(rows, ['num_users', 'details_seconds', 'per_user_ms', 'report_seconds'])
+    elif args.command == 'matrix':
+        rows = [row for users in args.users for row in benchmark_feature_matrix(users, args.seed)]
+        print_table(rows, ['num_users', 'path', 'seconds', 'peak_mb', 'frame_mb', 'anomalies', 'same_scores'])
+    elif args.command == 'training':
+        rows = [row for users in args.users
+                for row in benchmark_training_sample(users, args.sample_size, args.seed, args.spill)]
+        print_table(rows, ['num_users', 'mode', 'training_users', 'fit_seconds', 'score_seconds',
+                           'peak_mb', 'matrix_mb', 'anomaly_rate'])
+    elif args.command == 'sketches':
+        rows, heavy_hitters = benchmark_distinct_sketches(args.users, args.events_per_user, args.seed)
+        print_table(rows, ['feature', 'mean_distinct', 'exact_bytes', 'sketch_bytes', 'mean_rel_error',
+                           'max_rel_error', 'exact_fold_seconds', 'sketch_fold_seconds'])
+        print()
+        print_table([heavy_hitters], ['top_k', 'mean_recall', 'min_recall', 'max_undercount',
+                                      'max_undercount_bound', 'exact_bytes', 'sketch_bytes'])
+    elif args.command == 'pipeline':
+        runs = [benchmark_pipeline(lines, args.logs_per_user, args.seed, args.streaming) for lines in args.lines]
+        results = {
+            'created_at': datetime.now().isoformat(),
+            'environment': environment_info(),
+            'settings': {'logs_per_user': args.logs_per_user, 'seed': args.seed, 'streaming': args.streaming,
+                         'end_time': SEEDED_END_TIME.isoformat()},
+            'runs': runs
+        }
+        output = args.output or os.path.join(
+            'benchmark_results', f"pipeline-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        rows = [
+            {'lines': run['lines'], 'stage': name, 'rows': values['rows'], 'wall_seconds': values['wall_seconds'],
+             'cpu_seconds': values['cpu_seconds'], 'rss_growth_mb': values['rss_growth_bytes'] / 2 ** 20}
+            for run in runs for name, values in run['stages'].items()
+        ]
+        print_table(rows, ['lines', 'stage', 'rows', 'wall_seconds', 'cpu_seconds', 'rss_growth_mb'])
+        print(f"Results saved to {output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+            rows = compare_pipeline_results(baseline, results, args.tolerance)
+            if rows:
+                print_table(rows, ['lines', 'stage', 'baseline_seconds', 'seconds', 'ratio', 'regression'])
+            else:
+                print('No runs with matching line counts to compare')
+            if any(row['regression'] for row in rows):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,89 @@ class Config:
     # File Upload Configuration
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'txt', 'log', 'csv'}
+    ALLOWED_EXTENSIONS = {'txt', 'log', 'csv', 'jsonl', 'ndjson'}  # Also accepted with .gz, .bz2 or .zst
+    
+    # Log Ingestion Configuration
+    INGESTION_CONFIG = {
+        'parallel': False,  # Parse newline-aligned file chunks in a process pool
+        'workers': None,  # None uses all CPU cores
+        'chunk_size': 64 * 1024 * 1024  # 64MB per chunk
+    }
+    
+    # Parsed Log Cache Configuration
+    PARSE_CACHE_CONFIG = {
+        'enabled': True,
+        'uploads_only': True,  # Only cache files directly in UPLOAD_FOLDER
+        'cache_folder': os.path.join(UPLOAD_FOLDER, '.parse_cache'),
+        'max_bytes': 1024 * 1024 * 1024  # Least recently used entries are evicted beyond 1GB
+    }
+    
+    # Pipeline Profiling Configuration
+    PROFILING_CONFIG = {
+        'max_runs': 20,  # Runs exposed by /api/metrics
+        'top_functions': 25,  # Functions listed in a cProfile capture
+        'top_allocations': 10  # Allocation sites listed in a tracemalloc capture
+    }
+    
+    # Synthetic Log Generator Configuration
+    GENERATOR_CONFIG = {
+        'anomaly_ratio': 0.1,  # Share of anomalous users
+        'anomaly_line_rate': 0.3,  # Share of an anomalous user's lines that behave anomalously
+        'anomaly_mix': {'mixed': 1.0},  # Weights of the kinds in log_generator.ANOMALY_PROFILES
+        'days': 30,  # Timestamps fall in the last 30 days
+        'chunk_lines': 1000000  # Lines generated and written at a time
+    }
+    
+    # Streaming Upload Configuration
+    UPLOAD_STREAM_CONFIG = {
+        'chunk_bytes': 8 * 1024 * 1024,  # Size of each upload request sent by the dashboard (below MAX_CONTENT_LENGTH)
+        'read_bytes': 1024 * 1024,  # Request body bytes decompressed and parsed at a time
+        'max_completed': 8,  # Completed uploads whose parsed aggregates are kept for /api/analyze
+        'session_timeout': 3600  # Seconds without data before an unfinished upload is dropped
+    }
+    
+    # Streaming Pipeline Configuration
+    STREAMING_CONFIG = {
+        'enabled': False,  # Fold log chunks into per-user aggregates instead of keeping every line
+        'chunk_lines': 100000,
+        'memory_budget_mb': 256  # Caps the chunk size; a warning is logged if aggregates exceed it
+    }
+    
+    # Windowed Detection Configuration
+    WINDOW_CONFIG = {
+        'window_seconds': 86400,  # Length of each time window
+        'slide_seconds': 3600,  # Window start spacing; equal to window_seconds (or None) for tumbling windows
+        'threshold': 0.85  # Default threshold of windowed runs; a user's peak over many windows runs high
+    }
+    
+    # Background Job Configuration
+    JOB_CONFIG = {
+        'max_workers': 2,  # Analyses running at the same time
+        'max_pending': 16,  # Queued analyses before /api/analyze answers 503
+        'max_jobs': 50  # Finished jobs (and their results) kept in memory
+    }
+    
+    # Model Persistence Configuration
+    MODEL_CONFIG = {
+        'bundle_path': os.path.join('models', 'model_bundle.pkl'),  # Written after training, read by score-only runs
+        'score_normalization': 'training_range',  # 'training_range', 'quantile', 'path_length' or 'batch' (min-max over each scored batch)
+        'backend': 'sklearn',  # 'sklearn' (axis-parallel splits) or 'native' (NumPy extended forest, hyperplane splits)
+        'extension_level': None,  # Native backend: non-zero hyperplane coordinates minus one; None uses all features
+        'training_workers': 1,  # Native backend: processes growing trees (0 uses all CPU cores)
+        'training_sample_size': None,  # Fit on a random sample of at most this many users (None fits on all)
+        'training_stratify_by': 'total_logs',  # Feature whose log-scale bins the sample is stratified over (None samples uniformly)
+        'training_strata': 10,
+        'scoring_batch_size': 65536,  # Users scored per batch
+        'spill_threshold_users': None,  # Keep the feature matrix in a memory-mapped temporary file from this many users
+        'spill_folder': None  # Folder of the memory-mapped feature matrix (None uses the system temp folder)
+    }
+    
+    # Incremental Scoring Configuration
+    INCREMENTAL_CONFIG = {
+        'checkpoint_folder': 'checkpoints',
+        'drift_threshold': 0.5,  # Retrain when a feature mean moves this many training std devs
+        'max_new_user_ratio': 0.25  # Retrain when this share of users was unseen at training time
+    }
     
     # Anomaly Detection Configuration
     DEFAULT_THRESHOLD = 0.6
@@ -33,7 +115,12 @@ class Config:
         'status_based_features': True,
         'response_time_features': True,
         'ip_based_features': True,
-        'session_based_features': True
+        'session_based_features': True,
+        # Aggregated (streaming, upload and incremental) runs count unique days, resources and IPs with
+        # HyperLogLog and keep each user's top resources in a Misra-Gries summary
+        'distinct_sketches': False,
+        'sketch_precision': 12,  # 2^12 one-byte registers per large set: 1.6% standard error
+        'top_resources': 10  # Resources kept per user by the heavy-hitter summary
     }
     
     # Log Patterns Configuration
@@ -79,6 +166,9 @@ class Config:
         'notification_threshold': 0.8
     }
     
+    # Incremented by update_config
+    _version = 0
+    
     @classmethod
     def get_all_config(cls) -> Dict[str, Any]:
         """Get all configuration as a dictionary"""
@@ -104,6 +194,16 @@ class Config:
                 'default_num_users': cls.DEFAULT_NUM_USERS,
                 'default_logs_per_user': cls.DEFAULT_LOGS_PER_USER
             },
+            'ingestion_config': cls.INGESTION_CONFIG,
+            'parse_cache_config': cls.PARSE_CACHE_CONFIG,
+            'profiling_config': cls.PROFILING_CONFIG,
+            'generator_config': cls.GENERATOR_CONFIG,
+            'upload_stream_config': cls.UPLOAD_STREAM_CONFIG,
+            'streaming_config': cls.STREAMING_CONFIG,
+            'window_config': cls.WINDOW_CONFIG,
+            'job_config': cls.JOB_CONFIG,
+            'model_config': cls.MODEL_CONFIG,
+            'incremental_config': cls.INCREMENTAL_CONFIG,
             'feature_config': cls.FEATURE_CONFIG,
             'log_patterns': cls.LOG_PATTERNS,
             'ui_config': cls.UI_CONFIG,
@@ -112,13 +212,32 @@ class Config:
             'notification_config': cls.NOTIFICATION_CONFIG
         }
     
+    @classmethod
+    def validate_model_config(cls, model_config: Dict[str, Any]) -> None:
+        """Raise ValueError if the model settings cannot be used for training"""
+        sample_size = model_config.get('training_sample_size')
+        if sample_size is not None and (isinstance(sample_size, bool) or not isinstance(sample_size, int)
+                                        or sample_size < 1):
+            raise ValueError('training_sample_size must be None or a positive integer')
+        strata = model_config.get('training_strata')
+        if isinstance(strata, bool) or not isinstance(strata, int) or strata < 1:
+            raise ValueError('training_strata must be a positive integer')
+    
     @classmethod
     def update_config(cls, config_updates: Dict[str, Any]) -> None:
-        """Update configuration values"""
+        """Update configuration values (nothing is applied if the updated model settings are invalid)"""
+        if isinstance(config_updates.get('model_config'), dict):
+            cls.validate_model_config({**cls.MODEL_CONFIG, **config_updates['model_config']})
         for section, values in config_updates.items():
             if hasattr(cls, section.upper()):
                 section_attr = getattr(cls, section.upper())
                 if isinstance(section_attr, dict):
                     section_attr.update(values)
                 else:
-                    setattr(cls, section.upper(), values) 
\ No newline at end of file
+                    setattr(cls, section.upper(), values)
+        cls._version += 1
+    
+    @classmethod
+    def get_version(cls) -> int:
+        """Get a counter that changes with every update_config, e.g. to rebuild state derived from the config"""
+        return cls._version 
\ No newline at end of file
@@ -0,0 +1,203 @@
+import logging
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EULER_GAMMA = 0.5772156649015329
+# Gathered (sample, tree) hyperplane coordinates held at once while scoring (8MB of float64, so
+# the gathered normals stay in cache)
+SCORING_BATCH_ELEMENTS = 1024 * 1024
+
+
+def average_path_length(n) -> np.ndarray:
+    """Average path length of an unsuccessful binary search tree lookup among n points, c(n)"""
+    n = np.asarray(n, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    larger = n > 2
+    result[larger] = 2.0 * (np.log(n[larger] - 1.0) + EULER_GAMMA) - 2.0 * (n[larger] - 1.0) / n[larger]
+    return result
+
+
+def build_trees(samples: np.ndarray, seeds: List[int], extension_level: int) -> Dict[str, np.ndarray]:
+    """Grow one extended isolation tree per (sample, seed) pair into flat node arrays.
+
+    Each internal node splits on a random hyperplane x . normal <= threshold, where
+    normal has extension_level + 1 non-zero Gaussian coordinates and the hyperplane
+    passes through a uniform random point of the node's bounding box. Leaves store
+    their path length value depth + c(size). Child indices are -1 for leaves.
+    """
+    n_features = samples.shape[2]
+    max_depth = int(np.ceil(np.log2(max(samples.shape[1], 2))))
+    zeroed = n_features - extension_level - 1
+
+    normals: List[np.ndarray] = []
+    thresholds: List[float] = []
+    left: List[int] = []
+    right: List[int] = []
+    values: List[float] = []
+    roots = []
+
+    def new_node() -> int:
+        normals.append(None)
+        thresholds.append(0.0)
+        left.append(-1)
+        right.append(-1)
+        values.append(0.0)
+        return len(values) - 1
+
+    for sample, seed in zip(samples, seeds):
+        rng = np.random.default_rng(seed)
+        root = new_node()
+        roots.append(root)
+        stack = [(root, sample, 0)]
+
+        while stack:
+            node, data, depth = stack.pop()
+            if depth < max_depth and len(data) > 1:
+                low, high = data.min(axis=0), data.max(axis=0)
+            if depth >= max_depth or len(data) <= 1 or np.array_equal(low, high):
+                values[node] = depth + float(average_path_length(len(data)))
+                continue
+
+            normal = rng.standard_normal(n_features)
+            if zeroed > 0:
+                normal[rng.choice(n_features, zeroed, replace=False)] = 0.0
+            point = rng.uniform(low, high)
+            threshold = float(point @ normal)
+            goes_left = data @ normal <= threshold
+
+            normals[node] = normal
+            thresholds[node] = threshold
+            left[node] = new_node()
+            right[node] = new_node()
+            stack.append((left[node], data[goes_left], depth + 1))
+            stack.append((right[node], data[~goes_left], depth + 1))
+
+    zero = np.zeros(n_features)
+    return {
+        'normals': np.array([zero if normal is None else normal for normal in normals]),
+        'thresholds': np.array(thresholds),
+        'left': np.array(left, dtype=np.int64),
+        'right': np.array(right, dtype=np.int64),
+        'values': np.array(values),
+        'roots': np.array(roots, dtype=np.int64)
+    }
+
+
+class HyperplaneIsolationForest:
+    """Extended isolation forest (random hyperplane splits) on flat NumPy arrays.
+
+    Follows the scikit-learn IsolationForest conventions: score_samples is the
+    negated anomaly score, decision_function subtracts the contamination offset
+    and predict returns -1 for anomalies and 1 for normal samples.
+    """
+
+    def __init__(self, n_estimators: int = 100, max_samples: int = 256, contamination: float = 0.1,
+                 extension_level: Optional[int] = None, n_jobs: int = 1, random_state: Optional[int] = None):
+        self.n_estimators = n_estimators
+        self.max_samples = max_samples
+        self.contamination = contamination
+        self.extension_level = extension_level
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X: np.ndarray) -> 'HyperplaneIsolationForest':
+        """Grow the trees on subsamples of X"""
+        # float32 feature matrices are not copied; only the subsamples are converted to float64
+        X = np.asarray(X)
+        n_samples, n_features = X.shape
+        self.n_features_in_ = n_features
+        self.max_samples_ = min(self.max_samples, n_samples)
+        self.max_depth_ = int(np.ceil(np.log2(max(self.max_samples_, 2))))
+        extension_level = n_features - 1 if self.extension_level is None else self.extension_level
+        if not 0 <= extension_level < n_features:
+            raise ValueError(f"extension_level must be between 0 and {n_features - 1}")
+
+        # Every tree gets its own seed, so the forest does not depend on the number of workers
+        seed_sequences = np.random.SeedSequence(self.random_state).spawn(self.n_estimators)
+        seeds = [int(sequence.generate_state(1)[0]) for sequence in seed_sequences]
+        samples = np.stack([
+            X[np.random.default_rng(seed).choice(n_samples, self.max_samples_, replace=False)]
+            for seed in seeds
+        ]).astype(np.float64, copy=False)
+
+        workers = min(self.n_jobs if self.n_jobs > 0 else (os.cpu_count() or 1), self.n_estimators)
+        if workers <= 1:
+            parts = [build_trees(samples, seeds, extension_level)]
+        else:
+            bounds = np.linspace(0, self.n_estimators, workers + 1).astype(int)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(build_trees, samples[start:stop], seeds[start:stop], extension_level)
+                    for start, stop in zip(bounds[:-1], bounds[1:])
+                ]
+                parts = [future.result() for future in futures]
+        self._concat_trees(parts)
+
+        self.offset_ = float(np.percentile(self.score_samples(X), 100.0 * self.contamination))
+        return self
+
+    def _concat_trees(self, parts: List[Dict[str, np.ndarray]]) -> None:
+        """Join the flat node arrays of several tree batches, shifting their node indices"""
+        bases = np.cumsum([0] + [len(part['values']) for part in parts[:-1]])
+        for name in ('left', 'right'):
+            setattr(self, name, np.concatenate([
+                np.where(part[name] >= 0, part[name] + base, -1) for part, base in zip(parts, bases)
+            ]))
+        self.roots = np.concatenate([part['roots'] + base for part, base in zip(parts, bases)])
+        self.normals = np.concatenate([part['normals'] for part in parts])
+        self.thresholds = np.concatenate([part['thresholds'] for part in parts])
+        self.values = np.concatenate([part['values'] for part in parts])
+
+    def path_lengths(self, X: np.ndarray) -> np.ndarray:
+        """Mean path length of each sample over all trees.
+
+        All (sample, tree) pairs of a batch descend one level per step: the
+        hyperplane of each pair's current node is gathered and the sample is
+        projected onto it, so a sample meets only max_depth nodes per tree
+        rather than every node of the forest. Leaves have a zero normal and
+        threshold and point to themselves, so pairs that reach a leaf early
+        stay put.
+        """
+        X = np.asarray(X)
+        n_trees = len(self.roots)
+        n_nodes = len(self.values)
+        is_leaf = self.left < 0
+        # Column 0 is the left child, column 1 the right one
+        children = np.stack([
+            np.where(is_leaf, np.arange(n_nodes), self.left),
+            np.where(is_leaf, np.arange(n_nodes), self.right)
+        ], axis=1)
+
+        batch_size = max(1, SCORING_BATCH_ELEMENTS // max(n_trees * self.n_features_in_, 1))
+        result = np.empty(len(X))
+
+        for start in range(0, len(X), batch_size):
+            batch = X[start:start + batch_size].astype(np.float64, copy=False)
+            nodes = np.broadcast_to(self.roots, (len(batch), n_trees))
+            for _ in range(self.max_depth_):
+                goes_right = np.einsum('ijk,ik->ij', self.normals[nodes], batch) > self.thresholds[nodes]
+                nodes = children[nodes, goes_right.view(np.int8)]
+            result[start:start + len(batch)] = self.values[nodes].mean(axis=1)
+
+        return result
+
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        """Negated anomaly score 2^(-E[h(x)] / c(max_samples)); lower is more anomalous"""
+        return -np.power(2.0, -self.path_lengths(X) / max(float(average_path_length(self.max_samples_)), 1.0))
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        """Shifted score; negative values are anomalies"""
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict -1 for anomalies and 1 for normal samples"""
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.values)
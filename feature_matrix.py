@@ -0,0 +1,171 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from typing import List, Optional
+
+# Rows converted to float64 at a time when accumulating statistics
+STATS_BLOCK_ROWS = 65536
+
+
+class FeatureMatrix:
+    """Compact feature matrix: one contiguous float32 row per user and a separate user-id index.
+
+    Built once per run from a feature frame (missing values become 0), scaled in
+    place once, and then shared by fit, scoring and prediction without further
+    copies. Both isolation forest backends split on float32 values, so halving
+    the matrix loses nothing the model would have used. The raw path-length
+    scores of the last model that scored it are kept, so prediction after
+    scoring does not walk the trees again.
+
+    The values may be a memory-mapped temporary file rather than RAM (see
+    from_frame), in which case every pass over them goes block by block.
+    """
+
+    def __init__(self, values: np.ndarray, feature_names: List[str], user_ids):
+        if values.dtype != np.float32 or not values.flags['C_CONTIGUOUS']:
+            raise ValueError('Feature values must be a C-contiguous float32 array')
+        self.values = values
+        self.feature_names = list(feature_names)
+        self.user_ids = pd.Index(user_ids)
+        # The model whose scaler standardized the values, and its score_samples output
+        self.scaled_for = None
+        self.raw_scores: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_frame(cls, feature_df: pd.DataFrame, feature_names: List[str],
+                   spill_folder: str = None) -> 'FeatureMatrix':
+        """Copy the feature columns into a new matrix one column at a time (absent features are 0).
+
+        With spill_folder the values live in an anonymous temporary file there,
+        memory-mapped, so the OS pages them in and out instead of holding the
+        whole matrix in RAM. The file is removed when the matrix is released.
+        """
+        shape = (len(feature_df), len(feature_names))
+        if spill_folder is None:
+            values = np.zeros(shape, dtype=np.float32)
+        else:
+            # The mapping keeps the (already unlinked) file alive after it is closed
+            with tempfile.TemporaryFile(dir=spill_folder) as spill_file:
+                values = np.memmap(spill_file, dtype=np.float32, mode='w+', shape=shape)
+        for column, name in enumerate(feature_names):
+            if name in feature_df.columns:
+                values[:, column] = feature_df[name].to_numpy(dtype=np.float32, na_value=0.0)
+        user_ids = feature_df['user_id'] if 'user_id' in feature_df.columns else feature_df.index
+        return cls(values, feature_names, user_ids)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes)
+
+    @property
+    def spilled(self) -> bool:
+        return isinstance(self.values, np.memmap)
+
+    def blocks(self, block_rows: int = STATS_BLOCK_ROWS):
+        """Yield (start, values) for consecutive blocks of at most block_rows rows"""
+        for start in range(0, len(self.values), block_rows):
+            yield start, self.values[start:start + block_rows]
+
+    def fit_scaler(self, scaler: StandardScaler) -> StandardScaler:
+        """Fit a StandardScaler to the values without copying them.
+
+        Means and variances are accumulated in float64 over blocks of rows (two
+        passes), which is what StandardScaler.fit would compute from a float64
+        copy of the whole matrix.
+        """
+        n_samples, n_features = self.values.shape
+        total = np.zeros(n_features)
+        for _, block in self.blocks():
+            total += block.sum(axis=0, dtype=np.float64)
+        mean = total / max(n_samples, 1)
+
+        squared = np.zeros(n_features)
+        for _, block in self.blocks():
+            squared += ((block - mean) ** 2).sum(axis=0)
+        var = squared / max(n_samples, 1)
+
+        # Constant features keep a scale of 1, as in StandardScaler
+        scale = np.sqrt(var)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+
+        scaler.mean_ = mean
+        scaler.var_ = var
+        scaler.scale_ = scale
+        scaler.n_samples_seen_ = n_samples
+        scaler.n_features_in_ = n_features
+        scaler.feature_names_in_ = np.array(self.feature_names, dtype=object)
+        return scaler
+
+    def scale(self, scaler: StandardScaler, model=None) -> 'FeatureMatrix':
+        """Standardize the values in place with a fitted scaler; a matrix can be scaled only once"""
+        if self.scaled_for is not None:
+            raise ValueError('Feature matrix is already scaled')
+        mean = scaler.mean_.astype(np.float32)
+        scale = scaler.scale_.astype(np.float32)
+        for _, block in self.blocks():
+            block -= mean
+            block /= scale
+        self.scaled_for = model if model is not None else scaler
+        return self
+
+    def sample_rows(self, size: int, random_state=None, stratify_by: str = None,
+                    strata: int = 10) -> np.ndarray:
+        """Sorted indices of a random sample of size rows, drawn without replacement.
+
+        With stratify_by the rows are split into strata equal-width bins of the
+        log of that feature (e.g. total_logs, so the few heaviest users form
+        bins of their own) and every bin gets its proportional share of the
+        sample, but at least one row (taken from the largest shares). Only the
+        per-bin counts and the chosen indices are held in memory; the feature
+        is read block by block.
+        """
+        n_samples = len(self.values)
+        rng = np.random.default_rng(random_state)
+        if size >= n_samples:
+            return np.arange(n_samples)
+        if stratify_by is None:
+            return np.sort(rng.choice(n_samples, size, replace=False))
+
+        # Every non-empty bin gets a row, so there cannot be more bins than rows
+        strata = min(strata, size)
+        column = self.feature_names.index(stratify_by)
+        low, high = np.inf, -np.inf
+        for _, block in self.blocks():
+            keys = np.log1p(np.abs(block[:, column].astype(np.float64)))
+            low, high = min(low, keys.min()), max(high, keys.max())
+        width = (high - low) / strata or 1.0
+
+        def bins_of(block):
+            keys = np.log1p(np.abs(block[:, column].astype(np.float64)))
+            return np.minimum(((keys - low) / width).astype(np.int64), strata - 1)
+
+        counts = np.zeros(strata, dtype=np.int64)
+        for _, block in self.blocks():
+            counts += np.bincount(bins_of(block), minlength=strata)
+
+        # Proportional allocation (largest remainders), then the floor of one row per non-empty bin
+        shares = counts * size / n_samples
+        quotas = np.floor(shares).astype(np.int64)
+        quotas[np.argsort(quotas - shares)[:size - quotas.sum()]] += 1
+        quotas = np.minimum(np.maximum(quotas, counts > 0), counts)
+        for _ in range(quotas.sum() - size):
+            quotas[np.argmax(quotas)] -= 1
+        chosen = [np.sort(rng.choice(count, quota, replace=False)) for count, quota in zip(counts, quotas)]
+
+        # Map each bin's chosen ranks back to row indices in a second pass
+        seen = np.zeros(strata, dtype=np.int64)
+        rows = []
+        for start, block in self.blocks():
+            bins = bins_of(block)
+            for stratum in np.flatnonzero(quotas):
+                positions = np.flatnonzero(bins == stratum)
+                ranks = chosen[stratum]
+                first, last = np.searchsorted(ranks, [seen[stratum], seen[stratum] + len(positions)])
+                rows.append(start + positions[ranks[first:last] - seen[stratum]])
+                seen[stratum] += len(positions)
+        return np.sort(np.concatenate(rows))
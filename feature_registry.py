@@ -0,0 +1,104 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from log_parser import FIELD_LAYOUT
+
+
+class FeatureGroup:
+    """Features computed together from the same parsed fields.
+
+    config_key is the FEATURE_CONFIG flag that enables the group (None for
+    groups that are always on). cost is the rough relative work per log line,
+    used to report how much an execution plan saves.
+    """
+
+    def __init__(self, name: str, config_key: Optional[str], features: List[str],
+                 fields: Tuple[str, ...], cost: int):
+        self.name = name
+        self.config_key = config_key
+        self.features = features
+        self.fields = fields
+        self.cost = cost
+
+    def __repr__(self) -> str:
+        return f"FeatureGroup({self.name!r})"
+
+
+# In feature column order. Every group also reads user_id, which is always parsed.
+FEATURE_GROUPS = [
+    # Denominator of the ratios and needed by the model even with every flag off
+    FeatureGroup('volume', None, ['total_logs'], (), 0),
+    FeatureGroup('time', 'time_based_features',
+                 ['unique_days', 'avg_logs_per_day', 'night_activity_ratio', 'weekend_activity_ratio'],
+                 ('timestamp',), 3),
+    FeatureGroup('action', 'action_based_features',
+                 ['failed_login_ratio', 'delete_ratio', 'admin_action_ratio', 'unique_actions'],
+                 ('action',), 2),
+    FeatureGroup('resource', 'resource_based_features',
+                 ['unique_resources', 'admin_access_ratio', 'resource_diversity'],
+                 ('resource',), 2),
+    FeatureGroup('status', 'status_based_features',
+                 ['error_rate', 'success_rate', 'unique_status_codes'],
+                 ('status_code',), 2),
+    FeatureGroup('response_time', 'response_time_features',
+                 ['avg_response_time', 'max_response_time', 'response_time_std', 'slow_requests_ratio'],
+                 ('response_time',), 2),
+    FeatureGroup('ip', 'ip_based_features', ['unique_ips', 'ip_diversity'], ('ip_address',), 3),
+    # Sorts every user's lines by time
+    FeatureGroup('session', 'session_based_features', ['avg_session_length', 'max_idle_time'],
+                 ('timestamp',), 4)
+]
+FEATURE_COLUMNS = [feature for group in FEATURE_GROUPS for feature in group.features]
+
+
+class FeaturePlan:
+    """The feature groups of a run and the parsed fields they need"""
+
+    def __init__(self, groups: List[FeatureGroup], required_fields: Iterable[str] = ()):
+        self.groups = groups
+        self.group_names = [group.name for group in groups]
+        self.features = [feature for group in groups for feature in group.features]
+        needed = {'user_id', *required_fields, *(field for group in groups for field in group.fields)}
+        # Kept in FIELD_LAYOUT order so plans with the same fields compare (and hash) equal
+        self.fields = tuple(field for field in FIELD_LAYOUT if field in needed)
+        self.cost = sum(group.cost for group in groups)
+
+    def __contains__(self, group_name: str) -> bool:
+        return group_name in self.group_names
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FeaturePlan) and (self.group_names, self.fields) == (other.group_names, other.fields)
+
+    def __repr__(self) -> str:
+        return f"FeaturePlan({', '.join(self.group_names)})"
+
+    @property
+    def skipped_fields(self) -> List[str]:
+        return [field for field in FIELD_LAYOUT if field not in self.fields]
+
+    def describe(self) -> Dict[str, Any]:
+        """Summarize the plan, e.g. for the analysis results"""
+        full_cost = sum(group.cost for group in FEATURE_GROUPS)
+        return {
+            'groups': self.group_names,
+            'skipped_groups': [group.name for group in FEATURE_GROUPS if group.name not in self],
+            'features': len(self.features),
+            'parsed_fields': list(self.fields),
+            'skipped_fields': self.skipped_fields,
+            'relative_cost': self.cost / full_cost
+        }
+
+
+def build_feature_plan(feature_config: Dict[str, Any] = None, required_fields: Iterable[str] = ()) -> FeaturePlan:
+    """Plan the feature groups enabled in feature_config (Config.FEATURE_CONFIG by default).
+
+    required_fields are parsed even if no enabled group reads them (e.g. the
+    timestamps that windowed runs split lines by).
+    """
+    if feature_config is None:
+        feature_config = Config.FEATURE_CONFIG
+    groups = [
+        group for group in FEATURE_GROUPS
+        if group.config_key is None or feature_config.get(group.config_key, True)
+    ]
+    return FeaturePlan(groups, required_fields)
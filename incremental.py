@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from feature_matrix import FeatureMatrix
+from log_readers import detect_compression
+from streaming import StreamingFeatureAggregator
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 6
+# Bytes at the start of a file hashed to detect rotation or truncation
+HEAD_BYTES = 4096
+
+
+def checkpoint_key(log_files: List[str]) -> str:
+    """Get the checkpoint key for a set of log files"""
+    paths = sorted(os.path.abspath(log_file) for log_file in log_files)
+    return hashlib.sha1('\n'.join(paths).encode('utf-8')).hexdigest()[:16]
+
+
+def file_head_hash(log_file: str, length: int) -> str:
+    """Hash the first length bytes of a file"""
+    with open(log_file, 'rb') as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def feature_drift(features: FeatureMatrix) -> float:
+    """Largest absolute shift of a feature's mean, in training standard deviations.
+
+    features must be scaled by the model's scaler, which was fitted on the
+    training population, whose scaled means are 0.
+    """
+    if len(features) == 0:
+        return 0.0
+    return float(np.abs(features.values.mean(axis=0, dtype=np.float64)).max())
+
+
+class IncrementalCheckpoint:
+    """State carried between incremental runs over the same set of growing log files"""
+
+    def __init__(self, aggregates: StreamingFeatureAggregator, feature_df: pd.DataFrame,
+                 isolation_forest, trained_users: int):
+        self.version = CHECKPOINT_VERSION
+        self.aggregates = aggregates
+        self.feature_df = feature_df
+        self.isolation_forest = isolation_forest
+        self.trained_users = trained_users
+        self.head_hashes: Dict[str, str] = {}
+        self.saved_at = None
+
+    def record_file_heads(self) -> None:
+        """Remember a hash of each consumed file's head to detect rotation on the next run"""
+        self.head_hashes = {
+            log_file: file_head_hash(log_file, min(offset, HEAD_BYTES))
+            for log_file, offset in self.aggregates.file_offsets.items()
+        }
+
+    def files_unchanged(self) -> bool:
+        """Check that every checkpointed file still starts with the consumed bytes (was only appended to)"""
+        for log_file, offset in self.aggregates.file_offsets.items():
+            try:
+                # Offsets into compressed files count decompressed bytes, so only plain files are size-checked
+                if detect_compression(log_file) is None and os.path.getsize(log_file) < offset:
+                    logger.info(f"{log_file} was truncated since the last checkpoint")
+                    return False
+                if file_head_hash(log_file, min(offset, HEAD_BYTES)) != self.head_hashes.get(log_file):
+                    logger.info(f"{log_file} was rotated or rewritten since the last checkpoint")
+                    return False
+            except OSError:
+                logger.info(f"{log_file} is no longer readable")
+                return False
+        return True
+
+    @staticmethod
+    def path_for(log_files: List[str], checkpoint_folder: str) -> str:
+        return os.path.join(checkpoint_folder, f"incremental_{checkpoint_key(log_files)}.pkl")
+
+    def save(self, path: str) -> None:
+        """Write the checkpoint atomically"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.record_file_heads()
+        self.saved_at = datetime.now().isoformat()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['IncrementalCheckpoint']:
+        """Load a checkpoint, or None if missing, unreadable or from another version"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+            return None
+        if getattr(checkpoint, 'version', None) != CHECKPOINT_VERSION:
+            logger.info(f"Ignoring checkpoint {path} from another version")
+            return None
+        return checkpoint
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work when cancellation was requested"""
+
+
+class AnalysisJob:
+    """One background analysis: its parameters, per-stage progress and timing, and its own results"""
+
+    def __init__(self, params: Dict[str, Any], stages: List[str]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = JOB_QUEUED
+        self.expected_stages = list(stages)
+        self.stages: List[Dict[str, Any]] = []
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        # Objects kept for the job's follow-up requests (results, user details, reports)
+        self.framework = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self._stage_started = None
+        self._lock = threading.Lock()
+
+    def start_stage(self, name: str) -> None:
+        """Finish the current stage and start the next one; raises JobCancelled if cancellation was requested"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self._finish_stage()
+            self.stages.append({'name': name, 'status': JOB_RUNNING, 'seconds': None})
+            self._stage_started = time.perf_counter()
+
+    def _finish_stage(self, status: str = JOB_COMPLETED) -> None:
+        if self.stages and self.stages[-1]['status'] == JOB_RUNNING:
+            self.stages[-1]['status'] = status
+            self.stages[-1]['seconds'] = time.perf_counter() - self._stage_started
+
+    def finish(self, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._finish_stage(JOB_COMPLETED if status == JOB_COMPLETED else status)
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = datetime.now().isoformat()
+
+    @property
+    def progress(self) -> float:
+        """Share of the expected stages that have completed"""
+        if self.status == JOB_COMPLETED:
+            return 1.0
+        done = sum(1 for stage in self.stages if stage['status'] == JOB_COMPLETED)
+        return min(done / max(len(self.expected_stages), 1), 1.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = [dict(stage) for stage in self.stages]
+        if stages and stages[-1]['status'] == JOB_RUNNING:
+            stages[-1]['seconds'] = time.perf_counter() - self._stage_started
+
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'current_stage': stages[-1]['name'] if stages and self.status == JOB_RUNNING else None,
+            'stages': stages,
+            'expected_stages': self.expected_stages,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'result': self.result
+        }
+
+
+class JobManager:
+    """Runs analysis jobs on a bounded thread pool and keeps the most recent jobs"""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, max_jobs: int = 50):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.jobs: 'OrderedDict[str, AnalysisJob]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, work: Callable[[AnalysisJob], Any], params: Dict[str, Any], stages: List[str]) -> Optional[AnalysisJob]:
+        """Queue work(job) and return the job, or None if too many jobs are waiting"""
+        with self._lock:
+            pending = sum(1 for job in self.jobs.values() if job.status == JOB_QUEUED)
+            if pending >= self.max_pending:
+                return None
+            job = AnalysisJob(params, stages)
+            self.jobs[job.id] = job
+            self._prune()
+
+        job.future = self.executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: AnalysisJob, work: Callable[[AnalysisJob], Any]) -> None:
+        if job.cancel_event.is_set():
+            job.finish(JOB_CANCELLED)
+            return
+
+        job.status = JOB_RUNNING
+        job.started_at = datetime.now().isoformat()
+        try:
+            job.finish(JOB_COMPLETED, result=work(job))
+        except JobCancelled:
+            logger.info(f"Job {job.id} cancelled")
+            job.framework = None
+            job.finish(JOB_CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            job.framework = None
+            job.finish(JOB_FAILED, error=str(e))
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond max_jobs"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(len(self.jobs) - self.max_jobs, 0)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self.jobs.get(job_id)
+
+    def latest_completed(self) -> Optional[AnalysisJob]:
+        """Get the most recently finished successful job"""
+        completed = [job for job in self.jobs.values() if job.status == JOB_COMPLETED]
+        return max(completed, key=lambda job: job.finished_at) if completed else None
+
+    def cancel(self, job_id: str) -> Optional[AnalysisJob]:
+        """Request cancellation; queued jobs never start, running jobs stop at their next stage"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.finish(JOB_CANCELLED)
+        return job
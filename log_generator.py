@@ -0,0 +1,211 @@
+import gzip
+import logging
+import time
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Default end of a seeded generator's timestamps; the current time would shift every line's hour and weekday
+SEEDED_END_TIME = datetime(2025, 7, 1)
+
+# Behavior of normal lines and of each kind of anomalous user. Ranges are [low, high).
+NORMAL_PROFILE = {
+    'actions': ['GET', 'POST', 'PUT', 'DELETE', 'LOGIN'],
+    'resources': ['/api/data', '/login', '/dashboard', '/profile'],
+    'status_codes': [200, 201, 400],
+    'response_time': (100, 2000),
+    'ip_subnet': (1, 2),
+    'ip_host': (1, 100),
+    'night_only': False
+}
+ANOMALY_PROFILES = {
+    # The pattern of the original sample data: failed logins, sensitive resources, errors, very slow
+    'mixed': {
+        'actions': ['FAILED_LOGIN', 'DELETE', 'GET'],
+        'resources': ['/admin', '/sensitive', '/api/data'],
+        'status_codes': [401, 403, 404, 500],
+        'response_time': (5000, 15000),
+        'ip_subnet': (100, 200),
+        'ip_host': (1, 255),
+        'night_only': False
+    },
+    'brute_force': {
+        **NORMAL_PROFILE,
+        'actions': ['FAILED_LOGIN', 'LOGIN'],
+        'resources': ['/login'],
+        'status_codes': [401, 403],
+        'ip_subnet': (100, 200),
+        'ip_host': (1, 255)
+    },
+    'privilege_abuse': {
+        **NORMAL_PROFILE,
+        'actions': ['DELETE', 'PUT', 'POST'],
+        'resources': ['/admin', '/settings'],
+        'status_codes': [200, 403]
+    },
+    'slow_requests': {**NORMAL_PROFILE, 'response_time': (5000, 15000)},
+    'night_activity': {**NORMAL_PROFILE, 'night_only': True}
+}
+
+_TIME_OF_DAY = None
+
+
+def time_of_day_strings() -> List[str]:
+    """'HH:MM:SS' for every second of a day, built once"""
+    global _TIME_OF_DAY
+    if _TIME_OF_DAY is None:
+        _TIME_OF_DAY = [f"{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}" for second in range(86400)]
+    return _TIME_OF_DAY
+
+
+class SyntheticLogGenerator:
+    """Seeded, vectorized generator of synthetic user logs in the standard text layout.
+
+    Lines are grouped by user (user001, user002, ...) as in the original sample
+    data, and produced in chunks of chunk_lines lines so memory does not grow with
+    the output. A share anomaly_ratio of users is anomalous; each gets a kind drawn
+    from anomaly_mix (weights over ANOMALY_PROFILES), and each of their lines
+    follows that kind with probability anomaly_line_rate. Timestamps fall in the
+    days before end_time (SEEDED_END_TIME when a seed is given, otherwise now).
+    The same seed, end_time and chunk_lines give the same file; every chunk has
+    its own random stream derived from the seed.
+    """
+
+    def __init__(self, num_users: int = 50, logs_per_user: int = 100, seed: Optional[int] = None,
+                 anomaly_ratio: float = 0.1, anomaly_line_rate: float = 0.3,
+                 anomaly_mix: Optional[Dict[str, float]] = None, days: int = 30,
+                 end_time: Optional[datetime] = None, chunk_lines: int = 1000000):
+        anomaly_mix = anomaly_mix or {'mixed': 1.0}
+        unknown = set(anomaly_mix) - set(ANOMALY_PROFILES)
+        if unknown:
+            raise ValueError(f"Unknown anomaly kinds: {', '.join(sorted(unknown))}")
+
+        self.num_users = num_users
+        self.logs_per_user = logs_per_user
+        self.anomaly_ratio = anomaly_ratio
+        self.anomaly_line_rate = anomaly_line_rate
+        self.anomaly_mix = anomaly_mix
+        self.days = days
+        if end_time is None:
+            end_time = SEEDED_END_TIME if seed is not None else datetime.now()
+        self.end_time = end_time.replace(microsecond=0)
+        self.chunk_lines = chunk_lines
+        # Fixing the entropy makes unseeded runs reproducible from self.seed_entropy
+        self.seed_entropy = np.random.SeedSequence(seed).entropy
+
+        # Profile of each user: 0 for normal users, k for the k-th anomaly kind
+        self.kinds = list(anomaly_mix)
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed_entropy, spawn_key=(0,)))
+        is_anomalous = rng.random(num_users) < anomaly_ratio
+        weights = np.array([anomaly_mix[kind] for kind in self.kinds], dtype=np.float64)
+        kind_codes = rng.choice(len(self.kinds), size=num_users, p=weights / weights.sum()) + 1
+        self.user_profiles = np.where(is_anomalous, kind_codes, 0)
+        self.user_names = [f"user{user_id:03d}" for user_id in range(1, num_users + 1)]
+
+    @property
+    def num_lines(self) -> int:
+        return self.num_users * self.logs_per_user
+
+    def anomalous_users(self) -> Dict[str, str]:
+        """Get the anomaly kind of each anomalous user (the ground truth)"""
+        return {
+            self.user_names[code]: self.kinds[profile - 1]
+            for code, profile in enumerate(self.user_profiles.tolist()) if profile
+        }
+
+    def generate_chunk(self, index: int) -> List[str]:
+        """Generate the lines of one chunk"""
+        start = index * self.chunk_lines
+        stop = min(start + self.chunk_lines, self.num_lines)
+        n = stop - start
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed_entropy, spawn_key=(1, index)))
+
+        users = np.arange(start, stop) // self.logs_per_user
+        anomalous_line = rng.random(n) < self.anomaly_line_rate
+        line_profiles = np.where(anomalous_line, self.user_profiles[users], 0)
+
+        # Seconds before end_time, drawn as whole days, hours and minutes
+        offsets = rng.integers(0, self.days, n) * 86400 + rng.integers(0, 24, n) * 3600 + rng.integers(0, 60, n) * 60
+        end_epoch = int((self.end_time - datetime(1970, 1, 1)).total_seconds())
+        timestamps = end_epoch - offsets
+
+        actions = np.empty(n, dtype=object)
+        resources = np.empty(n, dtype=object)
+        status_codes = np.empty(n, dtype=np.int64)
+        response_times = np.empty(n, dtype=np.int64)
+        subnets = np.empty(n, dtype=np.int64)
+        hosts = np.empty(n, dtype=np.int64)
+
+        for code, profile in enumerate([NORMAL_PROFILE] + [ANOMALY_PROFILES[kind] for kind in self.kinds]):
+            rows = np.flatnonzero(line_profiles == code)
+            if len(rows) == 0:
+                continue
+            count = len(rows)
+            actions[rows] = np.array(profile['actions'], dtype=object)[rng.integers(0, len(profile['actions']), count)]
+            resources[rows] = np.array(profile['resources'], dtype=object)[rng.integers(0, len(profile['resources']), count)]
+            status_codes[rows] = np.array(profile['status_codes'])[rng.integers(0, len(profile['status_codes']), count)]
+            response_times[rows] = rng.integers(*profile['response_time'], count)
+            subnets[rows] = rng.integers(*profile['ip_subnet'], count)
+            hosts[rows] = rng.integers(*profile['ip_host'], count)
+            if profile['night_only']:
+                # Move the line to the same minute and second between 00:00 and 05:59
+                timestamps[rows] += (rng.integers(0, 6, count) - timestamps[rows] // 3600 % 24) * 3600
+
+        days = timestamps // 86400
+        first_day = int(days.min())
+        dates = [
+            np.datetime64(day, 'D').astype(str)
+            for day in range(first_day, int(days.max()) + 1)
+        ]
+        day_strings = [dates[day - first_day] for day in days.tolist()]
+        time_strings = time_of_day_strings()
+        user_names = self.user_names
+
+        return [
+            f"{day} {time_strings[second]} user:{user_names[user]} 192.168.{subnet}.{host} {action} {resource} "
+            f"status:{status} time:{response_time}ms"
+            for day, second, user, subnet, host, action, resource, status, response_time in zip(
+                day_strings, (timestamps % 86400).tolist(), users.tolist(), subnets.tolist(), hosts.tolist(),
+                actions.tolist(), resources.tolist(), status_codes.tolist(), response_times.tolist()
+            )
+        ]
+
+    def iter_chunks(self) -> Iterator[str]:
+        """Yield the log text chunk by chunk (lines joined by newlines, no trailing newline)"""
+        num_chunks = -(-self.num_lines // self.chunk_lines)
+        for index in range(num_chunks):
+            yield '\n'.join(self.generate_chunk(index))
+
+    def write(self, output_path: str) -> Dict[str, Any]:
+        """Stream the logs to output_path (gzip-compressed if it ends in .gz) and summarize them"""
+        start = time.perf_counter()
+        written = 0
+        if output_path.endswith('.gz'):
+            # Level 6 (the gzip tool's default) is several times faster than gzip.open's 9
+            f = gzip.open(output_path, 'wb', compresslevel=6)
+        else:
+            f = open(output_path, 'wb')
+
+        with f:
+            for index, chunk in enumerate(self.iter_chunks()):
+                data = chunk.encode('utf-8')
+                if index:
+                    f.write(b'\n')
+                    written += 1
+                f.write(data)
+                written += len(data)
+
+        seconds = time.perf_counter() - start
+        logger.info(f"Generated {self.num_lines} log lines for {self.num_users} users in {seconds:.2f}s "
+                    f"({self.num_lines / max(seconds, 1e-9):.0f} lines/sec)")
+        return {
+            'output_path': output_path,
+            'lines': self.num_lines,
+            'users': self.num_users,
+            'anomalous_users': int(np.count_nonzero(self.user_profiles)),
+            'bytes': written,
+            'seconds': seconds,
+            'seed_entropy': self.seed_entropy
+        }
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, Iterable
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Order in which the fields appear in a standard log line:
+# timestamp user:X ip ACTION /resource status:N time:Nms
+FIELD_LAYOUT = ['timestamp', 'user_id', 'ip_address', 'action', 'resource', 'status_code', 'response_time']
+INT_FIELDS = ('status_code', 'response_time')
+# Bumped whenever parsing of the same patterns can produce different fields
+PARSER_VERSION = 2
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse a 'YYYY-MM-DD HH:MM:SS' timestamp using fixed-width slicing"""
+    try:
+        return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                        int(value[11:13]), int(value[14:16]), int(value[17:19]))
+    except ValueError:
+        return None
+
+
+def _skip_pattern(pattern: str) -> str:
+    """Match the space-separated tokens a field pattern spans without capturing or checking them"""
+    return ' '.join([r'\S+'] * (pattern.count(' ') + 1))
+
+
+def project_fields(fields: Iterable[str] = None) -> Tuple[str, ...]:
+    """The extracted fields in layout order: all of them for None, and always the user_id"""
+    if fields is None:
+        return tuple(FIELD_LAYOUT)
+    wanted = set(fields) | {'user_id'}
+    return tuple(field for field in FIELD_LAYOUT if field in wanted)
+
+
+def validate_log_patterns(log_patterns: Dict[str, str]) -> None:
+    """Check that the patterns cover exactly the layout fields and each compiles with one capturing group"""
+    missing = [field for field in FIELD_LAYOUT if field not in log_patterns]
+    unknown = [field for field in log_patterns if field not in FIELD_LAYOUT]
+    if missing or unknown:
+        raise ValueError(f"Log patterns must define exactly {', '.join(FIELD_LAYOUT)} "
+                         f"(missing: {', '.join(missing) or 'none'}, unknown: {', '.join(unknown) or 'none'})")
+
+    for field in FIELD_LAYOUT:
+        pattern = log_patterns[field]
+        if not isinstance(pattern, str):
+            raise ValueError(f"Log pattern for {field} must be a string")
+        try:
+            groups = re.compile(pattern, re.IGNORECASE).groups
+        except re.error as e:
+            raise ValueError(f"Invalid log pattern for {field}: {e}")
+        if groups != 1:
+            raise ValueError(f"Log pattern for {field} must have exactly one capturing group, not {groups}")
+
+
+class ParserSchema:
+    """Validated, compiled patterns of the standard layout, projected onto the fields to extract.
+
+    Immutable once built, so parsers in several threads can share one.
+    """
+
+    def __init__(self, log_patterns: Dict[str, str], fields: Iterable[str] = None):
+        validate_log_patterns(log_patterns)
+        self.log_patterns = dict(log_patterns)
+        self.fields = project_fields(fields)
+        self.all_fields = len(self.fields) == len(FIELD_LAYOUT)
+
+        # Per-field patterns, compiled once and used for lines that do not follow the layout
+        self.field_regexes = {
+            field: re.compile(pattern, re.IGNORECASE)
+            for field, pattern in self.log_patterns.items() if field in self.fields
+        }
+
+        # Anchored pattern matching the whole standard layout in one pass
+        self.line_regex = re.compile(
+            '^' + ' '.join(self.log_patterns[field] if field in self.fields else _skip_pattern(self.log_patterns[field])
+                           for field in FIELD_LAYOUT) + r'\s*$',
+            re.IGNORECASE
+        )
+        self.converters = [
+            (field in self.fields, parse_timestamp if field == 'timestamp' else int if field in INT_FIELDS else None)
+            for field in FIELD_LAYOUT
+        ]
+
+        # Identifies the parse output for these patterns and fields (e.g. to key cached parse results)
+        self.version = hashlib.sha1(
+            json.dumps([PARSER_VERSION, self.log_patterns, list(self.fields)], sort_keys=True).encode('utf-8')
+        ).hexdigest()[:16]
+
+
+# (config version, log patterns, {fields: ParserSchema}), replaced as a whole
+_compiled_schemas = (None, None, {})
+_compile_lock = threading.Lock()
+
+
+def schema_for(fields: Iterable[str] = None) -> ParserSchema:
+    """Get the compiled schema of Config.LOG_PATTERNS for these fields.
+
+    Patterns are validated and compiled once per config version. After a config
+    change the schemas are rebuilt and swapped in as a whole, so a parser never
+    mixes old and new patterns; invalid new patterns leave the previous ones in use.
+    """
+    global _compiled_schemas
+    key = project_fields(fields)
+    version, log_patterns, schemas = _compiled_schemas
+    if version == Config.get_version() and key in schemas:
+        return schemas[key]
+
+    with _compile_lock:
+        version, log_patterns, schemas = _compiled_schemas
+        current = Config.get_version()
+        if version != current:
+            try:
+                validate_log_patterns(Config.LOG_PATTERNS)
+                log_patterns, schemas = dict(Config.LOG_PATTERNS), {}
+            except ValueError as e:
+                if log_patterns is None:
+                    raise
+                logger.error(f"Keeping the previous log patterns: {e}")
+        if key not in schemas:
+            schemas = {**schemas, key: ParserSchema(log_patterns, key)}
+        _compiled_schemas = (current, log_patterns, schemas)
+        return schemas[key]
+
+
+class LogParserEngine:
+    """Compiled log line parser with a single-pass fast path for the standard layout.
+
+    With fields, only those fields are captured and converted; the others come
+    back as None. In the layout pattern a skipped field only has to be a token
+    (e.g. the IP address is not checked to be an IP), and lines outside the
+    layout are not searched for it at all. Pass a schema (see schema_for) to
+    reuse compiled patterns; each engine keeps its own statistics.
+    """
+
+    def __init__(self, log_patterns: Dict[str, str] = None, fields: Iterable[str] = None,
+                 schema: ParserSchema = None):
+        self.schema = schema if schema is not None else ParserSchema(log_patterns, fields)
+        self.log_patterns = self.schema.log_patterns
+        self.fields = self.schema.fields
+        self.all_fields = self.schema.all_fields
+        self.field_regexes = self.schema.field_regexes
+        self.line_regex = self.schema.line_regex
+        self._converters = self.schema.converters
+        self.version = self.schema.version
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the per-path line counters and timings"""
+        self.stats = {
+            'fast_path': {'lines': 0, 'seconds': 0.0},
+            'fallback': {'lines': 0, 'seconds': 0.0},
+            # CSV / JSON-lines records, converted by log_readers without the regexes
+            'structured': {'lines': 0, 'seconds': 0.0}
+        }
+
+    def parse_fields(self, log_line: str) -> Tuple[Any, ...]:
+        """Parse a log line into a tuple of field values ordered as FIELD_LAYOUT"""
+        start = time.perf_counter()
+        match = self.line_regex.match(log_line)
+
+        if match and self.all_fields:
+            ts, user_id, ip, action, resource, status, response_time = match.groups()
+            fields = (parse_timestamp(ts), user_id, ip, action, resource, int(status), int(response_time))
+            path = self.stats['fast_path']
+        elif match:
+            values = iter(match.groups())
+            fields = tuple(
+                (convert(next(values)) if convert else next(values)) if parsed else None
+                for parsed, convert in self._converters
+            )
+            path = self.stats['fast_path']
+        else:
+            fields = self._parse_fields_fallback(log_line)
+            path = self.stats['fallback']
+
+        path['lines'] += 1
+        path['seconds'] += time.perf_counter() - start
+        return fields
+
+    def _parse_fields_fallback(self, log_line: str) -> Tuple[Any, ...]:
+        """Search each field independently, for lines outside the standard layout"""
+        values = []
+
+        for field in FIELD_LAYOUT:
+            if field not in self.field_regexes:
+                values.append(None)
+                continue
+            match = self.field_regexes[field].search(log_line)
+            if match is None:
+                values.append(None)
+            elif field == 'timestamp':
+                values.append(parse_timestamp(match.group(1)))
+            elif field in INT_FIELDS:
+                values.append(int(match.group(1)))
+            else:
+                values.append(match.group(1))
+
+        return tuple(values)
+
+    def project(self, fields: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        """Blank out the values of fields this parser does not extract"""
+        if self.all_fields:
+            return fields
+        return tuple(value if parsed else None for value, (parsed, _) in zip(fields, self._converters))
+
+    def parse(self, log_line: str) -> Dict[str, Any]:
+        """Parse a log line into a field dictionary including the raw line"""
+        parsed_data = dict(zip(FIELD_LAYOUT, self.parse_fields(log_line)))
+        parsed_data['raw_log'] = log_line.strip()
+        return parsed_data
+
+    def get_throughput(self) -> Dict[str, Dict[str, float]]:
+        """Get lines parsed, time spent and lines/sec for the fast, fallback and structured paths"""
+        throughput = {}
+
+        for path, stats in self.stats.items():
+            throughput[path] = {
+                'lines': stats['lines'],
+                'seconds': stats['seconds'],
+                'lines_per_sec': stats['lines'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+            }
+
+        return throughput
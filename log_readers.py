@@ -0,0 +1,293 @@
+import bz2
+import csv
+import gzip
+import io
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple, Type
+
+from log_parser import LogParserEngine, FIELD_LAYOUT, parse_timestamp
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Buffer size for reading (and decompressing) log files
+READ_BUFFER_BYTES = 4 * 1024 * 1024
+
+COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\x28\xb5\x2f\xfd', 'zstd'))
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+# Column / key names accepted for each field in structured (CSV, JSON lines) logs
+FIELD_ALIASES = {
+    'timestamp': 'timestamp', 'datetime': 'timestamp', 'date': 'timestamp', '@timestamp': 'timestamp',
+    'user_id': 'user_id', 'user': 'user_id', 'userid': 'user_id', 'username': 'user_id',
+    'ip_address': 'ip_address', 'ip': 'ip_address', 'client_ip': 'ip_address',
+    'action': 'action', 'method': 'action',
+    'resource': 'resource', 'path': 'resource', 'url': 'resource',
+    'status_code': 'status_code', 'status': 'status_code',
+    'response_time': 'response_time', 'response_time_ms': 'response_time', 'latency_ms': 'response_time'
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def detect_compression(filename: str, head: bytes = None) -> Optional[str]:
+    """Detect gzip, bz2 or zstd from a file's first bytes, falling back to its suffix"""
+    if head is None:
+        try:
+            with open(filename, 'rb') as f:
+                head = f.read(4)
+        except OSError:
+            head = b''
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(filename)[1].lower())
+
+
+def strip_compression_suffix(filename: str) -> str:
+    """Name of the decompressed file, e.g. app.log.gz -> app.log"""
+    root, ext = os.path.splitext(filename)
+    return root if ext.lower() in COMPRESSION_SUFFIXES else filename
+
+
+def make_decompressor(compression: Optional[str]):
+    """Get an incremental decompressor with decompress(bytes), eof and unused_data, or None for plain text"""
+    if compression == 'gzip':
+        # 16 + MAX_WBITS expects a gzip header
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'bz2':
+        return bz2.BZ2Decompressor()
+    if compression == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError('zstd logs require the zstandard package')
+        return zstandard.ZstdDecompressor().decompressobj()
+    return None
+
+
+def open_log_file(log_file: str) -> io.BufferedIOBase:
+    """Open a log file for binary reading with a large buffer, decompressing it on the fly.
+
+    Offsets (tell/seek) of compressed files refer to the decompressed stream.
+    Seeking in them decompresses up to the target, so it is only cheap forwards.
+    """
+    compression = detect_compression(log_file)
+    if compression is None:
+        return open(log_file, 'rb', buffering=READ_BUFFER_BYTES)
+    if compression == 'gzip':
+        return io.BufferedReader(gzip.open(log_file, 'rb'), READ_BUFFER_BYTES)
+    if compression == 'bz2':
+        return io.BufferedReader(bz2.open(log_file, 'rb'), READ_BUFFER_BYTES)
+    if not ZSTD_AVAILABLE:
+        raise ValueError('zstd logs require the zstandard package')
+    stream = zstandard.ZstdDecompressor().stream_reader(open(log_file, 'rb'), read_across_frames=True)
+    return io.BufferedReader(stream, READ_BUFFER_BYTES)
+
+
+def is_splittable(log_file: str) -> bool:
+    """Whether a file can be parsed in independent byte ranges (uncompressed files only)"""
+    return detect_compression(log_file) is None
+
+
+def to_timestamp(value: Any) -> Optional[datetime]:
+    """Convert a 'YYYY-MM-DD HH:MM:SS' / ISO 8601 string or epoch seconds to a naive datetime"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return _EPOCH + timedelta(seconds=int(value))
+    return parse_timestamp(str(value))
+
+
+def to_int(value: Any) -> Optional[int]:
+    """Convert a number or numeric string (optionally ending in 'ms') to int"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(float(str(value).strip().lower().removesuffix('ms')))
+    except ValueError:
+        return None
+
+
+def to_text(value: Any) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+class LogRecordReader:
+    """Turns the lines of one log file into field tuples ordered as FIELD_LAYOUT"""
+
+    format = None
+
+    def __init__(self, parser: LogParserEngine):
+        self.parser = parser
+
+    def prepare(self, log_file: str) -> None:
+        """Read whatever the reader needs before parsing lines from any offset (e.g. a CSV header)"""
+
+    def parse_line(self, line: str) -> Optional[Tuple[Any, ...]]:
+        """Parse one line, or return None for lines that are not records (e.g. a CSV header)"""
+        raise NotImplementedError
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        """Parse a raw line into a field dictionary including the raw line"""
+        fields = self.parse_line(line)
+        if fields is None:
+            return None
+        parsed_data = dict(zip(FIELD_LAYOUT, fields))
+        parsed_data['raw_log'] = line.strip()
+        return parsed_data
+
+
+class TextLogReader(LogRecordReader):
+    """Free-form text lines, parsed with the configured log patterns"""
+
+    format = 'text'
+
+    def parse_line(self, line: str) -> Optional[Tuple[Any, ...]]:
+        return self.parser.parse_fields(line)
+
+
+class StructuredLogReader(LogRecordReader):
+    """Base for formats whose fields are already separated; they skip the regex parser"""
+
+    def field_values(self, line: str) -> Optional[Dict[str, Any]]:
+        """Split a line into raw values keyed by canonical field name, or None if it is not a record"""
+        raise NotImplementedError
+
+    def parse_line(self, line: str) -> Optional[Tuple[Any, ...]]:
+        start = time.perf_counter()
+        values = self.field_values(line)
+        if values is None:
+            return None
+
+        resource = to_text(values.get('resource'))
+        if resource and resource.startswith('/'):
+            # The text patterns capture resources without their leading slash
+            resource = resource[1:]
+        fields = self.parser.project((
+            to_timestamp(values.get('timestamp')),
+            to_text(values.get('user_id')),
+            to_text(values.get('ip_address')),
+            to_text(values.get('action')),
+            resource,
+            to_int(values.get('status_code')),
+            to_int(values.get('response_time'))
+        ))
+
+        stats = self.parser.stats['structured']
+        stats['lines'] += 1
+        stats['seconds'] += time.perf_counter() - start
+        return fields
+
+
+class CsvLogReader(StructuredLogReader):
+    """CSV logs with a header row naming the fields (see FIELD_ALIASES); one record per line"""
+
+    format = 'csv'
+
+    def __init__(self, parser: LogParserEngine):
+        super().__init__(parser)
+        self.header = None
+        self.columns = None
+
+    def prepare(self, log_file: str) -> None:
+        with open_log_file(log_file) as f:
+            for line in f:
+                if line.strip():
+                    self.field_values(line.decode('utf-8', errors='replace'))
+                    break
+
+    def field_values(self, line: str) -> Optional[Dict[str, Any]]:
+        row = next(csv.reader([line]))
+        if self.header is None:
+            self.header = row
+            self.columns = [FIELD_ALIASES.get(name.strip().lower()) for name in row]
+            return None
+        if row == self.header:
+            return None
+        return {field: value for field, value in zip(self.columns, row) if field}
+
+
+class JsonLinesLogReader(StructuredLogReader):
+    """One JSON object per line, keyed by field name (see FIELD_ALIASES)"""
+
+    format = 'jsonl'
+
+    def field_values(self, line: str) -> Optional[Dict[str, Any]]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        values = {}
+        if isinstance(record, dict):
+            for key, value in record.items():
+                field = FIELD_ALIASES.get(key.lower())
+                if field and field not in values:
+                    values[field] = value
+        return values
+
+
+READERS: Dict[str, Type[LogRecordReader]] = {}
+FORMAT_SUFFIXES: Dict[str, str] = {}
+
+
+def register_reader(reader_class: Type[LogRecordReader], suffixes=()) -> None:
+    """Register a reader for its format name and the file suffixes that select it"""
+    READERS[reader_class.format] = reader_class
+    for suffix in suffixes:
+        FORMAT_SUFFIXES[suffix] = reader_class.format
+
+
+register_reader(TextLogReader, ('.log', '.txt'))
+register_reader(CsvLogReader, ('.csv',))
+register_reader(JsonLinesLogReader, ('.jsonl', '.ndjson'))
+
+
+def has_csv_header(first_line: str) -> bool:
+    """Whether a line is a CSV header naming the user_id field (under any of its FIELD_ALIASES)"""
+    try:
+        row = next(csv.reader([first_line]))
+    except (csv.Error, StopIteration):
+        return False
+    return 'user_id' in {FIELD_ALIASES.get(name.strip().lower()) for name in row}
+
+
+def detect_format(filename: str, head: bytes, parser: LogParserEngine = None) -> str:
+    """Detect the log format from the (decompressed) file name's suffix, or else by sniffing its first bytes.
+
+    A .csv file is only read as CSV if it starts with a header naming the
+    fields; .csv uploads in the text layout (first line matching the parser's
+    line pattern, or no header) are read as text.
+    """
+    suffix = os.path.splitext(strip_compression_suffix(filename))[1].lower()
+    first_line = next((line for line in head.decode('utf-8', errors='replace').splitlines() if line.strip()), '')
+    log_format = FORMAT_SUFFIXES.get(suffix)
+    if log_format == 'csv':
+        text_line = parser is not None and parser.line_regex.match(first_line) is not None
+        return 'text' if text_line or not has_csv_header(first_line) else 'csv'
+    if log_format is not None and log_format != 'text':
+        return log_format
+    if first_line.lstrip().startswith('{'):
+        return 'jsonl'
+    return 'text'
+
+
+def reader_for(log_file: str, parser: LogParserEngine) -> LogRecordReader:
+    """Get a prepared reader for a log file's format"""
+    try:
+        with open_log_file(log_file) as f:
+            head = f.read(4096)
+    except OSError:
+        head = b''
+    reader = READERS[detect_format(log_file, head, parser)](parser)
+    reader.prepare(log_file)
+    return reader
@@ -0,0 +1,255 @@
+import numpy as np
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple, Iterator
+
+from log_readers import open_log_file
+
+# Missing timestamps are stored as the int64 value NumPy uses for NaT
+TIMESTAMP_MISSING = np.iinfo(np.int64).min
+# Missing status codes / response times
+INT_MISSING = -1
+
+CATEGORICAL_FIELDS = ('user_id', 'ip_address', 'action', 'resource')
+NUMERIC_COLUMNS = {
+    'timestamp': np.int64,
+    'status_code': np.int32,
+    'response_time': np.int64,
+    'source': np.int32,
+    'offset': np.int64,
+    'length': np.int32
+}
+
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+_ARRAY_TYPECODES = {np.int64: 'q', np.int32: 'i'}
+
+
+def to_epoch_seconds(value: Optional[datetime]) -> int:
+    """Convert a naive datetime to integer seconds since 1970-01-01"""
+    if value is None:
+        return TIMESTAMP_MISSING
+    return ((value.toordinal() - _EPOCH_ORDINAL) * 86400
+            + value.hour * 3600 + value.minute * 60 + value.second)
+
+
+class LogColumnsBuilder:
+    """Accumulates parsed log fields into compact typed buffers"""
+
+    def __init__(self, vocabs: Optional[Dict[str, Dict[str, int]]] = None):
+        self.buffers = {name: array(_ARRAY_TYPECODES[dtype]) for name, dtype in NUMERIC_COLUMNS.items()}
+        self.codes = {field: array('i') for field in CATEGORICAL_FIELDS}
+        # Passing the vocabularies of a previous builder keeps codes stable across chunks
+        self.vocabs = vocabs if vocabs is not None else {field: {} for field in CATEGORICAL_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.buffers['timestamp'])
+
+    def _encode(self, field: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        vocab = self.vocabs[field]
+        code = vocab.get(value)
+        if code is None:
+            code = vocab[value] = len(vocab)
+        return code
+
+    def append(self, fields: Tuple[Any, ...], source: int, offset: int, length: int) -> bool:
+        """Append one parsed line (fields ordered as log_parser.FIELD_LAYOUT)"""
+        timestamp, user_id, ip_address, action, resource, status_code, response_time = fields
+
+        # Lines without a user cannot be attributed and are dropped
+        if not user_id:
+            return False
+
+        buffers = self.buffers
+        buffers['timestamp'].append(to_epoch_seconds(timestamp))
+        buffers['status_code'].append(INT_MISSING if status_code is None else status_code)
+        buffers['response_time'].append(INT_MISSING if response_time is None else response_time)
+        buffers['source'].append(source)
+        buffers['offset'].append(offset)
+        buffers['length'].append(length)
+
+        codes = self.codes
+        codes['user_id'].append(self._encode('user_id', user_id))
+        codes['ip_address'].append(self._encode('ip_address', ip_address))
+        codes['action'].append(self._encode('action', action))
+        codes['resource'].append(self._encode('resource', resource))
+        return True
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Copy the buffers into NumPy arrays"""
+        columns = {}
+        for name, buffer in list(self.buffers.items()) + list(self.codes.items()):
+            dtype = NUMERIC_COLUMNS.get(name, np.int32)
+            columns[name] = np.frombuffer(buffer, dtype=dtype).copy() if len(buffer) else np.empty(0, dtype=dtype)
+        return columns
+
+    def build(self, sources: List[str]) -> 'ColumnarLogStore':
+        """Freeze the buffers into a ColumnarLogStore"""
+        vocabs = {field: list(vocab) for field, vocab in self.vocabs.items()}
+        return ColumnarLogStore(self.to_arrays(), vocabs, sources)
+
+
+class ColumnarLogStore(Mapping):
+    """Columnar, user-grouped storage of parsed logs.
+
+    Rows are grouped by user (in order of first appearance) while keeping file
+    order within a user. Categoricals are dictionary-encoded int32 codes (-1 for
+    missing), and raw lines are kept only as (source, offset, length) references
+    that are read back from disk on demand.
+
+    Behaves as a read-only mapping of user_id -> list of parsed log dicts.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], vocabs: Dict[str, List[str]],
+                 sources: List[str], grouped: bool = False):
+        self.columns = columns
+        self.vocabs = vocabs
+        self.sources = list(sources)
+
+        user_codes = columns['user_id']
+        n_users = len(vocabs['user_id'])
+
+        if not grouped:
+            order = np.argsort(user_codes, kind='stable')
+            self.columns = {name: values[order] for name, values in columns.items()}
+            user_codes = self.columns['user_id']
+
+        counts = np.bincount(user_codes, minlength=n_users) if len(user_codes) else np.zeros(n_users, dtype=np.int64)
+        self.user_offsets = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.user_offsets[1:])
+
+        self._user_positions = {user_id: code for code, user_id in enumerate(vocabs['user_id'])}
+
+    @classmethod
+    def empty(cls) -> 'ColumnarLogStore':
+        """Create a store without any rows"""
+        return LogColumnsBuilder().build([])
+
+    @classmethod
+    def concat(cls, parts: List['ColumnarLogStore']) -> 'ColumnarLogStore':
+        """Concatenate stores in order, merging their dictionaries and sources"""
+        parts = [part for part in parts if part.num_rows or part.sources]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+
+        sources: List[str] = []
+        source_positions: Dict[str, int] = {}
+        merged_vocabs = {field: {} for field in CATEGORICAL_FIELDS}
+        pieces = {name: [] for name in parts[0].columns}
+
+        for part in parts:
+            source_remap = []
+            for source in part.sources:
+                if source not in source_positions:
+                    source_positions[source] = len(sources)
+                    sources.append(source)
+                source_remap.append(source_positions[source])
+
+            for name, values in part.columns.items():
+                if name in merged_vocabs:
+                    vocab = merged_vocabs[name]
+                    remap = [vocab.setdefault(value, len(vocab)) for value in part.vocabs[name]]
+                    # Trailing -1 keeps missing codes (-1) missing after the remap
+                    remap = np.array(remap + [-1], dtype=np.int32)
+                    values = remap[values]
+                elif name == 'source':
+                    values = np.array(source_remap, dtype=np.int32)[values] if len(values) else values
+                pieces[name].append(values)
+
+        columns = {name: np.concatenate(values) for name, values in pieces.items()}
+        vocabs = {field: list(vocab) for field, vocab in merged_vocabs.items()}
+        return cls(columns, vocabs, sources)
+
+    # Mapping interface
+    def __getitem__(self, user_id: str) -> List[Dict[str, Any]]:
+        if user_id not in self._user_positions:
+            raise KeyError(user_id)
+        return self.user_records(user_id, include_raw=False)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.vocabs['user_id'])
+
+    def __len__(self) -> int:
+        return len(self.vocabs['user_id'])
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self._user_positions
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.columns['user_id'])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the column arrays"""
+        return int(sum(values.nbytes for values in self.columns.values()) + self.user_offsets.nbytes)
+
+    def user_slice(self, user_id: str) -> Tuple[int, int]:
+        """Get the [start, stop) row range holding a user's logs"""
+        code = self._user_positions[user_id]
+        return int(self.user_offsets[code]), int(self.user_offsets[code + 1])
+
+    def user_log_count(self, user_id: str) -> int:
+        """Get the number of logs for a user"""
+        start, stop = self.user_slice(user_id)
+        return stop - start
+
+    def user_records(self, user_id: str, start: Optional[int] = None, stop: Optional[int] = None,
+                     include_raw: bool = True) -> List[Dict[str, Any]]:
+        """Materialize (a slice of) a user's logs as parsed log dictionaries"""
+        first, last = self.user_slice(user_id)
+        rows = np.arange(first, last)[start:stop]
+        return self.records(rows, include_raw=include_raw)
+
+    def decode_column(self, name: str, rows: np.ndarray) -> List[Any]:
+        """Decode a column for the given rows into Python values (None for missing)"""
+        values = self.columns[name][rows]
+
+        if name in CATEGORICAL_FIELDS:
+            vocab = self.vocabs[name]
+            return [vocab[code] if code >= 0 else None for code in values.tolist()]
+        if name == 'timestamp':
+            return values.astype('datetime64[s]').tolist()
+        return [None if value == INT_MISSING else value for value in values.tolist()]
+
+    def records(self, rows: np.ndarray, include_raw: bool = True) -> List[Dict[str, Any]]:
+        """Materialize the given rows as parsed log dictionaries"""
+        fields = ['timestamp', 'user_id', 'ip_address', 'action', 'resource', 'status_code', 'response_time']
+        decoded = [self.decode_column(field, rows) for field in fields]
+        records = [dict(zip(fields, values)) for values in zip(*decoded)]
+
+        if include_raw:
+            for record, raw_log in zip(records, self.load_raw_lines(rows)):
+                record['raw_log'] = raw_log
+
+        return records
+
+    def load_raw_lines(self, rows: np.ndarray) -> List[Optional[str]]:
+        """Read the raw log lines for the given rows back from their source files"""
+        refs = np.stack([self.columns['source'][rows], self.columns['offset'][rows], self.columns['length'][rows]], axis=1)
+        return read_raw_lines(self.sources, refs)
+
+
+def read_raw_lines(sources: List[str], refs: np.ndarray) -> List[Optional[str]]:
+    """Read raw lines given (source, offset, length) references into the source files"""
+    lines: List[Optional[str]] = [None] * len(refs)
+
+    for source in np.unique(refs[:, 0]) if len(refs) else []:
+        positions = np.flatnonzero(refs[:, 0] == source)
+        # Read in offset order, so compressed sources are decompressed in a single forward pass
+        positions = positions[np.argsort(refs[positions, 1], kind='stable')]
+        try:
+            with open_log_file(sources[source]) as f:
+                for position in positions:
+                    f.seek(int(refs[position, 1]))
+                    raw = f.read(int(refs[position, 2]))
+                    lines[position] = raw.decode('utf-8', errors='replace').strip()
+        except OSError:
+            # Source file moved or deleted since parsing; raw lines are unavailable
+            continue
+
+    return lines
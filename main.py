@@ -3,140 +3,308 @@ import numpy as np
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
-import re
+import os
+import pickle
+import tempfile
+import threading
+import time
 import logging
-from typing import Dict, List, Tuple, Any
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Any, Mapping, Iterator
 import warnings
 warnings.filterwarnings('ignore')
 
+from config import Config
+from log_parser import LogParserEngine, schema_for
+from log_store import ColumnarLogStore, LogColumnsBuilder
+from log_readers import open_log_file, reader_for, is_splittable
+from batch_features import BatchFeatureExtractor
+from feature_registry import FeaturePlan, build_feature_plan
+from feature_matrix import FeatureMatrix
+from streaming import StreamingFeatureAggregator, chunk_lines_for_budget
+from incremental import IncrementalCheckpoint, feature_drift
+from extended_forest import HyperplaneIsolationForest
+from parse_cache import ParsedLogCache
+from profiler import StageProfiler
+from log_generator import SyntheticLogGenerator
+from windows import WindowedFeatureExtractor, user_window_series
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bumped whenever the layout of saved model bundles changes
+MODEL_BUNDLE_VERSION = 3
+# Training decision scores are summarized by this many quantiles for 'quantile' normalization
+SCORE_QUANTILES = 1001
+# Bins of the score histogram precomputed for each run
+SCORE_HISTOGRAM_BINS = 100
+# Profiler stage names of the pipeline stages (scaling runs before fit and before score)
+PROFILED_STAGES = {'preprocessing': 'parse', 'training': 'scaling', 'scoring': 'scaling', 'classification': 'classify'}
+
+def split_file_ranges(log_file: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """Split a file into [start, end) byte ranges of about chunk_size, aligned to line starts"""
+    file_size = os.path.getsize(log_file)
+    boundaries = [0]
+    
+    with open(log_file, 'rb') as f:
+        while boundaries[-1] + chunk_size < file_size:
+            f.seek(boundaries[-1] + chunk_size)
+            f.readline()  # Move to the start of the next line
+            if f.tell() >= file_size:
+                break
+            boundaries.append(f.tell())
+    
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def parse_byte_range(parser: LogParserEngine, builder: LogColumnsBuilder, log_file: str,
+                     source: int, start: int = 0, end: int = None) -> None:
+    """Parse the lines of log_file in the byte range [start, end) into builder.
+    
+    The file's reader (text, CSV or JSON lines) is picked from its format, and
+    compressed files are decompressed on the fly (offsets then refer to the
+    decompressed stream).
+    """
+    reader = reader_for(log_file, parser)
+    
+    with open_log_file(log_file) as f:
+        f.seek(start)
+        offset = start
+        
+        for line in f:
+            if end is not None and offset >= end:
+                break
+            if line.strip():  # Skip empty lines
+                fields = reader.parse_line(line.decode('utf-8', errors='replace'))
+                if fields is not None:
+                    builder.append(fields, source, offset, len(line))
+            offset += len(line)
+
+def parse_file_chunk(log_patterns: Dict[str, str], fields: Tuple[str, ...], log_file: str,
+                     start: int, end: int) -> Tuple[ColumnarLogStore, Dict]:
+    """Parse one byte range of a log file (process pool worker)"""
+    parser = LogParserEngine(log_patterns, fields)
+    builder = LogColumnsBuilder()
+    parse_byte_range(parser, builder, log_file, 0, start, end)
+    return builder.build([log_file]), parser.stats
+
 class LogPreprocessor:
     """Handles log file preprocessing and user-based organization"""
     
     def __init__(self):
-        self.user_logs = defaultdict(list)
-        self.log_patterns = {
-            'timestamp': r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})',
-            'user_id': r'user[_:](\w+)',
-            'ip_address': r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})',
-            'action': r'(GET|POST|PUT|DELETE|LOGIN|LOGOUT|FAILED_LOGIN)',
-            'resource': r'/([\w/.-]+)',
-            'status_code': r'status[_:](\d{3})',
-            'response_time': r'time[_:](\d+)ms'
-        }
+        self.user_logs = ColumnarLogStore.empty()
+        # Compiled from Config.LOG_PATTERNS
+        self.parser = LogParserEngine(schema=schema_for())
+        self.parse_cache_stats = None
+    
+    @property
+    def log_patterns(self) -> Dict[str, str]:
+        return self.parser.log_patterns
+    
+    def set_fields(self, fields: Tuple[str, ...]) -> None:
+        """Parse only these fields (e.g. those of a FeaturePlan) with the current Config.LOG_PATTERNS.
+        
+        The other fields are stored as missing. A new parser is made only when the
+        fields or the config changed.
+        """
+        schema = schema_for(fields)
+        if schema is not self.parser.schema:
+            self.parser = LogParserEngine(schema=schema)
     
     def parse_log_line(self, log_line: str) -> Dict[str, Any]:
         """Parse a single log line and extract relevant information"""
-        parsed_data = {}
-        
-        for field, pattern in self.log_patterns.items():
-            match = re.search(pattern, log_line, re.IGNORECASE)
-            if match:
-                if field == 'timestamp':
-                    try:
-                        parsed_data[field] = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        parsed_data[field] = None
-                elif field in ['status_code', 'response_time']:
-                    parsed_data[field] = int(match.group(1))
-                else:
-                    parsed_data[field] = match.group(1)
-            else:
-                parsed_data[field] = None
-        
-        # Add raw log line for reference
-        parsed_data['raw_log'] = log_line.strip()
-        
-        return parsed_data
+        return self.parser.parse(log_line)
     
-    def preprocess_log_files(self, log_files: List[str]) -> Dict[str, List[Dict]]:
+    def preprocess_log_files(self, log_files: List[str], parallel: bool = None) -> ColumnarLogStore:
         """Process multiple log files and organize by user"""
         logger.info("Starting log preprocessing...")
         
+        if parallel is None:
+            parallel = Config.INGESTION_CONFIG['parallel']
+        
+        cache_config = Config.PARSE_CACHE_CONFIG
+        if cache_config['enabled']:
+            cache = ParsedLogCache(cache_config['cache_folder'], cache_config['max_bytes'])
+            store = self._preprocess_cached(log_files, parallel, cache)
+            self.parse_cache_stats = cache.get_stats()
+            logger.info(f"Parse cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses, "
+                        f"{cache.stats['bytes_saved']} bytes not re-parsed")
+        elif parallel:
+            store = self._preprocess_parallel(log_files)
+        else:
+            store = self._preprocess_sequential(log_files)
+        
+        rows_per_source = np.bincount(store.columns['source'], minlength=len(store.sources))
+        for log_file, rows in zip(store.sources, rows_per_source):
+            if rows == 0:
+                logger.warning(f"No log records found in {log_file}; check that it matches the log patterns "
+                               f"or has a header naming the fields")
+        
+        self.user_logs = ColumnarLogStore.concat([self.user_logs, store])
+        
+        logger.info(f"Processed {self.user_logs.num_rows} logs for {len(self.user_logs)} users "
+                    f"({self.user_logs.nbytes / 1024 / 1024:.1f} MB columnar)")
+        for path, stats in self.parser.get_throughput().items():
+            logger.info(f"Parser {path}: {stats['lines']} lines at {stats['lines_per_sec']:.0f} lines/sec")
+        return self.user_logs
+    
+    def _preprocess_cached(self, log_files: List[str], parallel: bool, cache: ParsedLogCache) -> ColumnarLogStore:
+        """Parse files one at a time, reusing cached parses of files in the upload folder.
+        
+        Per-file stores are concatenated in file order, which gives the same store as
+        parsing all files together.
+        """
+        upload_folder = os.path.abspath(Config.UPLOAD_FOLDER)
+        parse = self._preprocess_parallel if parallel else self._preprocess_sequential
+        parts = []
+        
         for log_file in log_files:
+            if not os.path.exists(log_file):
+                logger.warning(f"Log file not found: {log_file}")
+                continue
+            
+            cacheable = os.path.dirname(os.path.abspath(log_file)) == upload_folder \
+                or not Config.PARSE_CACHE_CONFIG['uploads_only']
+            if not cacheable:
+                parts.append(parse([log_file]))
+                continue
+            
+            key = cache.key_for(log_file, self.parser.version)
+            part = cache.get(key, log_file)
+            if part is None:
+                part = parse([log_file])
+                cache.put(key, part)
+            parts.append(part)
+        
+        return ColumnarLogStore.concat(parts)
+    
+    def _preprocess_sequential(self, log_files: List[str]) -> ColumnarLogStore:
+        """Parse files one line at a time in this process"""
+        builder = LogColumnsBuilder()
+        sources = []
+        
+        for log_file in log_files:
+            if not os.path.exists(log_file):
+                logger.warning(f"Log file not found: {log_file}")
+                continue
+            
             try:
-                with open(log_file, 'r') as f:
-                    for line_num, line in enumerate(f, 1):
-                        if line.strip():  # Skip empty lines
-                            parsed_log = self.parse_log_line(line)
-                            user_id = parsed_log.get('user_id')
-                            
-                            if user_id:
-                                self.user_logs[user_id].append(parsed_log)
-                            
-            except FileNotFoundError:
+                sources.append(log_file)
+                parse_byte_range(self.parser, builder, log_file, len(sources) - 1)
+            except Exception as e:
+                logger.error(f"Error processing {log_file}: {str(e)}")
+        
+        return builder.build(sources)
+    
+    def _preprocess_parallel(self, log_files: List[str]) -> ColumnarLogStore:
+        """Parse newline-aligned byte ranges of the files in a process pool.
+        
+        Chunks are merged in file and byte order, so the result is the same as
+        the sequential path whatever the number of workers.
+        """
+        workers = Config.INGESTION_CONFIG['workers'] or os.cpu_count() or 1
+        chunk_size = Config.INGESTION_CONFIG['chunk_size']
+        
+        chunks = []
+        for log_file in log_files:
+            if not os.path.exists(log_file):
+                logger.warning(f"Log file not found: {log_file}")
+            elif not is_splittable(log_file):
+                # Compressed files are decompressed as one stream by a single worker
+                chunks.append((log_file, 0, None))
+            else:
+                chunks.extend((log_file, start, end) for start, end in split_file_ranges(log_file, chunk_size))
+        
+        if workers == 1 or len(chunks) <= 1:
+            return self._preprocess_sequential([log_file for log_file in log_files if os.path.exists(log_file)])
+        
+        logger.info(f"Parsing {len(chunks)} chunks with {min(workers, len(chunks))} worker processes")
+        
+        parts = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = [
+                executor.submit(parse_file_chunk, self.log_patterns, self.parser.fields, log_file, start, end)
+                for log_file, start, end in chunks
+            ]
+            for (log_file, start, end), future in zip(chunks, futures):
+                try:
+                    part, stats = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing {log_file} bytes {start}-{end}: {str(e)}")
+                    continue
+                parts.append(part)
+                for path, path_stats in stats.items():
+                    self.parser.stats[path]['lines'] += path_stats['lines']
+                    self.parser.stats[path]['seconds'] += path_stats['seconds']
+        
+        return ColumnarLogStore.concat(parts)
+    
+    def aggregate_log_files(self, log_files: List[str], aggregates: StreamingFeatureAggregator = None,
+                            resume: bool = False, complete_lines_only: bool = False) -> StreamingFeatureAggregator:
+        """Stream log files in fixed-size chunks into per-user aggregates (bounded memory).
+        
+        With resume, only bytes appended since the aggregates last consumed each file are parsed.
+        """
+        logger.info("Starting streaming log aggregation...")
+        
+        if aggregates is None:
+            aggregates = StreamingFeatureAggregator()
+        # Only the fields the aggregates' feature groups read are parsed
+        self.set_fields(aggregates.plan.fields)
+        memory_budget_mb = Config.STREAMING_CONFIG['memory_budget_mb']
+        chunk_lines = chunk_lines_for_budget(Config.STREAMING_CONFIG['chunk_lines'], memory_budget_mb)
+        
+        for log_file in log_files:
+            if not os.path.exists(log_file):
                 logger.warning(f"Log file not found: {log_file}")
+                continue
+            
+            try:
+                aggregates.consume_file(log_file, self.parser, chunk_lines,
+                                        resume=resume, complete_lines_only=complete_lines_only)
             except Exception as e:
                 logger.error(f"Error processing {log_file}: {str(e)}")
         
-        logger.info(f"Processed logs for {len(self.user_logs)} users")
-        return dict(self.user_logs)
+        state_mb = aggregates.nbytes / 1024 / 1024
+        logger.info(f"Aggregated {aggregates.rows} logs for {aggregates.num_users} users "
+                    f"({state_mb:.1f} MB state, {chunk_lines} lines per chunk)")
+        if state_mb > memory_budget_mb:
+            logger.warning(f"Aggregate state ({state_mb:.1f} MB) exceeds the memory budget "
+                           f"({memory_budget_mb} MB); it grows with the number of users")
+        return aggregates
     
-    def create_sample_logs(self, num_users: int = 50, logs_per_user: int = 100) -> List[str]:
+    def create_sample_logs(self, num_users: int = 50, logs_per_user: int = 100,
+                           output_path: str = 'sample_logs.txt', seed: int = None) -> List[str]:
         """Generate sample log data for demonstration"""
-        sample_logs = []
-        actions = ['GET', 'POST', 'PUT', 'DELETE', 'LOGIN', 'LOGOUT', 'FAILED_LOGIN']
-        resources = ['/api/data', '/login', '/dashboard', '/profile', '/settings', '/admin']
-        status_codes = [200, 201, 400, 401, 403, 404, 500]
+        generator = SyntheticLogGenerator(
+            num_users=num_users, logs_per_user=logs_per_user, seed=seed,
+            anomaly_ratio=Config.GENERATOR_CONFIG['anomaly_ratio'],
+            anomaly_line_rate=Config.GENERATOR_CONFIG['anomaly_line_rate'],
+            anomaly_mix=Config.GENERATOR_CONFIG['anomaly_mix'],
+            days=Config.GENERATOR_CONFIG['days'],
+            chunk_lines=Config.GENERATOR_CONFIG['chunk_lines']
+        )
+        generator.write(output_path)
         
-        for user_id in range(1, num_users + 1):
-            user_name = f"user{user_id:03d}"
-            
-            # Create baseline behavior for most users
-            is_anomalous = np.random.random() < 0.1  # 10% anomalous users
-            
-            for log_id in range(logs_per_user):
-                timestamp = datetime.now() - timedelta(
-                    days=np.random.randint(0, 30),
-                    hours=np.random.randint(0, 24),
-                    minutes=np.random.randint(0, 60)
-                )
-                
-                if is_anomalous and np.random.random() < 0.3:
-                    # Anomalous behavior patterns
-                    action = np.random.choice(['FAILED_LOGIN', 'DELETE', 'GET'])
-                    resource = np.random.choice(['/admin', '/sensitive', '/api/data'])
-                    status_code = np.random.choice([401, 403, 404, 500])
-                    response_time = np.random.randint(5000, 15000)  # Very slow
-                    ip = f"192.168.{np.random.randint(100, 200)}.{np.random.randint(1, 255)}"
-                else:
-                    # Normal behavior
-                    action = np.random.choice(actions[:5])  # Avoid failed logins mostly
-                    resource = np.random.choice(resources[:4])  # Avoid admin
-                    status_code = np.random.choice([200, 201, 400])
-                    response_time = np.random.randint(100, 2000)  # Normal response time
-                    ip = f"192.168.1.{np.random.randint(1, 100)}"
-                
-                log_entry = (
-                    f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')} "
-                    f"user:{user_name} {ip} {action} {resource} "
-                    f"status:{status_code} time:{response_time}ms"
-                )
-                sample_logs.append(log_entry)
-        
-        # Save sample logs to file
-        with open('sample_logs.txt', 'w') as f:
-            f.write('\n'.join(sample_logs))
-        
-        return ['sample_logs.txt']
+        return [output_path]
 
 class UserFeatureExtractor:
     """Extracts features from user-specific log data"""
     
     def __init__(self):
         self.feature_names = []
+        # Feature groups of the last extract_all_features run
+        self.plan = None
     
-    def extract_user_features(self, user_logs: List[Dict]) -> Dict[str, float]:
-        """Extract features for a specific user"""
+    def extract_user_features(self, user_logs: List[Dict], plan: FeaturePlan = None) -> Dict[str, float]:
+        """Extract features for a specific user (by default the groups of the last run)"""
         if not user_logs:
             return {}
         
+        plan = plan or self.plan or build_feature_plan()
         features = {}
         
         # Convert to DataFrame for easier processing
@@ -144,17 +312,18 @@ class UserFeatureExtractor:
         
         # Time-based features
         features['total_logs'] = len(user_logs)
-        features['unique_days'] = len(df['timestamp'].dt.date.unique()) if 'timestamp' in df.columns else 0
-        features['avg_logs_per_day'] = features['total_logs'] / max(features['unique_days'], 1)
+        if 'time' in plan:
+            features['unique_days'] = len(df['timestamp'].dt.date.unique()) if 'timestamp' in df.columns else 0
+            features['avg_logs_per_day'] = features['total_logs'] / max(features['unique_days'], 1)
         
         # Activity time features
-        if 'timestamp' in df.columns:
+        if 'time' in plan and 'timestamp' in df.columns:
             df['hour'] = df['timestamp'].dt.hour
             features['night_activity_ratio'] = len(df[(df['hour'] >= 22) | (df['hour'] <= 6)]) / len(df)
             features['weekend_activity_ratio'] = len(df[df['timestamp'].dt.weekday >= 5]) / len(df)
         
         # Action-based features
-        if 'action' in df.columns:
+        if 'action' in plan and 'action' in df.columns:
             action_counts = df['action'].value_counts()
             features['failed_login_ratio'] = action_counts.get('FAILED_LOGIN', 0) / len(df)
             features['delete_ratio'] = action_counts.get('DELETE', 0) / len(df)
@@ -162,21 +331,21 @@ class UserFeatureExtractor:
             features['unique_actions'] = len(action_counts)
         
         # Resource access features
-        if 'resource' in df.columns:
+        if 'resource' in plan and 'resource' in df.columns:
             resource_counts = df['resource'].value_counts()
             features['unique_resources'] = len(resource_counts)
             features['admin_access_ratio'] = len(df[df['resource'].str.contains('/admin', na=False)]) / len(df)
             features['resource_diversity'] = len(resource_counts) / len(df)
         
         # Status code features
-        if 'status_code' in df.columns:
+        if 'status' in plan and 'status_code' in df.columns:
             status_counts = df['status_code'].value_counts()
             features['error_rate'] = len(df[df['status_code'] >= 400]) / len(df)
             features['success_rate'] = len(df[df['status_code'] < 400]) / len(df)
             features['unique_status_codes'] = len(status_counts)
         
         # Response time features
-        if 'response_time' in df.columns:
+        if 'response_time' in plan and 'response_time' in df.columns:
             response_times = df['response_time'].dropna()
             if len(response_times) > 0:
                 features['avg_response_time'] = response_times.mean()
@@ -185,13 +354,13 @@ class UserFeatureExtractor:
                 features['slow_requests_ratio'] = len(response_times[response_times > 5000]) / len(response_times)
         
         # IP address features
-        if 'ip_address' in df.columns:
+        if 'ip' in plan and 'ip_address' in df.columns:
             ip_counts = df['ip_address'].value_counts()
             features['unique_ips'] = len(ip_counts)
             features['ip_diversity'] = len(ip_counts) / len(df)
         
         # Session-based features (approximate)
-        if 'timestamp' in df.columns:
+        if 'session' in plan and 'timestamp' in df.columns:
             df_sorted = df.sort_values('timestamp')
             time_diffs = df_sorted['timestamp'].diff().dt.total_seconds()
             features['avg_session_length'] = time_diffs.mean() if len(time_diffs) > 1 else 0
@@ -204,18 +373,29 @@ class UserFeatureExtractor:
         
         return features
     
-    def extract_all_features(self, user_logs_dict: Dict[str, List[Dict]]) -> pd.DataFrame:
-        """Extract features for all users"""
+    def extract_all_features(self, user_logs_dict: Mapping[str, List[Dict]], batched: bool = True,
+                             plan: FeaturePlan = None) -> pd.DataFrame:
+        """Extract the features of the groups in plan (by default those enabled in FEATURE_CONFIG) for all users"""
         logger.info("Extracting features for all users...")
         
-        feature_data = []
-        
-        for user_id, logs in user_logs_dict.items():
-            user_features = self.extract_user_features(logs)
-            user_features['user_id'] = user_id
-            feature_data.append(user_features)
-        
-        feature_df = pd.DataFrame(feature_data)
+        if isinstance(user_logs_dict, StreamingFeatureAggregator):
+            # Features are finalized from the streaming aggregates, which were folded for their own plan
+            self.plan = user_logs_dict.plan
+            feature_df = user_logs_dict.to_frame()
+        elif batched and isinstance(user_logs_dict, ColumnarLogStore):
+            # One vectorized pass over the whole log table
+            self.plan = plan or build_feature_plan()
+            feature_df = BatchFeatureExtractor().extract(user_logs_dict, self.plan)
+        else:
+            self.plan = plan or build_feature_plan()
+            feature_data = []
+            
+            for user_id, logs in user_logs_dict.items():
+                user_features = self.extract_user_features(logs, self.plan)
+                user_features['user_id'] = user_id
+                feature_data.append(user_features)
+            
+            feature_df = pd.DataFrame(feature_data)
         
         # Store feature names for later use
         self.feature_names = [col for col in feature_df.columns if col != 'user_id']
@@ -225,147 +405,747 @@ class UserFeatureExtractor:
         return feature_df
 
 class ExtendedIsolationForest:
-    """Extended Isolation Forest implementation for anomaly detection"""
+    """Extended Isolation Forest implementation for anomaly detection.
+    
+    The 'sklearn' backend uses scikit-learn's axis-parallel IsolationForest; the
+    'native' backend uses HyperplaneIsolationForest (random hyperplane splits).
+    """
     
-    def __init__(self, contamination=0.1, n_estimators=100, random_state=42):
+    def __init__(self, contamination=0.1, n_estimators=100, random_state=42, backend=None,
+                 score_normalization=None):
         self.contamination = contamination
         self.n_estimators = n_estimators
         self.random_state = random_state
+        self.backend = backend or Config.MODEL_CONFIG['backend']
+        self.score_normalization = score_normalization or Config.MODEL_CONFIG['score_normalization']
         self.model = None
         self.scaler = StandardScaler()
         self.feature_names = []
         self.is_fitted = False
+        self.score_range = None
+        self.score_quantiles = None
+        self.trained_at = None
+        self.model_version = None
+        # Users the trees were grown on (fewer than were scaled when fitted on a sample)
+        self.training_users = None
+        # Called with 'fit' / 'score' once features are scaled (e.g. to profile scaling separately)
+        self.stage_callback = None
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['stage_callback'] = None
+        return state
     
-    def fit(self, X: pd.DataFrame, feature_names: List[str]):
-        """Train the Extended Isolation Forest model"""
+    def _start_stage(self, name: str) -> None:
+        if self.stage_callback is not None:
+            self.stage_callback(name)
+    
+    def fit(self, X, feature_names: List[str] = None):
+        """Train the Extended Isolation Forest model on a FeatureMatrix (scaled in place) or a feature frame.
+        
+        With MODEL_CONFIG['training_sample_size'] the scaler still sees every user,
+        but the trees and the training score range come from a random (by default
+        stratified) sample of users; the rest are scored in batches afterwards.
+        """
         logger.info("Training Extended Isolation Forest model...")
+        model_config = Config.MODEL_CONFIG
+        Config.validate_model_config(model_config)
         
-        # Remove user_id column if present
-        if 'user_id' in X.columns:
-            X_features = X.drop('user_id', axis=1)
+        # Train on the feature columns only (not user_id or, for windows, the window bounds)
+        if isinstance(X, FeatureMatrix):
+            matrix = X
+            if feature_names is not None and list(feature_names) != matrix.feature_names:
+                raise ValueError('Feature names do not match the feature matrix')
         else:
-            X_features = X.copy()
-        
-        self.feature_names = feature_names
+            if feature_names is None:
+                # Every feature column of the frame (not the user id or, for windows, the window bounds)
+                feature_names = [col for col in X.columns if col != 'user_id' and not col.startswith('window_')]
+            matrix = FeatureMatrix.from_frame(X, feature_names)
+        self.feature_names = matrix.feature_names
         
-        # Handle missing values
-        X_features = X_features.fillna(0)
-        
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X_features)
+        # Scale features in place; the matrix then serves scoring and prediction as is
+        self.scaler = matrix.fit_scaler(StandardScaler())
+        sample_size = model_config['training_sample_size']
+        sample_rows = None
+        if sample_size is not None and sample_size < len(matrix):
+            # Drawn before scaling, so strata are bins of the raw feature
+            stratify_by = model_config['training_stratify_by']
+            if stratify_by not in matrix.feature_names:
+                stratify_by = None
+            sample_rows = matrix.sample_rows(sample_size, self.random_state, stratify_by,
+                                             model_config['training_strata'])
+            logger.info(f"Training on {len(sample_rows)} of {len(matrix)} users"
+                        f"{f' stratified by {stratify_by}' if stratify_by else ''}")
+        matrix.scale(self.scaler, self)
+        X_scaled = matrix.values if sample_rows is None else matrix.values[sample_rows]
+        self.training_users = len(X_scaled)
+        self._start_stage('fit')
         
         # Initialize and train Isolation Forest
-        self.model = IsolationForest(
-            contamination=self.contamination,
-            n_estimators=self.n_estimators,
-            random_state=self.random_state,
-            n_jobs=-1
-        )
+        if self.backend == 'native':
+            self.model = HyperplaneIsolationForest(
+                contamination=self.contamination,
+                n_estimators=self.n_estimators,
+                extension_level=model_config['extension_level'],
+                n_jobs=model_config['training_workers'],
+                random_state=self.random_state
+            )
+        elif self.backend == 'sklearn':
+            self.model = IsolationForest(
+                contamination=self.contamination,
+                n_estimators=self.n_estimators,
+                random_state=self.random_state,
+                n_jobs=-1
+            )
+        else:
+            raise ValueError(f"Unknown isolation forest backend: {self.backend}")
         
         self.model.fit(X_scaled)
         self.is_fitted = True
         
+        # Keep the training score range and column layout so saved bundles can score other data
+        if sample_rows is None:
+            training_scores = self._raw_scores(matrix) - self.model.offset_
+        else:
+            training_scores = self.model.score_samples(X_scaled) - self.model.offset_
+        self.score_range = (float(training_scores.min()), float(training_scores.max()))
+        self.score_quantiles = np.quantile(training_scores, np.linspace(0, 1, SCORE_QUANTILES))
+        self.trained_at = datetime.now().isoformat()
+        
         logger.info("Model training completed")
     
-    def predict_anomaly_scores(self, X: pd.DataFrame) -> np.ndarray:
-        """Predict anomaly scores for new data"""
-        if not self.is_fitted:
-            raise ValueError("Model must be fitted before prediction")
+    def prepare_features(self, X) -> FeatureMatrix:
+        """Get X as a FeatureMatrix of the training features, scaled by this model.
         
-        # Remove user_id column if present
-        if 'user_id' in X.columns:
-            X_features = X.drop('user_id', axis=1)
-        else:
-            X_features = X.copy()
+        Frames are copied into a new matrix (missing features become 0); a matrix
+        is scaled in place the first time and reused as is afterwards.
+        """
+        if not isinstance(X, FeatureMatrix):
+            X = FeatureMatrix.from_frame(X, self.feature_names)
+        elif X.feature_names != self.feature_names:
+            raise ValueError('Feature matrix columns do not match the model features')
         
-        # Handle missing values
-        X_features = X_features.fillna(0)
+        if X.scaled_for is None:
+            X.scale(self.scaler, self)
+        elif X.scaled_for is not self:
+            raise ValueError('Feature matrix was scaled for another model')
+        return X
+    
+    def _raw_scores(self, matrix: FeatureMatrix) -> np.ndarray:
+        """score_samples of a prepared matrix, computed once per matrix in fixed-size batches of users"""
+        if matrix.raw_scores is None:
+            raw_scores = np.empty(len(matrix))
+            for start, block in matrix.blocks(Config.MODEL_CONFIG['scoring_batch_size']):
+                raw_scores[start:start + len(block)] = self.model.score_samples(block)
+            matrix.raw_scores = raw_scores
+        return matrix.raw_scores
+    
+    def save(self, path: str) -> Dict[str, Any]:
+        """Save the fitted scaler, forest, feature names and training score range as a versioned bundle"""
+        if not self.is_fitted:
+            raise ValueError("Model must be fitted before saving")
         
-        # Scale features
-        X_scaled = self.scaler.transform(X_features)
+        bundle = {
+            'bundle_version': MODEL_BUNDLE_VERSION,
+            'model_version': datetime.now().strftime('%Y%m%d%H%M%S%f'),
+            'trained_at': self.trained_at,
+            'contamination': self.contamination,
+            'n_estimators': self.n_estimators,
+            'random_state': self.random_state,
+            'backend': self.backend,
+            'training_users': self.training_users,
+            'feature_names': list(self.feature_names),
+            'score_range': self.score_range,
+            'score_quantiles': self.score_quantiles,
+            'score_normalization': self.score_normalization,
+            'scaler': self.scaler,
+            'model': self.model
+        }
         
-        # Get anomaly scores (negative values indicate anomalies)
-        anomaly_scores = self.model.decision_function(X_scaled)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(bundle, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
         
-        # Convert to positive scores where higher values indicate more anomalous behavior
-        normalized_scores = (anomaly_scores - anomaly_scores.min()) / (anomaly_scores.max() - anomaly_scores.min())
-        inverted_scores = 1 - normalized_scores  # Higher values = more anomalous
+        logger.info(f"Saved model bundle {bundle['model_version']} to {path}")
+        return {key: value for key, value in bundle.items() if key not in ('scaler', 'model', 'score_quantiles')}
+    
+    @classmethod
+    def load(cls, path: str) -> 'ExtendedIsolationForest':
+        """Load a fitted model from a bundle written by save()"""
+        with open(path, 'rb') as f:
+            bundle = pickle.load(f)
+        
+        if not isinstance(bundle, dict) or bundle.get('bundle_version') != MODEL_BUNDLE_VERSION:
+            raise ValueError(f"Unsupported model bundle version in {path}")
         
-        return inverted_scores
+        forest = cls(
+            contamination=bundle['contamination'],
+            n_estimators=bundle['n_estimators'],
+            random_state=bundle['random_state'],
+            backend=bundle['backend'],
+            score_normalization=bundle['score_normalization']
+        )
+        forest.scaler = bundle['scaler']
+        forest.model = bundle['model']
+        forest.feature_names = bundle['feature_names']
+        forest.score_range = tuple(bundle['score_range'])
+        forest.score_quantiles = bundle['score_quantiles']
+        forest.trained_at = bundle['trained_at']
+        forest.training_users = bundle['training_users']
+        forest.model_version = bundle['model_version']
+        forest.is_fitted = True
+        return forest
     
-    def predict(self, X: pd.DataFrame) -> np.ndarray:
-        """Predict anomalies (-1 for anomaly, 1 for normal)"""
+    def predict_anomaly_scores(self, X) -> np.ndarray:
+        """Predict anomaly scores for a FeatureMatrix or a feature frame"""
         if not self.is_fitted:
             raise ValueError("Model must be fitted before prediction")
         
-        # Remove user_id column if present
-        if 'user_id' in X.columns:
-            X_features = X.drop('user_id', axis=1)
+        # Select the training features in training order, handle missing values and scale
+        matrix = self.prepare_features(X)
+        self._start_stage('score')
+        raw_scores = self._raw_scores(matrix)
+        
+        if self.score_normalization == 'path_length':
+            # Raw isolation score 2^(-E[h(x)]/c(n)) in (0, 1], independent of any other user
+            return -raw_scores
+        
+        # Get anomaly scores (negative values indicate anomalies)
+        anomaly_scores = raw_scores - self.model.offset_
+        
+        # Convert to scores in [0, 1] where higher values indicate more anomalous behavior
+        return self.normalize_scores(anomaly_scores)
+    
+    def normalize_scores(self, anomaly_scores: np.ndarray) -> np.ndarray:
+        """Map decision_function output to [0, 1] anomaly scores (higher = more anomalous).
+        
+        'training_range' and 'quantile' are frozen at fit time, so a user's score does
+        not depend on which other users are scored with it. 'batch' min-max scales
+        over the scored batch itself.
+        """
+        if self.score_normalization == 'quantile':
+            # Share of training users that scored at least as normal as this one
+            levels = np.linspace(0, 1, len(self.score_quantiles))
+            return 1 - np.interp(anomaly_scores, self.score_quantiles, levels)
+        
+        if self.score_normalization == 'batch':
+            low, high = anomaly_scores.min(), anomaly_scores.max()
+        elif self.score_normalization == 'training_range':
+            low, high = self.score_range
         else:
-            X_features = X.copy()
+            raise ValueError(f"Unknown score normalization: {self.score_normalization}")
         
-        # Handle missing values
-        X_features = X_features.fillna(0)
+        if high == low:
+            return np.zeros(len(anomaly_scores))
         
-        # Scale features
-        X_scaled = self.scaler.transform(X_features)
+        normalized_scores = (anomaly_scores - low) / (high - low)
+        inverted_scores = 1 - normalized_scores  # Higher values = more anomalous
+        
+        # Users outside the training range are clipped to the ends of the scale
+        return np.clip(inverted_scores, 0.0, 1.0)
+    
+    def predict(self, X) -> np.ndarray:
+        """Predict anomalies (-1 for anomaly, 1 for normal)"""
+        if not self.is_fitted:
+            raise ValueError("Model must be fitted before prediction")
         
-        return self.model.predict(X_scaled)
+        # Reuses the scores of a matrix that was already scored
+        matrix = self.prepare_features(X)
+        return np.where(self._raw_scores(matrix) - self.model.offset_ < 0, -1, 1)
 
 class AnomalyDetectionFramework:
     """Main framework that orchestrates the entire anomaly detection process"""
     
-    def __init__(self, threshold=0.6, contamination=0.1):
-        self.threshold = threshold
+    def __init__(self, threshold=None, contamination=0.1):
+        # Without a threshold, runs use Config.DEFAULT_THRESHOLD (WINDOW_CONFIG['threshold'] if windowed)
+        self.threshold_set = threshold is not None
+        self.threshold = threshold if threshold is not None else Config.DEFAULT_THRESHOLD
         self.contamination = contamination
         self.preprocessor = LogPreprocessor()
         self.feature_extractor = UserFeatureExtractor()
         self.isolation_forest = ExtendedIsolationForest(contamination=contamination)
         self.results = {}
+        # reclassify swaps in a whole new results dict under this lock; readers take self.results
+        # once, so they never see the lists of two different thresholds
+        self._results_lock = threading.Lock()
+        # Called with each pipeline stage name as it starts (e.g. for job progress and cancellation)
+        self.stage_callback = None
+        # None, 'cprofile' or 'tracemalloc': extra capture added to each run's stage profile
+        self.profile_capture = None
+        self.profiler = None
+        # Where the last run's features came from: 'columnar' (exact, every parsed line),
+        # 'streaming' (mergeable per-user aggregates) or 'upload_aggregates' (folded while uploaded)
+        self.feature_source = None
     
-    def process_logs(self, log_files: List[str]) -> Dict[str, Any]:
-        """Complete pipeline for processing logs and detecting anomalies"""
+    def _start_stage(self, name: str) -> None:
+        if self.stage_callback is not None:
+            self.stage_callback(name)
+        if self.profiler is not None:
+            self.profiler.start(PROFILED_STAGES.get(name, name))
+            self.isolation_forest.stage_callback = self.profiler.start
+    
+    def _use_forest(self, forest: ExtendedIsolationForest) -> None:
+        """Replace the model mid-run, keeping its stages reported to the current profile"""
+        self.isolation_forest = forest
+        if self.profiler is not None:
+            forest.stage_callback = self.profiler.start
+    
+    def _start_run(self, windowed: bool = False) -> None:
+        """Pick the run's default threshold (unless one was set) and start its profile"""
+        if not self.threshold_set:
+            self.threshold = Config.WINDOW_CONFIG['threshold'] if windowed else Config.DEFAULT_THRESHOLD
+        self._start_profile()
+    
+    def _start_profile(self) -> None:
+        """Start measuring the stages of a pipeline run; _store_results adds the profile to the results"""
+        self.stop_profile()
+        self.profiler = StageProfiler(
+            capture=self.profile_capture,
+            top_functions=Config.PROFILING_CONFIG['top_functions'],
+            top_allocations=Config.PROFILING_CONFIG['top_allocations']
+        )
+    
+    def stop_profile(self) -> Dict[str, Any]:
+        """End the current run's profile (also after a failed or cancelled run) and return it"""
+        if self.profiler is None:
+            return None
+        profile = self.profiler.finish()
+        self.profiler = None
+        self.isolation_forest.stage_callback = None
+        return profile
+    
+    def _feature_matrix(self, feature_df: pd.DataFrame, feature_names: List[str]) -> FeatureMatrix:
+        """Copy the features of a run into a FeatureMatrix, memory-mapped from disk for large populations"""
+        model_config = Config.MODEL_CONFIG
+        spill_threshold = model_config['spill_threshold_users']
+        if spill_threshold is None or len(feature_df) < spill_threshold:
+            return FeatureMatrix.from_frame(feature_df, feature_names)
+        
+        spill_folder = model_config['spill_folder']
+        if spill_folder is not None:
+            os.makedirs(spill_folder, exist_ok=True)
+        logger.info(f"Memory-mapping the feature matrix of {len(feature_df)} users")
+        return FeatureMatrix.from_frame(feature_df, feature_names, spill_folder or tempfile.gettempdir())
+    
+    def process_logs(self, log_files: List[str], streaming: bool = None,
+                     aggregates: StreamingFeatureAggregator = None) -> Dict[str, Any]:
+        """Complete pipeline for processing logs and detecting anomalies.
+        
+        Aggregates already folded from these files (e.g. while they were uploaded) skip preprocessing.
+        """
         logger.info("Starting anomaly detection framework...")
+        self._start_run()
+        
+        # Steps 1-2: Log Preprocessing and Feature Extraction
+        extracted = self._extract_features(log_files, streaming, aggregates)
+        if extracted is None:
+            return {}
+        user_logs, aggregates, feature_df = extracted
         
-        # Step 1: Log Preprocessing
-        user_logs = self.preprocessor.preprocess_log_files(log_files)
+        # Step 3: Train Extended Isolation Forest on a float32 matrix scaled once and reused for scoring
+        self._start_stage('training')
+        features = self._feature_matrix(feature_df, self.feature_extractor.feature_names)
+        self.isolation_forest.fit(features)
         
-        if not user_logs:
-            logger.error("No user logs found after preprocessing")
+        # Step 4: Get Anomaly Scores
+        self._start_stage('scoring')
+        anomaly_scores = self.isolation_forest.predict_anomaly_scores(features)
+        
+        # Step 5: Apply Threshold and Classify
+        return self._store_results(user_logs, aggregates, feature_df, anomaly_scores)
+    
+    def score_logs(self, log_files: List[str], model_path: str = None, streaming: bool = None,
+                   aggregates: StreamingFeatureAggregator = None) -> Dict[str, Any]:
+        """Score log files with a saved model bundle, without fitting"""
+        logger.info("Starting score-only anomaly detection...")
+        self._start_run()
+        
+        if model_path is None:
+            model_path = Config.MODEL_CONFIG['bundle_path']
+        
+        self._start_stage('loading_model')
+        start = time.perf_counter()
+        self._use_forest(ExtendedIsolationForest.load(model_path))
+        model_load_seconds = time.perf_counter() - start
+        
+        extracted = self._extract_features(log_files, streaming, aggregates)
+        if extracted is None:
             return {}
+        user_logs, aggregates, feature_df = extracted
         
-        # Step 2: Feature Extraction
-        feature_df = self.feature_extractor.extract_all_features(user_logs)
+        missing = [name for name in self.isolation_forest.feature_names if name not in feature_df.columns]
+        if missing:
+            logger.warning(f"Model features {', '.join(missing)} were not extracted (disabled or absent "
+                           f"from these logs); they are scored as 0")
         
-        if feature_df.empty:
-            logger.error("No features extracted")
+        self._start_stage('scoring')
+        start = time.perf_counter()
+        features = self._feature_matrix(feature_df, self.isolation_forest.feature_names)
+        anomaly_scores = self.isolation_forest.predict_anomaly_scores(features)
+        scoring_seconds = time.perf_counter() - start
+        
+        logger.info(f"Scored {len(feature_df)} users with model {self.isolation_forest.model_version} "
+                    f"(load {model_load_seconds * 1000:.1f} ms, scoring {scoring_seconds * 1000:.1f} ms)")
+        
+        results = self._store_results(user_logs, aggregates, feature_df, anomaly_scores)
+        results['model'] = {
+            'model_version': self.isolation_forest.model_version,
+            'trained_at': self.isolation_forest.trained_at,
+            'bundle_path': model_path,
+            'load_seconds': model_load_seconds,
+            'scoring_seconds': scoring_seconds
+        }
+        return results
+    
+    def save_model(self, model_path: str = None) -> Dict[str, Any]:
+        """Save the fitted model as a bundle for later score-only runs"""
+        if model_path is None:
+            model_path = Config.MODEL_CONFIG['bundle_path']
+        return self.isolation_forest.save(model_path)
+    
+    def score_feature_rows(self, feature_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score a micro-batch of feature dictionaries without touching the rest of the population"""
+        if not self.isolation_forest.is_fitted:
+            self._use_forest(ExtendedIsolationForest.load(Config.MODEL_CONFIG['bundle_path']))
+        if self.isolation_forest.score_normalization == 'batch':
+            logger.warning("Batch score normalization makes micro-batch scores depend on the batch")
+        
+        if not feature_rows:
+            return []
+        
+        anomaly_scores = self.isolation_forest.predict_anomaly_scores(pd.DataFrame(feature_rows))
+        return [
+            {
+                'user_id': row.get('user_id'),
+                'anomaly_score': float(score),
+                'classification': 'Abnormal' if score > self.threshold else 'Normal'
+            }
+            for row, score in zip(feature_rows, anomaly_scores)
+        ]
+    
+    def score_users(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Recompute features for a few users from the current logs and score only them"""
+        user_logs = self.results.get('user_logs')
+        aggregates = self.results.get('aggregates')
+        
+        if aggregates is not None:
+            codes = [aggregates.vocabs['user_id'][user_id] for user_id in user_ids if user_id in aggregates]
+            feature_rows = aggregates.to_frame(np.array(codes, dtype=np.int64)).to_dict('records')
+        elif user_logs is not None:
+            feature_rows = []
+            for user_id in user_ids:
+                if user_id in user_logs:
+                    features = self.feature_extractor.extract_user_features(user_logs[user_id])
+                    features['user_id'] = user_id
+                    feature_rows.append(features)
+        else:
+            return []
+        
+        return self.score_feature_rows(feature_rows)
+    
+    def process_logs_incremental(self, log_files: List[str], retrain: bool = False) -> Dict[str, Any]:
+        """Score only what changed since the last run over the same (append-only) log files.
+        
+        Per-file byte offsets, per-user aggregates, features and the fitted model are
+        checkpointed. Later runs parse only the appended bytes, recompute features for
+        the users those bytes touched and rescore with the checkpointed model. The model
+        is retrained only when asked to, or when the features drift from the training data.
+        """
+        logger.info("Starting incremental anomaly detection...")
+        self._start_run()
+        incremental_config = Config.INCREMENTAL_CONFIG
+        checkpoint_path = IncrementalCheckpoint.path_for(log_files, incremental_config['checkpoint_folder'])
+        
+        self._start_stage('preprocessing')
+        # Appended lines are folded into the checkpointed streaming aggregates
+        self.feature_source = 'streaming'
+        checkpoint = IncrementalCheckpoint.load(checkpoint_path)
+        if checkpoint is not None and not (checkpoint.files_unchanged() and checkpoint.aggregates.matches_config()):
+            # A file was rotated, or the feature groups changed
+            checkpoint = None
+        drift = None
+        
+        if checkpoint is None:
+            # First run, or a file was rotated: start over from byte 0
+            aggregates = self.preprocessor.aggregate_log_files(log_files, complete_lines_only=True)
+            if not aggregates:
+                logger.error("No user logs found after preprocessing")
+                return {}
+            self._start_stage('feature_extraction')
+            feature_df = self.feature_extractor.extract_all_features(aggregates)
+            features = None
+            new_bytes = sum(aggregates.file_offsets.values())
+            affected_users = aggregates.num_users
+            retrain_reason = 'no checkpoint'
+        else:
+            aggregates = checkpoint.aggregates
+            consumed_before = sum(aggregates.file_offsets.values())
+            previous_counts = aggregates.log_counts()
+            self.preprocessor.aggregate_log_files(log_files, aggregates, resume=True, complete_lines_only=True)
+            new_bytes = sum(aggregates.file_offsets.values()) - consumed_before
+            
+            self._start_stage('feature_extraction')
+            changed = aggregates.changed_users(previous_counts)
+            affected_users = len(changed)
+            feature_df = checkpoint.feature_df
+            retrain_reason = 'requested' if retrain else None
+            
+            if affected_users:
+                updates = aggregates.to_frame(changed)
+                if list(updates.columns) != list(feature_df.columns):
+                    # A feature group appeared (e.g. the first response times); rebuild and refit
+                    feature_df = aggregates.to_frame()
+                    retrain_reason = retrain_reason or 'feature columns changed'
+                else:
+                    feature_df = pd.concat([feature_df.drop(changed, errors='ignore'), updates]).sort_index()
+            self.feature_extractor.feature_names = [col for col in feature_df.columns if col != 'user_id']
+            
+            self._use_forest(checkpoint.isolation_forest)
+            new_user_ratio = 1 - checkpoint.trained_users / max(len(feature_df), 1)
+            features = None
+            if retrain_reason is None:
+                # Scaled by the checkpointed model once, for the drift check and then for scoring
+                features = self.isolation_forest.prepare_features(
+                    self._feature_matrix(feature_df, self.isolation_forest.feature_names))
+                drift = feature_drift(features)
+                if drift > incremental_config['drift_threshold']:
+                    retrain_reason = f"feature drift {drift:.3f}"
+                elif new_user_ratio > incremental_config['max_new_user_ratio']:
+                    retrain_reason = f"{new_user_ratio:.0%} new users"
+        
+        if retrain_reason is not None:
+            self._use_forest(ExtendedIsolationForest(contamination=self.contamination))
+            self._start_stage('training')
+            logger.info(f"Retraining model ({retrain_reason})")
+            features = self._feature_matrix(feature_df, self.feature_extractor.feature_names)
+            self.isolation_forest.fit(features)
+            trained_users = len(feature_df)
+        else:
+            logger.info(f"Rescoring {len(feature_df)} users with the checkpointed model "
+                        f"({affected_users} users updated from {new_bytes} new bytes)")
+            trained_users = checkpoint.trained_users
+        
+        self._start_stage('scoring')
+        anomaly_scores = self.isolation_forest.predict_anomaly_scores(features)
+        
+        IncrementalCheckpoint(aggregates, feature_df, self.isolation_forest, trained_users).save(checkpoint_path)
+        
+        results = self._store_results(None, aggregates, feature_df, anomaly_scores)
+        results['incremental'] = {
+            'new_bytes': new_bytes,
+            'affected_users': affected_users,
+            'retrained': retrain_reason is not None,
+            'retrain_reason': retrain_reason,
+            'drift': drift,
+            'checkpoint': checkpoint_path
+        }
+        return results
+    
+    def process_logs_windowed(self, log_files: List[str], window_seconds: int = None,
+                              slide_seconds: int = None) -> Dict[str, Any]:
+        """Score every user in every tumbling or sliding time window of the logs.
+        
+        The model is fitted on per-(user, window) features and scores every window, so a
+        burst of anomalous activity is not diluted by a long normal history. A user's score
+        and classification are those of their most anomalous window; the windows and their
+        scores are kept in results['windows'] for per-user score time series.
+        """
+        logger.info("Starting windowed anomaly detection...")
+        self._start_run(windowed=True)
+        window_config = Config.WINDOW_CONFIG
+        window_seconds = window_seconds or window_config['window_seconds']
+        slide_seconds = slide_seconds or window_config['slide_seconds'] or window_seconds
+        window_extractor = WindowedFeatureExtractor(window_seconds, slide_seconds)
+        
+        # Windows need the timestamp of every line, so logs are kept rather than streamed
+        extracted = self._extract_features(log_files, streaming=False, required_fields=('timestamp',))
+        if extracted is None:
             return {}
+        user_logs, _, feature_df = extracted
         
-        # Step 3: Train Extended Isolation Forest
-        self.isolation_forest.fit(feature_df, self.feature_extractor.feature_names)
+        self._start_stage('window_features')
+        window_df = window_extractor.extract(user_logs, self.feature_extractor.plan)
+        if window_df.empty:
+            logger.error("No timestamped logs to split into windows")
+            return {}
+        window_features = [col for col in self.feature_extractor.feature_names if col in window_df.columns]
         
-        # Step 4: Get Anomaly Scores
-        anomaly_scores = self.isolation_forest.predict_anomaly_scores(feature_df)
+        self._start_stage('training')
+        window_matrix = self._feature_matrix(window_df, window_features)
+        self.isolation_forest.fit(window_matrix)
         
-        # Step 5: Apply Threshold and Classify
+        self._start_stage('scoring')
+        window_scores = self.isolation_forest.predict_anomaly_scores(window_matrix)
+        del window_matrix
+        
+        # Users without timestamped logs have no windows and score 0
+        peak_scores = np.zeros(len(window_df['user_id'].cat.categories))
+        np.maximum.at(peak_scores, window_df['user_id'].cat.codes.to_numpy(), window_scores)
+        user_positions = window_df['user_id'].cat.categories.get_indexer(feature_df['user_id'])
+        anomaly_scores = peak_scores[user_positions]
+        
+        rows = len(window_df)
+        results = self._store_results(user_logs, None, feature_df, anomaly_scores, stage_rows={
+            'window_features': rows, 'scaling': rows, 'fit': rows, 'score': rows
+        })
+        results['windows'] = {
+            'window_seconds': window_extractor.window_seconds,
+            'slide_seconds': window_extractor.slide_seconds,
+            'features': window_df,
+            'anomaly_scores': window_scores,
+            **window_extractor.stats
+        }
+        logger.info(f"Scored {rows} user windows; {int(np.count_nonzero(window_scores > self.threshold))} "
+                    f"above the threshold")
+        return results
+    
+    def get_user_windows(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get a user's window score time series from the last windowed run"""
+        windows = self.results.get('windows')
+        if windows is None:
+            return []
+        return user_window_series(windows['features'], windows['anomaly_scores'],
+                                  self.results.get('threshold', self.threshold), user_id)
+    
+    def _extract_features(self, log_files: List[str], streaming: bool = None,
+                          aggregates: StreamingFeatureAggregator = None, required_fields: Tuple[str, ...] = ()):
+        """Preprocess log files and extract features; returns (user_logs, aggregates, feature_df) or None.
+        
+        Only the fields read by the feature groups enabled in FEATURE_CONFIG (plus required_fields) are parsed.
+        """
+        if streaming is None:
+            streaming = Config.STREAMING_CONFIG['enabled']
+        plan = build_feature_plan(required_fields=required_fields)
+        self.preprocessor.set_fields(plan.fields)
+        if plan.skipped_fields:
+            logger.info(f"Feature groups {', '.join(plan.group_names)}; not parsing {', '.join(plan.skipped_fields)}")
+        
+        self._start_stage('preprocessing')
+        if aggregates is not None:
+            logger.info(f"Using {aggregates.rows} logs already aggregated for {aggregates.num_users} users")
+            self.feature_source = 'upload_aggregates'
+            user_logs = None
+            logs_source = aggregates
+        elif streaming:
+            # Chunks are folded into per-user aggregates, so memory is set by the user count
+            self.feature_source = 'streaming'
+            user_logs = None
+            aggregates = self.preprocessor.aggregate_log_files(log_files, StreamingFeatureAggregator(plan=plan))
+            logs_source = aggregates
+        else:
+            self.feature_source = 'columnar'
+            aggregates = None
+            user_logs = self.preprocessor.preprocess_log_files(log_files)
+            logs_source = user_logs
+        
+        if not logs_source:
+            logger.error("No user logs found after preprocessing")
+            return None
+        
+        self._start_stage('feature_extraction')
+        feature_df = self.feature_extractor.extract_all_features(logs_source, plan=plan)
+        
+        if feature_df.empty:
+            logger.error("No features extracted")
+            return None
+        
+        return user_logs, aggregates, feature_df
+    
+    def _store_results(self, user_logs, aggregates, feature_df: pd.DataFrame,
+                       anomaly_scores: np.ndarray, stage_rows: Dict[str, int] = None) -> Dict[str, Any]:
+        """Classify users and store the results of a run (stage_rows overrides the rows profiled per stage)"""
+        self._start_stage('classification')
         classifications = self.classify_users(anomaly_scores, feature_df['user_id'].values)
         
-        # Store results
         self.results = {
+            # user_id -> row position in features and anomaly_scores
+            'user_index': {user_id: position for position, user_id in enumerate(feature_df['user_id'])},
             'user_logs': user_logs,
+            'aggregates': aggregates,
             'features': feature_df,
             'anomaly_scores': anomaly_scores,
             'classifications': classifications,
             'threshold': self.threshold,
+            'parse_throughput': self.preprocessor.parser.get_throughput(),
+            'parse_cache': self.preprocessor.parse_cache_stats,
+            'feature_plan': self.feature_extractor.plan.describe() if self.feature_extractor.plan else None,
+            'feature_source': self.feature_source,
             'normal_users': [user for user, label in classifications.items() if label == 'Normal'],
             'abnormal_users': [user for user, label in classifications.items() if label == 'Abnormal']
         }
         
+        self.results['score_histogram'] = self.score_histogram()
+        
+        if self.profiler is not None:
+            log_rows = user_logs.num_rows if user_logs is not None else aggregates.rows
+            self.profiler.set_rows('parse', log_rows)
+            for stage in ('feature_extraction', 'scaling', 'fit', 'score', 'classify'):
+                self.profiler.set_rows(stage, len(feature_df))
+            for stage, rows in (stage_rows or {}).items():
+                self.profiler.set_rows(stage, rows)
+            self.results['profile'] = self.stop_profile()
+        
         logger.info(f"Detection completed: {len(self.results['normal_users'])} normal users, "
                    f"{len(self.results['abnormal_users'])} abnormal users")
         
         return self.results
     
+    def reclassify(self, threshold: float = None, target_rate: float = None) -> Dict[str, Any]:
+        """Re-apply a new threshold, or the threshold giving a target anomaly rate, to the stored scores"""
+        for name, value in (('threshold', threshold), ('target_rate', target_rate)):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                      or not np.isfinite(value)):
+                raise ValueError(f"{name} must be a number")
+        results = self.results
+        scores = results['anomaly_scores']
+        
+        if target_rate is not None:
+            if not 0 <= target_rate <= 1:
+                raise ValueError("target_rate must be between 0 and 1")
+            # Users scoring above the (k+1)-th highest score are at most the top k (fewer with ties)
+            k = int(round(target_rate * len(scores)))
+            if k >= len(scores):
+                threshold = float(np.nextafter(scores.min(), -np.inf))
+            else:
+                threshold = float(np.partition(scores, len(scores) - k - 1)[len(scores) - k - 1])
+        elif threshold is None:
+            raise ValueError("Provide a threshold or a target_rate")
+        threshold = float(threshold)
+        
+        abnormal = scores > threshold
+        user_ids = results['features']['user_id'].tolist()
+        labels = np.where(abnormal, 'Abnormal', 'Normal').tolist()
+        reclassified = {
+            **results,
+            'threshold': threshold,
+            'classifications': dict(zip(user_ids, labels)),
+            'abnormal_users': [user_id for user_id, flag in zip(user_ids, abnormal.tolist()) if flag],
+            'normal_users': [user_id for user_id, flag in zip(user_ids, abnormal.tolist()) if not flag]
+        }
+        
+        with self._results_lock:
+            self.results = reclassified
+            self.threshold = threshold
+            self.threshold_set = True
+        
+        total = len(scores)
+        return {
+            'threshold': threshold,
+            'total_users': total,
+            'normal_users': total - int(abnormal.sum()),
+            'abnormal_users': int(abnormal.sum()),
+            'anomaly_rate': float(abnormal.sum()) / max(total, 1) * 100
+        }
+    
+    def score_histogram(self, bins: int = SCORE_HISTOGRAM_BINS) -> Dict[str, Any]:
+        """Histogram of anomaly scores over [0, 1], e.g. to preview counts for a threshold slider"""
+        if bins == SCORE_HISTOGRAM_BINS and 'score_histogram' in self.results:
+            return self.results['score_histogram']
+        counts, edges = np.histogram(np.clip(self.results['anomaly_scores'], 0, 1), bins=bins, range=(0, 1))
+        return {'bin_edges': edges.tolist(), 'counts': counts.tolist()}
+    
     def classify_users(self, anomaly_scores: np.ndarray, user_ids: np.ndarray) -> Dict[str, str]:
         """Classify users based on anomaly scores and threshold"""
         classifications = {}
@@ -378,56 +1158,151 @@ class AnomalyDetectionFramework:
         
         return classifications
     
+    def query_users(self, classification: str = None, min_score: float = None, max_score: float = None,
+                    sort: str = 'score_desc', offset: int = 0, limit: int = None) -> Tuple[int, np.ndarray]:
+        """Filter users by classification and score range, sort them, and cut one page.
+        
+        Returns the number of matching users and the row positions of the page.
+        """
+        results = self.results
+        scores = results['anomaly_scores']
+        matched = np.ones(len(scores), dtype=bool)
+        
+        if classification == 'Abnormal':
+            matched &= scores > results['threshold']
+        elif classification == 'Normal':
+            matched &= scores <= results['threshold']
+        elif classification is not None:
+            raise ValueError(f"Unknown classification: {classification}")
+        if min_score is not None:
+            matched &= scores >= min_score
+        if max_score is not None:
+            matched &= scores <= max_score
+        
+        positions = np.flatnonzero(matched)
+        if sort == 'score_desc':
+            positions = positions[np.argsort(-scores[positions], kind='stable')]
+        elif sort == 'score_asc':
+            positions = positions[np.argsort(scores[positions], kind='stable')]
+        elif sort == 'user_id':
+            user_ids = results['features']['user_id'].to_numpy(dtype=str)
+            positions = positions[np.argsort(user_ids[positions], kind='stable')]
+        elif sort != 'log_order':  # 'log_order' keeps the order users first appeared in the logs
+            raise ValueError(f"Unknown sort order: {sort}")
+        
+        stop = None if limit is None else offset + limit
+        return len(positions), positions[offset:stop]
+    
+    def iter_user_results(self, positions: np.ndarray, include_logs: bool = False,
+                          chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield per-user results for the given row positions, materializing features chunk by chunk"""
+        results = self.results
+        features = results['features']
+        scores = results['anomaly_scores']
+        classifications = results['classifications']
+        logs_source = results['user_logs'] if results.get('user_logs') is not None else results['aggregates']
+        
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start:start + chunk_size]
+            for position, row in zip(chunk, features.iloc[chunk].to_dict('records')):
+                user_id = row['user_id']
+                # Missing features become None so every line is valid JSON
+                row = {name: None if isinstance(value, float) and np.isnan(value) else value
+                       for name, value in row.items()}
+                result = {
+                    'user_id': user_id,
+                    'anomaly_score': float(scores[position]),
+                    'classification': classifications[user_id],
+                    'total_logs': logs_source.user_log_count(user_id),
+                    'features': row
+                }
+                if include_logs:
+                    result['recent_logs'] = self.get_user_details(user_id)['recent_logs']
+                yield result
+    
+    def top_anomalies(self, k: int = 10) -> List[Tuple[str, float]]:
+        """Get the k highest-scoring users as (user_id, score), without sorting every score.
+        
+        Ties are broken by row position (the order users first appeared), as a stable sort would.
+        """
+        scores = self.results['anomaly_scores']
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        
+        if k < len(scores):
+            # argpartition finds the k-th largest score; every user tied with it stays a candidate
+            cutoff = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            candidates = np.flatnonzero(scores >= cutoff)
+        else:
+            candidates = np.arange(len(scores))
+        
+        top = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+        user_ids = self.results['features']['user_id'].iloc[top]
+        return [(user_id, float(scores[position])) for user_id, position in zip(user_ids, top)]
+    
     def get_user_details(self, user_id: str) -> Dict[str, Any]:
         """Get detailed information about a specific user"""
-        if user_id not in self.results.get('user_logs', {}):
+        results = self.results
+        user_logs = results.get('user_logs')
+        aggregates = results.get('aggregates')
+        logs_source = user_logs if user_logs is not None else aggregates
+        if not logs_source or user_id not in logs_source:
             return {}
         
-        user_logs = self.results['user_logs'][user_id]
-        user_features = self.results['features'][self.results['features']['user_id'] == user_id].iloc[0].to_dict()
-        user_score = self.results['anomaly_scores'][list(self.results['features']['user_id']).index(user_id)]
-        user_classification = self.results['classifications'][user_id]
+        position = results['user_index'][user_id]
+        user_features = results['features'].iloc[position].to_dict()
+        user_score = results['anomaly_scores'][position]
+        user_classification = results['classifications'][user_id]
         
-        return {
+        # Only the last 10 raw lines are read back from disk
+        if user_logs is not None:
+            recent_logs = user_logs.user_records(user_id, start=-10)
+        else:
+            recent_logs = aggregates.recent_records(user_id, self.preprocessor.parser)
+        
+        details = {
             'user_id': user_id,
-            'total_logs': len(user_logs),
+            'total_logs': logs_source.user_log_count(user_id),
             'anomaly_score': user_score,
             'classification': user_classification,
             'features': user_features,
-            'recent_logs': user_logs[-10:] if len(user_logs) > 10 else user_logs
+            'recent_logs': recent_logs
         }
+        if aggregates is not None and aggregates.top_resources is not None:
+            details['top_resources'] = aggregates.user_top_resources(user_id)
+        
+        return details
     
     def generate_report(self) -> str:
         """Generate a comprehensive report of the anomaly detection results"""
-        if not self.results:
+        results = self.results
+        if not results:
             return "No results available. Please run the detection process first."
         
         report = []
         report.append("=" * 60)
         report.append("ANOMALY DETECTION REPORT")
         report.append("=" * 60)
-        report.append(f"Threshold: {self.threshold}")
-        report.append(f"Total Users Analyzed: {len(self.results['classifications'])}")
-        report.append(f"Normal Users: {len(self.results['normal_users'])}")
-        report.append(f"Abnormal Users: {len(self.results['abnormal_users'])}")
-        report.append(f"Anomaly Rate: {len(self.results['abnormal_users']) / len(self.results['classifications']) * 100:.2f}%")
+        report.append(f"Threshold: {results['threshold']}")
+        report.append(f"Total Users Analyzed: {len(results['classifications'])}")
+        report.append(f"Normal Users: {len(results['normal_users'])}")
+        report.append(f"Abnormal Users: {len(results['abnormal_users'])}")
+        report.append(f"Anomaly Rate: {len(results['abnormal_users']) / len(results['classifications']) * 100:.2f}%")
         report.append("")
         
         # Top anomalous users
-        if self.results['abnormal_users']:
+        if results['abnormal_users']:
             report.append("TOP ANOMALOUS USERS:")
             report.append("-" * 30)
             
-            # Sort abnormal users by anomaly score
-            abnormal_scores = []
-            for user_id in self.results['abnormal_users']:
-                idx = list(self.results['features']['user_id']).index(user_id)
-                score = self.results['anomaly_scores'][idx]
-                abnormal_scores.append((user_id, score))
-            
-            abnormal_scores.sort(key=lambda x: x[1], reverse=True)
+            # Abnormal users are the highest scores, so the overall top 10 holds the top abnormal ones
+            abnormal_scores = [
+                (user_id, score) for user_id, score in self.top_anomalies(10)
+                if results['classifications'][user_id] == 'Abnormal'
+            ]
             
-            for user_id, score in abnormal_scores[:10]:  # Top 10
+            for user_id, score in abnormal_scores:  # Top 10
                 report.append(f"User: {user_id}, Anomaly Score: {score:.4f}")
         
         report.append("")
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+from typing import Dict, Any, Optional
+
+from log_store import ColumnarLogStore
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+META_FILE = 'meta.json'
+# Content hashes of analyzed files by path, size and modification time
+HASH_INDEX_FILE = 'hashes.json'
+
+
+def file_content_hash(log_file: str) -> str:
+    """Hash a file's content"""
+    digest = hashlib.sha256()
+    with open(log_file, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class ParsedLogCache:
+    """On-disk cache of parsed log files as columnar .npy arrays.
+
+    Entries are keyed by the file's content hash and the parser version, so a
+    re-uploaded or renamed file with the same content is not parsed again. A
+    file's hash is reused while its size and modification time are unchanged,
+    so unchanged files are not read in full on every run. Hits are
+    memory-mapped rather than read into memory. The least recently used
+    entries are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_folder: str, max_bytes: int):
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0, 'evictions': 0, 'bytes_hashed': 0}
+
+    def key_for(self, log_file: str, parser_version: str) -> str:
+        return f"{self.content_hash(log_file)[:32]}-{parser_version}"
+
+    def content_hash(self, log_file: str) -> str:
+        """The file's content hash, recomputed only if its size or modification time changed"""
+        path = os.path.abspath(log_file)
+        stat = os.stat(path)
+        known = self._read_hash_index().get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+
+        content_hash = file_content_hash(path)
+        self.stats['bytes_hashed'] += stat.st_size
+        self.record_hash(path, content_hash)
+        return content_hash
+
+    def record_hash(self, log_file: str, content_hash: str) -> None:
+        """Remember the content hash of a file as it is now (e.g. hashed while it was written)"""
+        path = os.path.abspath(log_file)
+        stat = os.stat(path)
+        index_path = os.path.join(self.cache_folder, HASH_INDEX_FILE)
+        # Forget files that are gone, so the index does not outgrow the upload folder
+        index = {name: value for name, value in self._read_hash_index().items() if os.path.exists(name)}
+        index[path] = [stat.st_size, stat.st_mtime_ns, content_hash]
+        tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logger.debug(f"Not saving the content hash of {path}: {str(e)}")
+
+    def _read_hash_index(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.cache_folder, HASH_INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str, log_file: str) -> Optional[ColumnarLogStore]:
+        """Load the cached parse of log_file (memory-mapped), or None on a miss"""
+        entry = os.path.join(self.cache_folder, key)
+        try:
+            with open(os.path.join(entry, META_FILE)) as f:
+                meta = json.load(f)
+            columns = {
+                name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r' if meta['num_rows'] else None)
+                for name in meta['columns']
+            }
+        except (OSError, ValueError, KeyError):
+            self.stats['misses'] += 1
+            return None
+
+        # Touch the entry so eviction treats it as recently used
+        os.utime(os.path.join(entry, META_FILE))
+        self.stats['hits'] += 1
+        self.stats['bytes_saved'] += os.path.getsize(log_file)
+        # Cached rows are already grouped by user; the source is the file being analyzed now
+        return ColumnarLogStore(columns, meta['vocabs'], [log_file], grouped=True)
+
+    def put(self, key: str, store: ColumnarLogStore) -> None:
+        """Write a single-file store to the cache, then evict old entries beyond max_bytes"""
+        entry = os.path.join(self.cache_folder, key)
+        tmp_entry = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(tmp_entry, exist_ok=True)
+            for name, values in store.columns.items():
+                np.save(os.path.join(tmp_entry, f"{name}.npy"), values)
+            with open(os.path.join(tmp_entry, META_FILE), 'w') as f:
+                json.dump({'num_rows': store.num_rows, 'columns': list(store.columns), 'vocabs': store.vocabs}, f)
+            os.rename(tmp_entry, entry)
+        except OSError as e:
+            # Another run cached the same content first, or the cache is not writable
+            logger.debug(f"Not caching parsed log {key}: {str(e)}")
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.cache_folder):
+            meta_path = os.path.join(entry.path, META_FILE)
+            if entry.is_dir() and os.path.exists(meta_path):
+                entries.append((os.path.getmtime(meta_path), directory_size(entry.path), entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.stats['evictions'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counts, source bytes not re-parsed, evictions and the current cache size"""
+        size = 0
+        if os.path.isdir(self.cache_folder):
+            size = sum(directory_size(entry.path) for entry in os.scandir(self.cache_folder) if entry.is_dir())
+        return {**self.stats, 'size_bytes': size}
@@ -0,0 +1,193 @@
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Not available on Windows
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MODES = ('cprofile', 'tracemalloc')
+METRIC_PREFIX = 'ubads'
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+class StageProfiler:
+    """Records wall time, CPU time, peak RSS and row counts for each stage of one pipeline run.
+
+    Stages run one after another; starting a stage ends the current one, and a
+    stage that runs more than once (e.g. scaling before fit and before score)
+    accumulates. CPU time is that of the calling thread. Peak RSS is the
+    process-wide high-water mark at the end of the stage, so only stages that
+    raise it show growth.
+
+    The optional capture mode adds a cProfile of the run (calling thread only) or
+    tracemalloc peaks per stage and the top allocation sites.
+    """
+
+    def __init__(self, capture: Optional[str] = None, top_functions: int = 25, top_allocations: int = 10):
+        if capture is not None and capture not in CAPTURE_MODES:
+            raise ValueError(f"Unknown profile capture mode: {capture}")
+        self.capture = capture
+        self.top_functions = top_functions
+        self.top_allocations = top_allocations
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.current = None
+        self.started_at = datetime.now().isoformat()
+        self._run_started = time.perf_counter()
+        self._stage_started = None
+        self._stage_cpu_started = None
+        self._stage_rss_started = None
+        self._profile = None
+        self._started_tracemalloc = False
+
+        if capture == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif capture == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def start(self, name: str) -> None:
+        """End the current stage and start (or resume) the named one"""
+        self._end_stage()
+        self.current = name
+        self.stages.setdefault(name, {
+            'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_bytes': None, 'rss_growth_bytes': 0, 'rows': None
+        })
+        if self.capture == 'tracemalloc':
+            tracemalloc.reset_peak()
+        self._stage_rss_started = peak_rss_bytes()
+        self._stage_cpu_started = time.thread_time()
+        self._stage_started = time.perf_counter()
+
+    def _end_stage(self) -> None:
+        if self.current is None:
+            return
+        stage = self.stages[self.current]
+        stage['wall_seconds'] += time.perf_counter() - self._stage_started
+        stage['cpu_seconds'] += time.thread_time() - self._stage_cpu_started
+        peak = peak_rss_bytes()
+        if peak is not None:
+            stage['peak_rss_bytes'] = peak
+            stage['rss_growth_bytes'] += peak - self._stage_rss_started
+        if self.capture == 'tracemalloc':
+            stage['traced_peak_bytes'] = max(stage.get('traced_peak_bytes', 0), tracemalloc.get_traced_memory()[1])
+        self.current = None
+
+    def set_rows(self, name: str, rows: int) -> None:
+        """Record how many rows (log lines or users) a stage processed"""
+        if name in self.stages:
+            self.stages[name]['rows'] = int(rows)
+
+    def finish(self) -> Dict[str, Any]:
+        """End the run and return its per-stage measurements and capture output"""
+        self._end_stage()
+        profile = {
+            'started_at': self.started_at,
+            'wall_seconds': time.perf_counter() - self._run_started,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': self.stages,
+            'capture': self.capture
+        }
+
+        if self._profile is not None:
+            self._profile.disable()
+            output = io.StringIO()
+            pstats.Stats(self._profile, stream=output).sort_stats('cumulative').print_stats(self.top_functions)
+            profile['cprofile'] = output.getvalue()
+            self._profile = None
+
+        if self.capture == 'tracemalloc' and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            profile['top_allocations'] = [
+                {'location': str(stat.traceback), 'size_bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:self.top_allocations]
+            ]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+        return profile
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Keeps the profiles of the last max_runs runs and renders them in the Prometheus text format"""
+
+    STAGE_METRICS = (
+        ('wall_seconds', 'Wall-clock time spent in a pipeline stage'),
+        ('cpu_seconds', 'CPU time of the pipeline thread in a pipeline stage'),
+        ('peak_rss_bytes', 'Process peak resident set size at the end of a pipeline stage'),
+        ('rss_growth_bytes', 'Growth of the process peak resident set size during a pipeline stage'),
+        ('rows', 'Rows (log lines or users) processed by a pipeline stage'),
+        ('traced_peak_bytes', 'Peak memory traced by tracemalloc during a pipeline stage')
+    )
+
+    def __init__(self, max_runs: int = 20):
+        self.runs = deque(maxlen=max_runs)
+        self.runs_total = 0
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, profile: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self.runs.append({'run_id': run_id, 'labels': labels or {}, 'profile': profile})
+            self.runs_total += 1
+
+    def recent_runs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.runs)
+
+    def to_prometheus(self) -> str:
+        """Render the recorded runs as Prometheus text exposition (version 0.0.4)"""
+        runs = self.recent_runs()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_runs_total Pipeline runs recorded since startup",
+            f"# TYPE {METRIC_PREFIX}_runs_total counter",
+            f"{METRIC_PREFIX}_runs_total {self.runs_total}",
+            f"# HELP {METRIC_PREFIX}_run_wall_seconds Wall-clock time of a whole pipeline run",
+            f"# TYPE {METRIC_PREFIX}_run_wall_seconds gauge"
+        ]
+
+        def label_text(run, **extra) -> str:
+            labels = {'run': run['run_id'], **run['labels'], **extra}
+            return ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+
+        for run in runs:
+            lines.append(f"{METRIC_PREFIX}_run_wall_seconds{{{label_text(run)}}} {run['profile']['wall_seconds']}")
+
+        for metric, help_text in self.STAGE_METRICS:
+            samples = [
+                f"{METRIC_PREFIX}_stage_{metric}{{{label_text(run, stage=stage)}}} {values[metric]}"
+                for run in runs
+                for stage, values in run['profile']['stages'].items()
+                if values.get(metric) is not None
+            ]
+            if samples:
+                lines.append(f"# HELP {METRIC_PREFIX}_stage_{metric} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_stage_{metric} gauge")
+                lines.extend(samples)
+
+        return '\n'.join(lines) + '\n'
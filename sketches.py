@@ -0,0 +1,266 @@
+import hashlib
+import numpy as np
+from typing import Iterable, List, Tuple
+
+_HASH_MASK = 0xFFFFFFFF
+
+
+def hash_strings(values: Iterable[str]) -> np.ndarray:
+    """Stable 32-bit hashes of strings (the same in every process, unlike hash())"""
+    return np.array([int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'little')
+                     for value in values], dtype=np.uint32)
+
+
+def hash_integers(values: np.ndarray) -> np.ndarray:
+    """32-bit hashes of integers (MurmurHash3's finalizer, a bijection on 32-bit values)"""
+    h = values.astype(np.int64).astype(np.uint64) & _HASH_MASK
+    h ^= h >> np.uint64(16)
+    h = (h * np.uint64(0x85EBCA6B)) & _HASH_MASK
+    h ^= h >> np.uint64(13)
+    h = (h * np.uint64(0xC2B2AE35)) & _HASH_MASK
+    h ^= h >> np.uint64(16)
+    return h.astype(np.uint32)
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) else values
+
+
+def hyperloglog_estimate(registers: np.ndarray) -> np.ndarray:
+    """Estimate the distinct count of each row of HyperLogLog registers (with small-range correction)"""
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+    # Linear counting is more accurate while many registers are still empty
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class HyperLogLogSet:
+    """Mergeable per-user distinct counts of hashed values: exact while small, HyperLogLog once large.
+
+    Values are added as 32-bit hashes, so sets built from different chunks,
+    files or processes merge without sharing dictionaries. Each user's hashes
+    are kept exactly, as sorted (user, hash) keys, until there are more than
+    m / 8 of them (where the keys would outgrow the registers). They are then
+    replaced by m = 2^precision one-byte HyperLogLog registers, so a user costs
+    at most m bytes however many distinct values they have.
+
+    Error bounds: while exact, counts are off only by 32-bit hash collisions
+    (about n^2 / 2^33 values, under 0.01% at the m / 8 switch). Above it the
+    estimate has a relative standard error of 1.04 / sqrt(m): 1.6% at the
+    default precision 12, so about 95% of estimates are within 3.3%.
+    """
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError('HyperLogLog precision must be between 4 and 16')
+        self.precision = precision
+        self.m = 1 << precision
+        self.sparse_limit = self.m // 8
+        self.keys = np.empty(0, dtype=np.int64)
+        self.pending: List[np.ndarray] = []
+        self.pending_size = 0
+        # User code -> row of registers, -1 while the user is still exact
+        self.dense_rows = np.full(0, -1, dtype=np.int64)
+        self.registers = np.zeros((0, self.m), dtype=np.uint8)
+        self.dense_users = 0
+
+    def _dense_mask(self, user_codes: np.ndarray) -> np.ndarray:
+        known = user_codes < len(self.dense_rows)
+        dense = np.zeros(len(user_codes), dtype=bool)
+        dense[known] = self.dense_rows[user_codes[known]] >= 0
+        return dense
+
+    def _update_registers(self, rows: np.ndarray, hashes: np.ndarray) -> None:
+        width = 32 - self.precision
+        hashes = hashes.astype(np.uint32)
+        index = (hashes >> np.uint32(width)).astype(np.int64)
+        rest = hashes & np.uint32((1 << width) - 1)
+        # Rank: position of the leftmost 1 bit in the remaining bits (width + 1 when they are all 0)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, (rows, index), rank)
+
+    def add(self, user_codes: np.ndarray, hashes: np.ndarray) -> None:
+        """Add (user, value hash) pairs"""
+        if len(hashes) == 0:
+            return
+        user_codes = user_codes.astype(np.int64)
+        dense = self._dense_mask(user_codes)
+        if dense.any():
+            self._update_registers(self.dense_rows[user_codes[dense]], hashes[dense])
+        keys = _sorted_unique((user_codes[~dense] << 32) | (hashes[~dense].astype(np.int64) & _HASH_MASK))
+        self.pending.append(keys)
+        self.pending_size += len(keys)
+        if self.pending_size > max(len(self.keys), 1 << 16):
+            self.compact()
+
+    def compact(self) -> None:
+        """Merge buffered keys and switch users beyond the exact limit to registers"""
+        if self.pending:
+            self.keys = _sorted_unique(np.concatenate([self.keys] + self.pending))
+            self.pending = []
+            self.pending_size = 0
+        if len(self.keys):
+            counts = np.bincount(self.keys >> 32)
+            self._promote(np.flatnonzero(counts > self.sparse_limit))
+
+    def _promote(self, user_codes: np.ndarray) -> None:
+        """Move the exact keys of these users into new register rows"""
+        user_codes = user_codes[~self._dense_mask(user_codes)]
+        if len(user_codes) == 0:
+            return
+
+        if len(self.dense_rows) <= user_codes.max():
+            grown = np.full(max(int(user_codes.max()) + 1, 2 * len(self.dense_rows)), -1, dtype=np.int64)
+            grown[:len(self.dense_rows)] = self.dense_rows
+            self.dense_rows = grown
+        needed = self.dense_users + len(user_codes)
+        if needed > len(self.registers):
+            registers = np.zeros((max(needed, 2 * len(self.registers)), self.m), dtype=np.uint8)
+            registers[:self.dense_users] = self.registers[:self.dense_users]
+            self.registers = registers
+        self.dense_rows[user_codes] = np.arange(self.dense_users, needed)
+        self.dense_users = needed
+
+        key_users = self.keys >> 32
+        moving = self._dense_mask(key_users)
+        self._update_registers(self.dense_rows[key_users[moving]], self.keys[moving] & _HASH_MASK)
+        self.keys = self.keys[~moving]
+
+    def merge(self, other: 'HyperLogLogSet', user_remap: np.ndarray) -> None:
+        """Add another set's values, with its user codes mapped through user_remap"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sets of different precision')
+        other.compact()
+        self.compact()
+
+        # Users dense on either side end up dense, with the element-wise max of the registers
+        other_dense = np.flatnonzero(other.dense_rows >= 0)
+        self._promote(user_remap[other_dense])
+        if len(other_dense):
+            rows = self.dense_rows[user_remap[other_dense]]
+            self.registers[rows] = np.maximum(self.registers[rows], other.registers[other.dense_rows[other_dense]])
+        self.add(user_remap[other.keys >> 32], other.keys & _HASH_MASK)
+
+    def counts(self, n_users: int) -> np.ndarray:
+        """Count (or estimate) distinct values per user"""
+        self.compact()
+        counts = np.bincount(self.keys >> 32, minlength=n_users)[:n_users]
+        dense_users = np.flatnonzero(self.dense_rows[:n_users] >= 0)
+        if len(dense_users):
+            registers = self.registers[self.dense_rows[dense_users]]
+            counts[dense_users] = np.rint(hyperloglog_estimate(registers)).astype(np.int64)
+        return counts
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + sum(keys.nbytes for keys in self.pending) +
+                   self.dense_users * self.m + self.dense_rows.nbytes)
+
+
+class HeavyHitters:
+    """Mergeable per-user Misra-Gries summaries of the most frequent values (codes).
+
+    Each user keeps at most k (value, count) counters. A kept count
+    underestimates the true count by at most (n - sum of the user's counters)
+    / (k + 1) <= n / (k + 1), where n is the number of values the user added,
+    and every value seen more than n / (k + 1) times is kept. Chunks and other
+    summaries are combined by adding counters, subtracting the (k + 1)-th
+    largest and dropping those left at zero, which keeps the same bound
+    (Agarwal et al., "Mergeable Summaries").
+    """
+
+    def __init__(self, k: int = 10):
+        self.k = k
+        self.values = np.full((0, k), -1, dtype=np.int64)
+        self.counts = np.zeros((0, k), dtype=np.int64)
+        self.totals = np.zeros(0, dtype=np.int64)
+
+    def _ensure_capacity(self, n_users: int) -> None:
+        if n_users <= len(self.totals):
+            return
+        capacity = max(1024, 2 * len(self.totals), n_users)
+        values = np.full((capacity, self.k), -1, dtype=np.int64)
+        counts = np.zeros((capacity, self.k), dtype=np.int64)
+        totals = np.zeros(capacity, dtype=np.int64)
+        values[:len(self.totals)] = self.values
+        counts[:len(self.totals)] = self.counts
+        totals[:len(self.totals)] = self.totals
+        self.values, self.counts, self.totals = values, counts, totals
+
+    def add(self, user_codes: np.ndarray, values: np.ndarray) -> None:
+        """Count one occurrence of each (user, value) pair"""
+        if len(values) == 0:
+            return
+        user_codes = user_codes.astype(np.int64)
+        keys = (user_codes << 32) | values.astype(np.int64)
+        keys = np.sort(keys)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        keys = keys[starts]
+        self._ensure_capacity(int(user_codes.max()) + 1)
+        np.add.at(self.totals, keys >> 32, counts)
+        self._combine(keys >> 32, keys & _HASH_MASK, counts)
+
+    def merge(self, other: 'HeavyHitters', user_remap: np.ndarray, value_remap: np.ndarray) -> None:
+        """Add another summary, with its user and value codes mapped through the remaps"""
+        n_other = min(len(other.totals), len(user_remap))
+        users, slots = np.nonzero(other.counts[:n_other] > 0)
+        if n_other:
+            self._ensure_capacity(int(user_remap[:n_other].max()) + 1)
+            np.add.at(self.totals, user_remap[:n_other], other.totals[:n_other])
+        self._combine(user_remap[users], value_remap[other.values[users, slots]], other.counts[users, slots])
+
+    def _combine(self, users: np.ndarray, values: np.ndarray, counts: np.ndarray) -> None:
+        if len(users) == 0:
+            return
+        affected = _sorted_unique(users)
+        kept_users, kept_slots = np.nonzero(self.counts[affected] > 0)
+        all_users = np.concatenate([affected[kept_users], users])
+        all_values = np.concatenate([self.values[affected][kept_users, kept_slots], values])
+        all_counts = np.concatenate([self.counts[affected][kept_users, kept_slots], counts])
+
+        # Add the counters of equal (user, value) pairs
+        keys = (all_users << 32) | all_values
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        summed = np.add.reduceat(all_counts[order], starts)
+        users, values = keys[starts] >> 32, keys[starts] & _HASH_MASK
+
+        # Rank each user's counters by count, then subtract the (k + 1)-th largest
+        order = np.lexsort((-summed, users))
+        users, values, summed = users[order], values[order], summed[order]
+        firsts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        ranks = np.arange(len(users)) - np.repeat(firsts, np.diff(np.r_[firsts, len(users)]))
+        kth = np.zeros(len(affected), dtype=np.int64)
+        has_kth = ranks == self.k
+        kth[np.searchsorted(affected, users[has_kth])] = summed[has_kth]
+        summed = summed - kth[np.searchsorted(affected, users)]
+        keep = (ranks < self.k) & (summed > 0)
+
+        self.values[affected] = -1
+        self.counts[affected] = 0
+        self.values[users[keep], ranks[keep]] = values[keep]
+        self.counts[users[keep], ranks[keep]] = summed[keep]
+
+    def top(self, user_code: int) -> List[Tuple[int, int]]:
+        """Get a user's (value, count) counters, in no particular order"""
+        if user_code >= len(self.totals):
+            return []
+        slots = np.flatnonzero(self.counts[user_code] > 0)
+        return list(zip(self.values[user_code, slots].tolist(), self.counts[user_code, slots].tolist()))
+
+    def error_bound(self, user_code: int) -> float:
+        """Largest possible undercount of any of the user's counters"""
+        if user_code >= len(self.totals):
+            return 0.0
+        return float(self.totals[user_code] - self.counts[user_code].sum()) / (self.k + 1)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes + self.counts.nbytes + self.totals.nbytes)
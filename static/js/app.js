@@ -4,6 +4,10 @@ class AnomalyDetectionApp {
     constructor() {
         this.uploadedFiles = [];
         this.currentResults = null;
+        this.currentJobId = null;
+        this.runningJobId = null;
+        this.resultsPage = 1;
+        this.scoreHistogram = null;
         this.charts = {};
         this.init();
     }
@@ -34,6 +38,11 @@ class AnomalyDetectionApp {
             this.startAnalysis();
         });
 
+        // Cancel a running analysis
+        document.getElementById('cancel-job-btn').addEventListener('click', () => {
+            this.cancelAnalysis();
+        });
+
         // Download report
         document.getElementById('download-report-btn').addEventListener('click', () => {
             this.downloadReport();
@@ -41,12 +50,37 @@ class AnomalyDetectionApp {
 
         // Refresh results
         document.getElementById('refresh-results-btn').addEventListener('click', () => {
-            this.loadResults();
+            this.loadResults(this.resultsPage);
+        });
+
+        // Results filtering, sorting, paging and export
+        ['results-filter', 'results-sort'].forEach(id => {
+            document.getElementById(id).addEventListener('change', () => {
+                this.loadResults(1);
+            });
+        });
+
+        document.getElementById('results-prev-btn').addEventListener('click', () => {
+            this.loadResults(this.resultsPage - 1);
+        });
+
+        document.getElementById('results-next-btn').addEventListener('click', () => {
+            this.loadResults(this.resultsPage + 1);
+        });
+
+        document.getElementById('export-results-btn').addEventListener('click', () => {
+            this.exportResults();
         });
 
         // Range sliders
         document.getElementById('threshold').addEventListener('input', (e) => {
             document.getElementById('threshold-value').textContent = e.target.value;
+            this.previewThreshold(parseFloat(e.target.value));
+        });
+
+        // Re-apply the threshold to the current scores once the slider is released
+        document.getElementById('threshold').addEventListener('change', (e) => {
+            this.reclassify(parseFloat(e.target.value));
         });
 
         document.getElementById('contamination').addEventListener('input', (e) => {
@@ -135,25 +169,16 @@ class AnomalyDetectionApp {
         this.showLoading('Uploading files...');
 
         try {
+            const uploaded = [];
             for (const file of files) {
-                const formData = new FormData();
-                formData.append('file', file);
-
-                const response = await fetch('/api/upload', {
-                    method: 'POST',
-                    body: formData
-                });
-
-                const result = await response.json();
-
-                if (!response.ok) {
-                    throw new Error(result.error || 'Upload failed');
-                }
+                const result = await this.uploadFileChunked(file);
+                uploaded.push(result.filename);
             }
 
             this.hideLoading();
             this.showAlert('Files uploaded successfully!', 'success');
-            this.uploadedFiles = Array.from(files);
+            // Compressed files are stored (and analyzed) under their decompressed name
+            this.uploadedFiles = uploaded;
             document.getElementById('analyze-btn').disabled = false;
 
         } catch (error) {
@@ -162,6 +187,62 @@ class AnomalyDetectionApp {
         }
     }
 
+    async uploadFileChunked(file, maxRetries = 3) {
+        // Send the file in chunks; the server parses each chunk as it arrives
+        const response = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ filename: file.name })
+        });
+        const session = await response.json();
+
+        if (!response.ok) {
+            throw new Error(session.error || 'Upload failed');
+        }
+
+        let offset = 0;
+        let retries = 0;
+        while (offset < file.size) {
+            try {
+                const chunkResponse = await fetch(`/api/uploads/${session.upload_id}?offset=${offset}`, {
+                    method: 'PUT',
+                    body: file.slice(offset, offset + session.chunk_bytes)
+                });
+                const status = await chunkResponse.json();
+
+                if (!chunkResponse.ok && chunkResponse.status !== 409) {
+                    throw new Error(status.error || 'Upload failed');
+                }
+
+                // On an offset mismatch, continue from what the server has
+                offset = status.offset;
+                document.getElementById('loading-message').textContent =
+                    `Uploading ${file.name} (${Math.round(offset / file.size * 100)}%)...`;
+
+            } catch (error) {
+                if (++retries > maxRetries) {
+                    throw error;
+                }
+                // Resume from the server's offset after a dropped connection
+                const statusResponse = await fetch(`/api/uploads/${session.upload_id}`);
+                offset = (await statusResponse.json()).offset;
+            }
+        }
+
+        const completeResponse = await fetch(`/api/uploads/${session.upload_id}/complete`, {
+            method: 'POST'
+        });
+        const result = await completeResponse.json();
+
+        if (!completeResponse.ok) {
+            throw new Error(result.error || 'Upload failed');
+        }
+
+        return result;
+    }
+
     async generateSampleData() {
         const numUsers = document.getElementById('num-users').value;
         const logsPerUser = document.getElementById('logs-per-user').value;
@@ -208,7 +289,7 @@ class AnomalyDetectionApp {
         const threshold = parseFloat(document.getElementById('threshold').value);
         const contamination = parseFloat(document.getElementById('contamination').value);
 
-        this.showLoading('Analyzing logs... This may take a few moments.');
+        this.showLoading('Queueing analysis...', true);
 
         try {
             const response = await fetch('/api/analyze', {
@@ -229,21 +310,135 @@ class AnomalyDetectionApp {
                 throw new Error(result.error || 'Analysis failed');
             }
 
+            // The analysis runs as a background job; poll it until it finishes
+            this.runningJobId = result.job_id;
+            const job = await this.waitForJob(result.job_id);
+            this.runningJobId = null;
             this.hideLoading();
+
+            if (job.status === 'cancelled') {
+                this.showAlert('Analysis cancelled', 'warning');
+                return;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Analysis failed');
+            }
+
+            this.currentJobId = job.job_id;
             this.showAlert('Analysis completed successfully!', 'success');
+            await this.loadScoreHistogram();
             
             // Update dashboard
-            this.updateDashboard(result);
+            this.updateDashboard(job.result);
             
             // Load detailed results
             await this.loadResults();
 
         } catch (error) {
+            this.runningJobId = null;
             this.hideLoading();
             this.showAlert(`Analysis failed: ${error.message}`, 'danger');
         }
     }
 
+    async waitForJob(jobId, intervalMs = 1000) {
+        while (true) {
+            const response = await fetch(`/api/jobs/${jobId}`);
+            const job = await response.json();
+
+            if (!response.ok) {
+                throw new Error(job.error || 'Failed to get job status');
+            }
+
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+
+            const stage = job.current_stage ? job.current_stage.replace(/_/g, ' ') : job.status;
+            document.getElementById('loading-message').textContent =
+                `Analyzing logs: ${stage} (${Math.round(job.progress * 100)}%)`;
+
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    }
+
+    async cancelAnalysis() {
+        if (!this.runningJobId) {
+            return;
+        }
+        document.getElementById('loading-message').textContent = 'Cancelling analysis...';
+        await fetch(`/api/jobs/${this.runningJobId}`, { method: 'DELETE' });
+    }
+
+    jobQuery() {
+        return this.currentJobId ? `?job_id=${encodeURIComponent(this.currentJobId)}` : '';
+    }
+
+    resultsQuery(extra = {}) {
+        const params = new URLSearchParams(extra);
+        if (this.currentJobId) {
+            params.set('job_id', this.currentJobId);
+        }
+        const classification = document.getElementById('results-filter').value;
+        if (classification) {
+            params.set('classification', classification);
+        }
+        params.set('sort', document.getElementById('results-sort').value);
+        return `?${params.toString()}`;
+    }
+
+    async loadScoreHistogram() {
+        try {
+            const response = await fetch(`/api/score-histogram${this.jobQuery()}`);
+            this.scoreHistogram = response.ok ? await response.json() : null;
+        } catch (error) {
+            this.scoreHistogram = null;
+        }
+    }
+
+    previewThreshold(threshold) {
+        // Live counts from the precomputed histogram, accurate to one bin, while the slider moves
+        if (!this.scoreHistogram) {
+            return;
+        }
+        const { bin_edges: edges, counts } = this.scoreHistogram;
+        const total = counts.reduce((sum, count) => sum + count, 0);
+        const abnormal = counts.reduce((sum, count, i) => sum + (edges[i] >= threshold ? count : 0), 0);
+        this.updateDashboard({
+            normal_users: total - abnormal,
+            abnormal_users: abnormal,
+            total_users: total,
+            anomaly_rate: total ? abnormal / total * 100 : 0
+        });
+    }
+
+    async reclassify(threshold) {
+        if (!this.currentJobId) {
+            return;
+        }
+
+        try {
+            const response = await fetch(`/api/reclassify${this.jobQuery()}`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ threshold: threshold })
+            });
+            const summary = await response.json();
+
+            if (!response.ok) {
+                throw new Error(summary.error || 'Reclassification failed');
+            }
+
+            this.updateDashboard(summary);
+            await this.loadResults(this.resultsPage);
+
+        } catch (error) {
+            this.showAlert(`Reclassification failed: ${error.message}`, 'danger');
+        }
+    }
+
     updateDashboard(data) {
         document.getElementById('normal-users-count').textContent = data.normal_users;
         document.getElementById('abnormal-users-count').textContent = data.abnormal_users;
@@ -254,23 +449,42 @@ class AnomalyDetectionApp {
         this.updateCharts(data);
     }
 
-    async loadResults() {
+    async loadResults(page = 1) {
         try {
-            const response = await fetch('/api/results');
+            // Only one page is fetched; recent logs are loaded on demand in the details modal
+            const query = this.resultsQuery({ page: page, include_logs: 'false' });
+            const response = await fetch(`/api/results${query}`);
             const results = await response.json();
 
             if (!response.ok) {
                 throw new Error(results.error || 'Failed to load results');
             }
 
+            this.resultsPage = results.pagination.page;
             this.currentResults = results;
             this.displayResults(results);
+            this.updatePagination(results.pagination);
 
         } catch (error) {
             this.showAlert(`Failed to load results: ${error.message}`, 'danger');
         }
     }
 
+    updatePagination(pagination) {
+        const pages = Math.max(pagination.pages, 1);
+        const first = pagination.total === 0 ? 0 : (pagination.page - 1) * pagination.page_size + 1;
+        const last = Math.min(pagination.page * pagination.page_size, pagination.total);
+        document.getElementById('results-page-info').textContent =
+            `Users ${first}-${last} of ${pagination.total} (page ${pagination.page} of ${pages})`;
+        document.getElementById('results-prev-btn').disabled = pagination.page <= 1;
+        document.getElementById('results-next-btn').disabled = pagination.page >= pages;
+    }
+
+    exportResults() {
+        // The export is streamed by the server as NDJSON, one user per line
+        window.location.href = `/api/results/export${this.resultsQuery({ format: 'ndjson' })}`;
+    }
+
     displayResults(results) {
         const tbody = document.getElementById('results-tbody');
         
@@ -319,7 +533,7 @@ class AnomalyDetectionApp {
 
     async showUserDetails(userId) {
         try {
-            const response = await fetch(`/api/user/${userId}`);
+            const response = await fetch(`/api/user/${userId}${this.jobQuery()}`);
             const userDetails = await response.json();
 
             if (!response.ok) {
@@ -424,7 +638,7 @@ class AnomalyDetectionApp {
 
     async downloadReport() {
         try {
-            const response = await fetch('/api/download-report');
+            const response = await fetch(`/api/download-report${this.jobQuery()}`);
             
             if (!response.ok) {
                 const error = await response.json();
@@ -513,17 +727,13 @@ class AnomalyDetectionApp {
         this.charts.userDistribution.data.datasets[0].data = [data.normal_users, data.abnormal_users];
         this.charts.userDistribution.update();
 
-        // Update anomaly scores chart if we have detailed results
-        if (this.currentResults && this.currentResults.users) {
-            const scores = this.currentResults.users.map(u => u.anomaly_score);
+        // Update anomaly scores chart from the score histogram (all users, not just the current page)
+        if (this.scoreHistogram) {
             const bins = [0, 0, 0, 0, 0];
             
-            scores.forEach(score => {
-                if (score < 0.2) bins[0]++;
-                else if (score < 0.4) bins[1]++;
-                else if (score < 0.6) bins[2]++;
-                else if (score < 0.8) bins[3]++;
-                else bins[4]++;
+            this.scoreHistogram.counts.forEach((count, i) => {
+                const binStart = this.scoreHistogram.bin_edges[i];
+                bins[Math.min(Math.floor(binStart * 5 + 1e-9), 4)] += count;
             });
 
             this.charts.anomalyScores.data.datasets[0].data = bins;
@@ -531,8 +741,9 @@ class AnomalyDetectionApp {
         }
     }
 
-    showLoading(message = 'Processing...') {
+    showLoading(message = 'Processing...', cancellable = false) {
         document.getElementById('loading-message').textContent = message;
+        document.getElementById('cancel-job-btn').classList.toggle('d-none', !cancellable);
         const modal = new bootstrap.Modal(document.getElementById('loadingModal'));
         modal.show();
     }
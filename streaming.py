@@ -0,0 +1,605 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional
+
+from config import Config
+from feature_registry import FEATURE_COLUMNS, FeaturePlan, build_feature_plan
+from log_parser import LogParserEngine, schema_for
+from log_readers import open_log_file, reader_for
+from log_store import LogColumnsBuilder, read_raw_lines, TIMESTAMP_MISSING, INT_MISSING, CATEGORICAL_FIELDS
+from sketches import HyperLogLogSet, HeavyHitters, hash_integers, hash_strings
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent raw log references kept per user
+RECENT_LOGS = 10
+# Rough bytes of parse buffers and fold temporaries per buffered line
+BYTES_PER_BUFFERED_LINE = 256
+
+_COUNT_FIELDS = [
+    'total', 'missing_timestamps', 'night', 'weekend', 'failed_login', 'delete', 'post',
+    'admin_access', 'error', 'success', 'rt_count', 'slow', 'ts_count', 'first_ts', 'last_ts', 'recent_count'
+]
+_FLOAT_FIELDS = ['rt_sum', 'rt_m2', 'rt_max', 'max_gap']
+_DISTINCT_FIELDS = ['days', 'actions', 'resources', 'status_codes', 'ips']
+# Distinct counts that can grow large; sketch mode counts them with HyperLogLog.
+# Actions and status codes have few possible values and stay exact.
+_SKETCHED_FIELDS = {'days': None, 'resources': 'resource', 'ips': 'ip_address'}
+
+
+def chunk_lines_for_budget(chunk_lines: int, memory_budget_mb: float) -> int:
+    """Cap the lines buffered per chunk so parse buffers use at most half the memory budget"""
+    budget_lines = int(memory_budget_mb * 1024 * 1024 / 2 / BYTES_PER_BUFFERED_LINE)
+    return max(1000, min(chunk_lines, budget_lines))
+
+
+def merge_time_ranges(seen, first_a, last_a, gap_a, first_b, last_b, gap_b):
+    """Combine per-user (first, last, max gap) summaries of two sets of events.
+
+    Gaps of -1 mean "no gap yet". When the two sets do not overlap in time the
+    gap between them is exact; when they overlap, the true max gap is unknown
+    and the larger of the two internal gaps is kept.
+    Returns (first, last, max_gap, overlapping).
+    """
+    gap_a = np.where(seen, gap_a, -1.0)
+    after = seen & (first_b >= last_a)
+    before = seen & (last_b <= first_a)
+    boundary = np.where(after, first_b - last_a, np.where(before, first_a - last_b, -1)).astype(np.float64)
+
+    first = np.where(seen, np.minimum(first_a, first_b), first_b)
+    last = np.where(seen, np.maximum(last_a, last_b), last_b)
+    max_gap = np.maximum.reduce([gap_a, gap_b, boundary])
+    return first, last, max_gap, seen & ~after
+
+
+class KeySet:
+    """Exact set of (user, value) pairs packed into sorted int64 keys.
+
+    New keys are buffered and merged into the sorted array only once the buffer
+    outgrows it, so adding a chunk costs time proportional to the chunk.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.pending: List[np.ndarray] = []
+        self.pending_size = 0
+
+    def add(self, user_codes: np.ndarray, values: np.ndarray) -> None:
+        """Add (user, value) pairs; values must fit in 32 bits"""
+        if len(values) == 0:
+            return
+        keys = np.unique((user_codes.astype(np.int64) << 32) | (values.astype(np.int64) & 0xFFFFFFFF))
+        self.pending.append(keys)
+        self.pending_size += len(keys)
+        if self.pending_size > max(len(self.keys), 1 << 16):
+            self.compact()
+
+    def compact(self) -> None:
+        """Merge buffered keys into the sorted key array"""
+        if self.pending:
+            self.keys = np.unique(np.concatenate([self.keys] + self.pending))
+            self.pending = []
+            self.pending_size = 0
+
+    def counts(self, n_users: int) -> np.ndarray:
+        """Count distinct values per user"""
+        self.compact()
+        return np.bincount(self.keys >> 32, minlength=n_users)[:n_users]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + sum(keys.nbytes for keys in self.pending))
+
+
+class StreamingFeatureAggregator:
+    """Folds chunks of parsed logs into mergeable per-user aggregates.
+
+    State is a fixed set of counters, sums, extrema and distinct-value sets per
+    user, so memory grows with the number of users rather than log lines. The
+    feature matrix produced at the end matches UserFeatureExtractor, except that
+    max_idle_time is approximate for users whose events arrive out of time order
+    across chunks (order within a chunk does not matter).
+
+    With sketches (FEATURE_CONFIG['distinct_sketches'] by default), unique_days,
+    unique_resources and unique_ips come from HyperLogLogSet, so a user's state
+    stays bounded however many distinct values they have. Each user's most
+    frequent resources are also kept in a HeavyHitters summary. See sketches.py
+    for the error bounds.
+
+    Only the feature groups in plan (those enabled in FEATURE_CONFIG by
+    default) are folded; aggregates of different plans cannot be merged.
+    """
+
+    def __init__(self, sketches: bool = None, plan: FeaturePlan = None):
+        feature_config = Config.FEATURE_CONFIG
+        self.sketches = feature_config['distinct_sketches'] if sketches is None else sketches
+        self.plan = plan or build_feature_plan()
+        # Version of the parser schema the folded lines were parsed with
+        self.parser_version = None
+        self.vocabs = {field: {} for field in CATEGORICAL_FIELDS}
+        self.sources: List[str] = []
+        # Byte offset up to which each source file has been consumed
+        self.file_offsets: Dict[str, int] = {}
+        self.capacity = 0
+        self.state: Dict[str, np.ndarray] = {}
+        self.distinct = {
+            field: HyperLogLogSet(feature_config['sketch_precision'])
+            if self.sketches and field in _SKETCHED_FIELDS else KeySet()
+            for field in _DISTINCT_FIELDS
+        }
+        self.top_resources = HeavyHitters(feature_config['top_resources']) \
+            if self.sketches and 'resource' in self.plan else None
+        # Stable 32-bit hash of each dictionary value, for the sketches
+        self.value_hashes = {field: np.zeros(0, dtype=np.uint32) for field in _SKETCHED_FIELDS.values() if field}
+        self.recent_refs = np.zeros((0, RECENT_LOGS, 3), dtype=np.int64)
+        self.is_admin_resource = np.zeros(0, dtype=bool)
+        self.out_of_order_users = 0
+        self.rows = 0
+        self._ensure_capacity(0)
+
+    def __len__(self) -> int:
+        return len(self.vocabs['user_id'])
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self.vocabs['user_id']
+
+    @property
+    def num_users(self) -> int:
+        return len(self.vocabs['user_id'])
+
+    @property
+    def user_ids(self) -> List[str]:
+        return list(self.vocabs['user_id'])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the aggregate state"""
+        arrays = sum(values.nbytes for values in self.state.values()) + self.recent_refs.nbytes
+        distinct = sum(keys.nbytes for keys in self.distinct.values())
+        if self.top_resources is not None:
+            distinct += self.top_resources.nbytes + sum(hashes.nbytes for hashes in self.value_hashes.values())
+        # Python dict entries for the dictionary-encoded values
+        vocab = 100 * sum(len(vocab) for vocab in self.vocabs.values())
+        return int(arrays + distinct + vocab)
+
+    def matches_config(self) -> bool:
+        """Whether these aggregates were folded with the current feature groups, sketch mode and log patterns"""
+        return self.plan == build_feature_plan() and self.sketches == Config.FEATURE_CONFIG['distinct_sketches'] \
+            and self.parser_version in (None, schema_for(self.plan.fields).version)
+
+    def _ensure_capacity(self, n_users: int) -> None:
+        if n_users <= self.capacity and self.state:
+            return
+
+        capacity = max(1024, self.capacity * 2, n_users)
+        state = {}
+        for field in _COUNT_FIELDS + _FLOAT_FIELDS:
+            dtype = np.float64 if field in _FLOAT_FIELDS else np.int64
+            values = np.zeros(capacity, dtype=dtype)
+            if field in self.state:
+                values[:self.capacity] = self.state[field]
+            state[field] = values
+        state['rt_max'][self.capacity:] = np.nan
+
+        recent_refs = np.zeros((capacity, RECENT_LOGS, 3), dtype=np.int64)
+        recent_refs[:self.capacity] = self.recent_refs
+
+        self.state = state
+        self.recent_refs = recent_refs
+        self.capacity = capacity
+
+    def _sync_admin_resources(self) -> None:
+        """Evaluate the '/admin' substring test once for each newly seen resource"""
+        resource_vocab = self.vocabs['resource']
+        if len(self.is_admin_resource) < len(resource_vocab):
+            new_resources = list(resource_vocab)[len(self.is_admin_resource):]
+            self.is_admin_resource = np.concatenate([
+                self.is_admin_resource, np.array(['/admin' in resource for resource in new_resources], dtype=bool)
+            ])
+
+    def _sync_value_hashes(self) -> None:
+        """Hash each newly seen resource and IP address once"""
+        for field, hashes in self.value_hashes.items():
+            vocab = self.vocabs[field]
+            if len(hashes) < len(vocab):
+                new_values = list(vocab)[len(hashes):]
+                self.value_hashes[field] = np.concatenate([hashes, hash_strings(new_values)])
+
+    def _add_distinct(self, field: str, user_codes: np.ndarray, values: np.ndarray) -> None:
+        """Add (user, value) pairs to a distinct set; sketches get hashes of the values themselves"""
+        keyset = self.distinct[field]
+        if isinstance(keyset, HyperLogLogSet):
+            vocab_field = _SKETCHED_FIELDS[field]
+            values = hash_integers(values) if vocab_field is None else self.value_hashes[vocab_field][values]
+        keyset.add(user_codes, values)
+
+    def consume_file(self, log_file: str, parser: LogParserEngine, chunk_lines: int,
+                     resume: bool = False, complete_lines_only: bool = False) -> int:
+        """Stream a log file in chunks of chunk_lines lines into the aggregates.
+
+        With resume, reading starts where the previous call on this file stopped.
+        With complete_lines_only, a trailing line without a newline (still being
+        written) is left for the next call. Returns the byte offset reached.
+        """
+        if log_file in self.sources:
+            source = self.sources.index(log_file)
+        else:
+            source = len(self.sources)
+            self.sources.append(log_file)
+        start = self.file_offsets.get(log_file, 0) if resume else 0
+        self.parser_version = parser.version
+        builder = LogColumnsBuilder(self.vocabs)
+        reader = reader_for(log_file, parser)
+        rows_before = self.rows
+
+        with open_log_file(log_file) as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if complete_lines_only and not line.endswith(b'\n'):
+                    break
+                fields = reader.parse_line(line.decode('utf-8', errors='replace')) if line.strip() else None
+                if fields is not None:
+                    builder.append(fields, source, offset, len(line))
+                    if len(builder) >= chunk_lines:
+                        self.fold(builder.to_arrays())
+                        builder = LogColumnsBuilder(self.vocabs)
+                offset += len(line)
+
+        if len(builder):
+            self.fold(builder.to_arrays())
+
+        if (offset > start or start == 0) and self.rows == rows_before:
+            logger.warning(f"No log records found in {log_file} after byte {start}; check that it matches "
+                           f"the log patterns or has a header naming the fields")
+        self.file_offsets[log_file] = offset
+        return offset
+
+    def fold(self, chunk: Dict[str, np.ndarray]) -> None:
+        """Fold one chunk of parsed log columns (coded with self.vocabs) into the aggregates"""
+        n_users = self.num_users
+        self._ensure_capacity(n_users)
+        self._sync_admin_resources()
+        if self.sketches:
+            self._sync_value_hashes()
+        self.rows += len(chunk['user_id'])
+
+        users = chunk['user_id']
+        state = self.state
+        plan = self.plan
+
+        def add_counts(field: str, codes: np.ndarray) -> None:
+            state[field][:n_users] += np.bincount(codes, minlength=n_users)
+
+        add_counts('total', users)
+        if 'time' in plan or 'session' in plan:
+            self._fold_timestamps(chunk, users, add_counts)
+
+        if 'action' in plan:
+            actions = chunk['action']
+            action_vocab = self.vocabs['action']
+            for field, action in (('failed_login', 'FAILED_LOGIN'), ('delete', 'DELETE'), ('post', 'POST')):
+                if action in action_vocab:
+                    add_counts(field, users[actions == action_vocab[action]])
+            self.distinct['actions'].add(users[actions >= 0], actions[actions >= 0])
+
+        if 'resource' in plan:
+            resources = chunk['resource']
+            add_counts('admin_access', users[np.append(self.is_admin_resource, False)[resources]])
+            self._add_distinct('resources', users[resources >= 0], resources[resources >= 0])
+            if self.top_resources is not None:
+                self.top_resources.add(users[resources >= 0], resources[resources >= 0])
+
+        if 'status' in plan:
+            status = chunk['status_code']
+            valid = status != INT_MISSING
+            add_counts('error', users[valid & (status >= 400)])
+            add_counts('success', users[valid & (status < 400)])
+            self.distinct['status_codes'].add(users[valid], status[valid])
+
+        if 'ip' in plan:
+            ips = chunk['ip_address']
+            self._add_distinct('ips', users[ips >= 0], ips[ips >= 0])
+
+        if 'response_time' in plan:
+            self._fold_response_times(chunk, users, n_users)
+        self._fold_recent_refs(chunk, users)
+
+    def _fold_timestamps(self, chunk, users, add_counts) -> None:
+        state = self.state
+        timestamps = chunk['timestamp']
+        valid = timestamps != TIMESTAMP_MISSING
+        add_counts('missing_timestamps', users[~valid])
+
+        timestamps = timestamps[valid]
+        codes = users[valid]
+        if len(timestamps) == 0:
+            return
+
+        if 'time' in self.plan:
+            days = timestamps // 86400
+            hours = (timestamps // 3600) % 24
+            add_counts('night', codes[(hours >= 22) | (hours <= 6)])
+            add_counts('weekend', codes[(days + 3) % 7 >= 5])  # 1970-01-01 was a Thursday
+            self._add_distinct('days', codes, days)
+        if 'session' not in self.plan:
+            return
+
+        # Per-user first/last timestamp and largest gap within this chunk
+        order = np.lexsort((timestamps, codes))
+        codes = codes[order]
+        timestamps = timestamps[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)] - 1
+        chunk_users = codes[starts]
+        chunk_count = ends - starts + 1
+
+        gaps = np.diff(timestamps).astype(np.float64)
+        gaps[codes[1:] != codes[:-1]] = -1.0
+        chunk_gap = np.full(len(chunk_users), -1.0)
+        multi = chunk_count > 1
+        if multi.any():
+            chunk_gap[multi] = np.maximum.reduceat(gaps, starts[multi])
+
+        # Merge with the previous chunks' aggregates
+        seen = state['ts_count'][chunk_users] > 0
+        first, last, max_gap, out_of_order = merge_time_ranges(
+            seen, state['first_ts'][chunk_users], state['last_ts'][chunk_users], state['max_gap'][chunk_users],
+            timestamps[starts], timestamps[ends], chunk_gap
+        )
+        state['first_ts'][chunk_users] = first
+        state['last_ts'][chunk_users] = last
+        state['max_gap'][chunk_users] = max_gap
+        state['ts_count'][chunk_users] += chunk_count
+        self.out_of_order_users += int(np.count_nonzero(out_of_order))
+
+    def _fold_response_times(self, chunk, users, n_users) -> None:
+        state = self.state
+        response_times = chunk['response_time']
+        valid = response_times != INT_MISSING
+        codes = users[valid]
+        response_times = response_times[valid].astype(np.float64)
+        if len(response_times) == 0:
+            return
+
+        count_b = np.bincount(codes, minlength=n_users)
+        sum_b = np.bincount(codes, weights=response_times, minlength=n_users)
+        mean_b = sum_b / np.maximum(count_b, 1)
+        m2_b = np.bincount(codes, weights=(response_times - mean_b[codes]) ** 2, minlength=n_users)
+
+        # Chan et al. parallel combination of (count, mean, M2)
+        count_a = state['rt_count'][:n_users]
+        mean_a = state['rt_sum'][:n_users] / np.maximum(count_a, 1)
+        delta = mean_b - mean_a
+        state['rt_m2'][:n_users] += m2_b + delta ** 2 * count_a * count_b / np.maximum(count_a + count_b, 1)
+        state['rt_sum'][:n_users] += sum_b
+        state['rt_count'][:n_users] += count_b
+        state['slow'][:n_users] += np.bincount(codes[response_times > 5000], minlength=n_users)
+
+        chunk_max = np.full(n_users, np.nan)
+        np.fmax.at(chunk_max, codes, response_times)
+        state['rt_max'][:n_users] = np.fmax(state['rt_max'][:n_users], chunk_max)
+
+    def _fold_recent_refs(self, chunk, users) -> None:
+        """Keep (source, offset, length) of the last RECENT_LOGS lines per user"""
+        if len(users) == 0:
+            return
+
+        order = np.argsort(users, kind='stable')
+        sorted_users = users[order]
+        starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+        ends = np.r_[starts[1:], len(sorted_users)]
+        affected = sorted_users[starts]
+        new_count = np.minimum(ends - starts, RECENT_LOGS)
+        first_new = ends - new_count
+
+        old_count = self.state['recent_count'][affected]
+        keep_old = np.minimum(old_count, RECENT_LOGS - new_count)
+        old_refs = self.recent_refs[affected]
+        new_refs = np.zeros_like(old_refs)
+        chunk_refs = np.stack([chunk['source'], chunk['offset'], chunk['length']], axis=1)[order]
+
+        # Slot k holds the k-th oldest kept line: surviving old lines first, then this chunk's
+        for slot in range(RECENT_LOGS):
+            from_old = slot < keep_old
+            old_slot = np.clip(old_count - keep_old + slot, 0, RECENT_LOGS - 1)
+            new_row = np.clip(first_new + slot - keep_old, 0, len(chunk_refs) - 1)
+            new_refs[:, slot] = np.where(from_old[:, None],
+                                         old_refs[np.arange(len(affected)), old_slot],
+                                         chunk_refs[new_row])
+
+        self.recent_refs[affected] = new_refs
+        self.state['recent_count'][affected] = keep_old + new_count
+
+    def merge(self, other: 'StreamingFeatureAggregator') -> None:
+        """Fold another aggregator's state into this one.
+
+        The other aggregator is treated as covering later log lines, which
+        only matters for the order of recent raw log references.
+        """
+        if other.sketches != self.sketches:
+            raise ValueError('Cannot merge exact and sketched aggregates')
+        if other.plan != self.plan:
+            raise ValueError('Cannot merge aggregates of different feature groups')
+        remap = {}
+        for field in CATEGORICAL_FIELDS:
+            vocab = self.vocabs[field]
+            remap[field] = np.array([vocab.setdefault(value, len(vocab)) for value in other.vocabs[field]] + [-1],
+                                    dtype=np.int64)
+        for source in other.sources:
+            if source not in self.sources:
+                self.sources.append(source)
+        source_remap = np.array([self.sources.index(source) for source in other.sources] + [0], dtype=np.int64)
+
+        self._ensure_capacity(self.num_users)
+        self._sync_admin_resources()
+        if self.sketches:
+            self._sync_value_hashes()
+
+        n_other = other.num_users
+        users = remap['user_id'][:n_other]
+        mine = self.state
+        theirs = {field: values[:n_other] for field, values in other.state.items()}
+
+        # Timestamp ranges
+        seen = mine['ts_count'][users] > 0
+        other_seen = theirs['ts_count'] > 0
+        first, last, max_gap, out_of_order = merge_time_ranges(
+            seen & other_seen, mine['first_ts'][users], mine['last_ts'][users], mine['max_gap'][users],
+            theirs['first_ts'], theirs['last_ts'], np.where(other_seen, theirs['max_gap'], -1.0)
+        )
+        keep_mine = seen & ~other_seen
+        mine['first_ts'][users] = np.where(keep_mine, mine['first_ts'][users], first)
+        mine['last_ts'][users] = np.where(keep_mine, mine['last_ts'][users], last)
+        mine['max_gap'][users] = np.where(keep_mine, mine['max_gap'][users], max_gap)
+        self.out_of_order_users += other.out_of_order_users + int(np.count_nonzero(out_of_order))
+
+        # Response time moments (Chan et al. parallel combination)
+        count_a = mine['rt_count'][users]
+        count_b = theirs['rt_count']
+        mean_a = mine['rt_sum'][users] / np.maximum(count_a, 1)
+        mean_b = theirs['rt_sum'] / np.maximum(count_b, 1)
+        mine['rt_m2'][users] += theirs['rt_m2'] + \
+            (mean_b - mean_a) ** 2 * count_a * count_b / np.maximum(count_a + count_b, 1)
+        mine['rt_sum'][users] += theirs['rt_sum']
+        mine['rt_max'][users] = np.fmax(mine['rt_max'][users], theirs['rt_max'])
+
+        for field in _COUNT_FIELDS:
+            if field not in ('first_ts', 'last_ts', 'recent_count'):
+                mine[field][users] += theirs[field]
+
+        # Distinct sets, re-keyed onto this aggregator's codes
+        value_remaps = {'actions': remap['action'], 'resources': remap['resource'], 'ips': remap['ip_address']}
+        for field, keyset in other.distinct.items():
+            if isinstance(keyset, HyperLogLogSet):
+                # Sketches hold hashes of the values, so only the user codes change
+                self.distinct[field].merge(keyset, users)
+                continue
+            keyset.compact()
+            values = (keyset.keys & 0xFFFFFFFF).astype(np.uint32).astype(np.int32)
+            if field in value_remaps:
+                values = value_remaps[field][values]
+            self.distinct[field].add(users[keyset.keys >> 32], values)
+
+        if self.top_resources is not None:
+            self.top_resources.merge(other.top_resources, users, remap['resource'])
+
+        # Recent raw line references: replay other's as a chunk of later lines
+        recent_count = theirs['recent_count']
+        slots = np.arange(RECENT_LOGS)[None, :] < recent_count[:, None]
+        refs = other.recent_refs[:n_other][slots]
+        self._fold_recent_refs({
+            'source': source_remap[refs[:, 0]],
+            'offset': refs[:, 1],
+            'length': refs[:, 2]
+        }, np.repeat(users, recent_count))
+
+        self.rows += other.rows
+        self.file_offsets.update(other.file_offsets)
+        self.parser_version = self.parser_version or other.parser_version
+
+    def log_counts(self) -> np.ndarray:
+        """Get a copy of the per-user log counts, e.g. to find users touched by later folds"""
+        return self.state['total'][:self.num_users].copy()
+
+    def changed_users(self, previous_counts: np.ndarray) -> np.ndarray:
+        """Get the codes of users whose log count changed (or who are new) since log_counts()"""
+        counts = self.state['total'][:self.num_users]
+        changed = np.ones(len(counts), dtype=bool)
+        changed[:len(previous_counts)] = counts[:len(previous_counts)] != previous_counts
+        return np.flatnonzero(changed)
+
+    def to_frame(self, user_codes: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Produce the feature matrix for all users seen so far, or only the given user codes.
+
+        The frame is indexed by user code.
+        """
+        if user_codes is None:
+            user_codes = np.arange(self.num_users)
+        n_users = self.num_users
+        state = {field: values[:n_users][user_codes] for field, values in self.state.items()}
+        total = state['total']
+        denominator = np.maximum(total, 1).astype(np.float64)
+        counts = {field: keyset.counts(n_users)[user_codes] for field, keyset in self.distinct.items()}
+
+        # A missing timestamp counts as one extra distinct "day" (NaT), as in the per-user path
+        unique_days = counts['days'] + (state['missing_timestamps'] > 0)
+        has_gaps = (total > 1) & (state['ts_count'] > 1)
+
+        features = {
+            'total_logs': total,
+            'unique_days': unique_days,
+            'avg_logs_per_day': total / np.maximum(unique_days, 1),
+            'night_activity_ratio': state['night'] / denominator,
+            'weekend_activity_ratio': state['weekend'] / denominator,
+            'failed_login_ratio': state['failed_login'] / denominator,
+            'delete_ratio': state['delete'] / denominator,
+            'admin_action_ratio': state['post'] / denominator,
+            'unique_actions': counts['actions'],
+            'unique_resources': counts['resources'],
+            'admin_access_ratio': state['admin_access'] / denominator,
+            'resource_diversity': counts['resources'] / denominator,
+            'error_rate': state['error'] / denominator,
+            'success_rate': state['success'] / denominator,
+            'unique_status_codes': counts['status_codes'],
+            'unique_ips': counts['ips'],
+            'ip_diversity': counts['ips'] / denominator,
+            'avg_session_length': np.where(
+                has_gaps, (state['last_ts'] - state['first_ts']) / np.maximum(state['ts_count'] - 1, 1), 0.0),
+            'max_idle_time': np.where(has_gaps, np.maximum(state['max_gap'], 0.0), 0.0)
+        }
+
+        rt_count = state['rt_count']
+        if self.state['rt_count'][:n_users].any():
+            # Users without response times get NaN, as when the per-user path omits the keys
+            features['avg_response_time'] = np.where(rt_count > 0, state['rt_sum'] / np.maximum(rt_count, 1), np.nan)
+            features['max_response_time'] = np.where(rt_count > 0, state['rt_max'], np.nan)
+            features['response_time_std'] = np.where(
+                rt_count > 1, np.sqrt(state['rt_m2'] / np.maximum(rt_count - 1, 1)),
+                np.where(rt_count == 1, 0.0, np.nan))
+            features['slow_requests_ratio'] = np.where(rt_count > 0, state['slow'] / np.maximum(rt_count, 1), np.nan)
+
+        if self.out_of_order_users:
+            logger.warning(f"{self.out_of_order_users} user chunk(s) arrived out of time order; "
+                           f"max_idle_time is approximate for those users")
+
+        planned = set(self.plan.features)
+        feature_df = pd.DataFrame({name: features[name] for name in FEATURE_COLUMNS
+                                   if name in features and name in planned}, index=user_codes)
+        user_ids = self.user_ids
+        feature_df['user_id'] = [user_ids[code] for code in user_codes]
+        return feature_df
+
+    def user_top_resources(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a user's most frequent resources from the heavy-hitter summary (sketch mode only)"""
+        if self.top_resources is None:
+            return None
+        code = self.vocabs['user_id'][user_id]
+        resources = list(self.vocabs['resource'])
+        # Ties are ordered by name, since codes depend on the order in which chunks were merged
+        top = sorted(((resources[value], count) for value, count in self.top_resources.top(code)),
+                     key=lambda item: (-item[1], item[0]))
+        return {
+            'resources': [{'resource': resource, 'count': count} for resource, count in top],
+            # Each count may be low by up to this much
+            'max_undercount': self.top_resources.error_bound(code)
+        }
+
+    def user_log_count(self, user_id: str) -> int:
+        """Get the number of logs folded for a user"""
+        return int(self.state['total'][self.vocabs['user_id'][user_id]])
+
+    def recent_records(self, user_id: str, parser: LogParserEngine) -> List[Dict[str, Any]]:
+        """Re-read and parse a user's most recent raw log lines"""
+        code = self.vocabs['user_id'][user_id]
+        refs = self.recent_refs[code, :self.state['recent_count'][code]]
+        readers = {}
+        records = []
+        for source, line in zip(refs[:, 0].tolist(), read_raw_lines(self.sources, refs)):
+            if line is None:
+                continue
+            if source not in readers:
+                readers[source] = reader_for(self.sources[source], parser)
+            records.append(readers[source].parse(line))
+        return records
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import Config
+from feature_matrix import FeatureMatrix
+from main import ExtendedIsolationForest
+
+
+def volume_matrix(num_users=1000, seed=0):
+    """Matrix of log-normal total_logs (spread over every stratum) and one uniform feature"""
+    rng = np.random.default_rng(seed)
+    values = np.column_stack([
+        np.floor(np.exp(rng.normal(3.0, 1.5, num_users))),
+        rng.random(num_users)
+    ]).astype(np.float32)
+    return FeatureMatrix(np.ascontiguousarray(values), ['total_logs', 'error_rate'], pd.RangeIndex(num_users))
+
+
+@pytest.mark.parametrize('size', [1, 2, 5, 9, 10, 11, 100, 999])
+def test_stratified_sample_has_requested_size(size):
+    rows = volume_matrix().sample_rows(size, 42, 'total_logs', strata=10)
+    assert len(rows) == size
+    assert len(np.unique(rows)) == size
+    assert np.all(np.diff(rows) > 0)
+    assert rows.min() >= 0 and rows.max() < 1000
+
+
+def test_stratified_sample_covers_every_nonempty_stratum():
+    matrix = volume_matrix()
+    rows = matrix.sample_rows(50, 42, 'total_logs', strata=10)
+    keys = np.log1p(matrix.values[:, 0].astype(np.float64))
+    width = (keys.max() - keys.min()) / 10
+    bins = np.minimum(((keys - keys.min()) / width).astype(int), 9)
+    assert set(bins[rows]) == set(bins)
+
+
+def test_uniform_sample_and_whole_population():
+    matrix = volume_matrix()
+    assert len(matrix.sample_rows(5, 42)) == 5
+    assert np.array_equal(matrix.sample_rows(1000, 42, 'total_logs'), np.arange(1000))
+
+
+def test_sample_is_seeded():
+    matrix = volume_matrix()
+    assert np.array_equal(matrix.sample_rows(20, 7, 'total_logs'), matrix.sample_rows(20, 7, 'total_logs'))
+
+
+@pytest.mark.parametrize('sample_size', [0, -3, 2.5, True])
+def test_invalid_training_sample_size_is_rejected(sample_size):
+    before = dict(Config.MODEL_CONFIG)
+    with pytest.raises(ValueError):
+        Config.update_config({'model_config': {'training_sample_size': sample_size}})
+    assert Config.MODEL_CONFIG == before
+
+
+def test_fit_frame_without_feature_names_uses_feature_columns():
+    rng = np.random.default_rng(0)
+    feature_df = pd.DataFrame({
+        'user_id': [f"user{code}" for code in range(200)],
+        'window_start': np.arange(200),
+        'total_logs': rng.integers(1, 100, 200),
+        'error_rate': rng.random(200)
+    })
+    forest = ExtendedIsolationForest()
+    forest.fit(feature_df)
+    assert forest.feature_names == ['total_logs', 'error_rate']
+    assert len(forest.predict_anomaly_scores(feature_df)) == 200
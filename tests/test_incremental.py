@@ -0,0 +1,29 @@
+import os
+import shutil
+
+from config import Config
+from main import AnomalyDetectionFramework
+
+SAMPLE_LOGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_logs.txt')
+
+
+def profiled_stages(results):
+    return set(results['profile']['stages'])
+
+
+def test_retrain_reports_fit_stage(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config.INCREMENTAL_CONFIG, 'checkpoint_folder', str(tmp_path / 'checkpoints'))
+    log_file = str(tmp_path / 'logs.txt')
+    shutil.copy(SAMPLE_LOGS, log_file)
+
+    first = AnomalyDetectionFramework().process_logs_incremental([log_file])
+    assert first['incremental']['retrained']
+    assert 'fit' in profiled_stages(first)
+
+    retrained = AnomalyDetectionFramework().process_logs_incremental([log_file], retrain=True)
+    assert retrained['incremental']['retrain_reason'] == 'requested'
+    assert 'fit' in profiled_stages(retrained)
+
+    rescored = AnomalyDetectionFramework().process_logs_incremental([log_file])
+    assert not rescored['incremental']['retrained']
+    assert 'fit' not in profiled_stages(rescored)
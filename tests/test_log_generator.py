@@ -0,0 +1,13 @@
+import time
+
+from log_generator import SEEDED_END_TIME, SyntheticLogGenerator
+
+
+def test_same_seed_gives_same_file(tmp_path):
+    first = SyntheticLogGenerator(20, 30, seed=1)
+    first.write(str(tmp_path / 'first.txt'))
+    time.sleep(1.1)
+    second = SyntheticLogGenerator(20, 30, seed=1)
+    second.write(str(tmp_path / 'second.txt'))
+    assert first.end_time == second.end_time == SEEDED_END_TIME
+    assert (tmp_path / 'first.txt').read_bytes() == (tmp_path / 'second.txt').read_bytes()
@@ -0,0 +1,45 @@
+import logging
+
+from config import Config
+from log_parser import LogParserEngine, schema_for
+from log_readers import detect_format
+from main import LogPreprocessor
+
+TEXT_LINE = b'2025-06-11 01:01:25 user:user001 192.168.1.47 PUT /login status:201 time:1603ms\n'
+CSV_HEAD = b'timestamp,user,ip,action,path,status,latency_ms\n2025-06-11 01:01:25,u1,1.2.3.4,GET,/x,200,10\n'
+
+
+def test_csv_suffix_with_header_is_csv():
+    assert detect_format('logs.csv', CSV_HEAD, LogParserEngine(schema=schema_for())) == 'csv'
+    assert detect_format('logs.csv.gz', CSV_HEAD) == 'csv'
+
+
+def test_csv_suffix_in_text_layout_is_text():
+    assert detect_format('logs.csv', TEXT_LINE * 3, LogParserEngine(schema=schema_for())) == 'text'
+    # Without a parser the missing header alone decides
+    assert detect_format('logs.csv', TEXT_LINE * 3) == 'text'
+
+
+def test_sniffed_formats():
+    assert detect_format('logs.txt', TEXT_LINE) == 'text'
+    assert detect_format('upload', b'\n{"user": "u1"}\n') == 'jsonl'
+    assert detect_format('logs.jsonl', TEXT_LINE) == 'jsonl'
+
+
+def test_text_layout_csv_upload_is_parsed(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config.PARSE_CACHE_CONFIG, 'enabled', False)
+    log_file = tmp_path / 'logs.csv'
+    log_file.write_bytes(TEXT_LINE * 5)
+    store = LogPreprocessor().preprocess_log_files([str(log_file)])
+    assert store.num_rows == 5
+    assert len(store) == 1
+
+
+def test_file_without_records_warns(tmp_path, monkeypatch, caplog):
+    monkeypatch.setitem(Config.PARSE_CACHE_CONFIG, 'enabled', False)
+    log_file = tmp_path / 'logs.log'
+    log_file.write_bytes(b'not a log line\n')
+    with caplog.at_level(logging.WARNING):
+        store = LogPreprocessor().preprocess_log_files([str(log_file)])
+    assert store.num_rows == 0
+    assert 'No log records found' in caplog.text
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from main import AnomalyDetectionFramework
+
+
+def framework_with_results():
+    framework = AnomalyDetectionFramework()
+    # Users in the order they first appeared in the logs
+    framework.results = {
+        'features': pd.DataFrame({'user_id': ['user3', 'user1', 'user2']}),
+        'anomaly_scores': np.array([0.2, 0.9, 0.5]),
+        'threshold': 0.6
+    }
+    return framework
+
+
+def test_sort_by_user_id():
+    framework = framework_with_results()
+    total, positions = framework.query_users(sort='user_id')
+    assert total == 3
+    assert positions.tolist() == [1, 2, 0]
+
+
+def test_sort_by_log_order_and_score():
+    framework = framework_with_results()
+    assert framework.query_users(sort='log_order')[1].tolist() == [0, 1, 2]
+    assert framework.query_users(sort='score_desc')[1].tolist() == [1, 2, 0]
+    assert framework.query_users(sort='score_asc', classification='Normal')[1].tolist() == [0, 2]
+
+
+def test_reclassify_swaps_in_new_results():
+    framework = framework_with_results()
+    before = framework.results
+    summary = framework.reclassify(threshold=0.3)
+    assert summary['abnormal_users'] == 2
+    assert framework.results['abnormal_users'] == ['user1', 'user2']
+    assert framework.results['threshold'] == framework.threshold == 0.3
+    # Readers still holding the previous results see them unchanged
+    assert before['threshold'] == 0.6
+    assert before is not framework.results
+
+
+@pytest.mark.parametrize('kwargs', [{'threshold': '0.5'}, {'target_rate': '0.1'}, {'target_rate': True},
+                                    {'threshold': float('nan')}])
+def test_reclassify_rejects_non_numeric_values(kwargs):
+    framework = framework_with_results()
+    with pytest.raises(ValueError):
+        framework.reclassify(**kwargs)
+    assert framework.results['threshold'] == 0.6
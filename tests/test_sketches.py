@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from sketches import HeavyHitters, HyperLogLogSet, hash_integers
+
+DISTINCT_COUNTS = np.array([1, 50, 512, 513, 2000, 20000, 100000])
+
+
+def distinct_stream(seed=0):
+    """(user, value) pairs where user i has DISTINCT_COUNTS[i] distinct values, each repeated up to 3 times"""
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(len(DISTINCT_COUNTS)), DISTINCT_COUNTS)
+    values = np.concatenate([rng.choice(1 << 30, count, replace=False) for count in DISTINCT_COUNTS])
+    repeats = rng.integers(1, 4, len(values))
+    order = rng.permutation(repeats.sum())
+    return np.repeat(users, repeats)[order], np.repeat(values, repeats)[order]
+
+
+def test_hyperloglog_relative_error():
+    users, values = distinct_stream()
+    sketch = HyperLogLogSet(precision=12)
+    for chunk in np.array_split(np.arange(len(values)), 10):
+        sketch.add(users[chunk], hash_integers(values[chunk]))
+    counts = sketch.counts(len(DISTINCT_COUNTS))
+    exact = DISTINCT_COUNTS <= sketch.sparse_limit
+    assert np.array_equal(counts[exact], DISTINCT_COUNTS[exact])
+    assert np.max(np.abs(counts - DISTINCT_COUNTS) / DISTINCT_COUNTS) < 0.03
+
+
+def test_hyperloglog_merge_matches_single_set():
+    users, values = distinct_stream(seed=1)
+    single, left, right = HyperLogLogSet(), HyperLogLogSet(), HyperLogLogSet()
+    single.add(users, hash_integers(values))
+    half = len(values) // 2
+    left.add(users[:half], hash_integers(values[:half]))
+    right.add(users[half:], hash_integers(values[half:]))
+    left.merge(right, np.arange(len(DISTINCT_COUNTS)))
+    assert np.array_equal(left.counts(len(DISTINCT_COUNTS)), single.counts(len(DISTINCT_COUNTS)))
+
+
+def zipf_stream(num_users=20, per_user=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    users = np.repeat(np.arange(num_users), per_user)
+    values = np.minimum(rng.zipf(1.3, num_users * per_user), 1000) - 1
+    order = rng.permutation(len(users))
+    return users[order], values[order]
+
+
+def assert_within_bounds(summary, users, values):
+    for user in range(users.max() + 1):
+        true_counts = np.bincount(values[users == user])
+        total = true_counts.sum()
+        bound = summary.error_bound(user)
+        assert bound <= total / (summary.k + 1)
+        top = dict(summary.top(user))
+        for value, count in top.items():
+            assert true_counts[value] - bound <= count <= true_counts[value]
+        # Every value seen more than n / (k + 1) times is kept
+        frequent = np.flatnonzero(true_counts > total / (summary.k + 1))
+        assert set(frequent.tolist()) <= set(top)
+
+
+@pytest.mark.parametrize('chunks', [1, 7])
+def test_heavy_hitters_error_bound(chunks):
+    users, values = zipf_stream()
+    summary = HeavyHitters(k=10)
+    for chunk in np.array_split(np.arange(len(values)), chunks):
+        summary.add(users[chunk], values[chunk])
+    assert_within_bounds(summary, users, values)
+
+
+def test_heavy_hitters_merge_error_bound():
+    users, values = zipf_stream(seed=1)
+    half = len(values) // 2
+    left, right = HeavyHitters(k=10), HeavyHitters(k=10)
+    left.add(users[:half], values[:half])
+    right.add(users[half:], values[half:])
+    left.merge(right, np.arange(users.max() + 1), np.arange(values.max() + 1))
+    assert_within_bounds(left, users, values)
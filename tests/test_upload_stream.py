@@ -0,0 +1,52 @@
+import gzip
+import os
+
+import numpy as np
+
+from config import Config
+from feature_registry import build_feature_plan
+from main import LogPreprocessor
+from parse_cache import ParsedLogCache
+from upload_stream import UploadSession, PARSE_CACHE, PARSE_NONE
+
+SAMPLE_LOGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_logs.txt')
+
+
+def upload(path, data, **kwargs):
+    session = UploadSession(os.path.basename(path) + '.gz', path, None, 1000, **kwargs)
+    for start in range(0, len(data), 4096):
+        session.append(data[start:start + 4096])
+    session.finish()
+    return session
+
+
+def test_upload_fills_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config.PARSE_CACHE_CONFIG, 'enabled', False)
+    with open(SAMPLE_LOGS, 'rb') as f:
+        raw = f.read()
+    path = str(tmp_path / 'logs.txt')
+    cache = ParsedLogCache(str(tmp_path / 'cache'), 1 << 30)
+    session = upload(path, gzip.compress(raw), aggregate=False, cache=cache)
+    assert session.parse_mode == PARSE_CACHE
+
+    preprocessor = LogPreprocessor()
+    preprocessor.set_fields(build_feature_plan().fields)
+    expected = preprocessor.preprocess_log_files([path])
+    cached = cache.get(cache.key_for(path, preprocessor.parser.version), path)
+    assert cached is not None
+    # The hash was taken while the upload was written
+    assert cache.stats['bytes_hashed'] == 0
+    assert cached.vocabs == expected.vocabs
+    for name, column in expected.columns.items():
+        assert np.array_equal(cached.columns[name], column)
+
+
+def test_upload_without_streaming_or_cache_is_only_written(tmp_path):
+    path = str(tmp_path / 'logs.txt')
+    with open(SAMPLE_LOGS, 'rb') as f:
+        raw = f.read()
+    session = upload(path, gzip.compress(raw), aggregate=False)
+    assert session.parse_mode == PARSE_NONE
+    assert session.parse_seconds == 0.0
+    with open(path, 'rb') as f:
+        assert f.read() == raw
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_features import BatchFeatureExtractor
+from config import Config
+from log_generator import SyntheticLogGenerator
+from log_store import ColumnarLogStore
+from main import LogPreprocessor
+from windows import WindowedFeatureExtractor
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    log_file = str(tmp_path_factory.mktemp('logs') / 'logs.txt')
+    SyntheticLogGenerator(20, 60, seed=3, anomaly_mix={'mixed': 1, 'night_activity': 1}).write(log_file)
+    enabled = Config.PARSE_CACHE_CONFIG['enabled']
+    Config.PARSE_CACHE_CONFIG['enabled'] = False
+    try:
+        return LogPreprocessor().preprocess_log_files([log_file])
+    finally:
+        Config.PARSE_CACHE_CONFIG['enabled'] = enabled
+
+
+def batch_window_features(store, start, window_seconds):
+    """Batch features of the users with lines in [start, start + window_seconds)"""
+    timestamps = store.columns['timestamp']
+    in_window = (timestamps >= start) & (timestamps < start + window_seconds)
+    window_store = ColumnarLogStore({name: column[in_window] for name, column in store.columns.items()},
+                                    store.vocabs, store.sources, grouped=True)
+    features = BatchFeatureExtractor().extract(window_store)
+    return features[np.diff(window_store.user_offsets) > 0].set_index('user_id')
+
+
+@pytest.mark.parametrize('window_seconds,slide_seconds', [
+    (86400, None),
+    (86400, 3600 * 6),
+    (5400, 3600)
+])
+def test_window_features_match_batch_extraction(store, window_seconds, slide_seconds):
+    windows = WindowedFeatureExtractor(window_seconds, slide_seconds).extract(store)
+    assert len(windows)
+    for window_start, rows in windows.groupby('window_start'):
+        start = pd.Timestamp(window_start).value // 10**9
+        expected = batch_window_features(store, start, window_seconds)
+        got = rows.set_index('user_id')
+        assert sorted(got.index) == sorted(expected.index)
+        np.testing.assert_allclose(got[expected.columns].to_numpy(np.float64),
+                                   expected.loc[got.index].to_numpy(np.float64), rtol=1e-6, equal_nan=True)
+
+
+def test_sliding_windows_cover_every_line(store):
+    windows = WindowedFeatureExtractor(86400, 3600 * 6).extract(store)
+    # Each line falls in window / slide = 4 overlapping windows
+    assert windows['total_logs'].sum() == 4 * store.num_rows
@@ -0,0 +1,289 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+from config import Config
+from feature_registry import build_feature_plan
+from log_parser import LogParserEngine, schema_for
+from log_readers import READERS, detect_compression, detect_format, make_decompressor, strip_compression_suffix
+from log_store import LogColumnsBuilder
+from parse_cache import ParsedLogCache
+from streaming import StreamingFeatureAggregator
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_RECEIVING = 'receiving'
+UPLOAD_COMPLETED = 'completed'
+UPLOAD_FAILED = 'failed'
+
+# What an upload is parsed into while it arrives
+PARSE_AGGREGATES = 'aggregates'
+PARSE_CACHE = 'parse_cache'
+PARSE_NONE = 'none'
+
+
+class UploadSession:
+    """One resumable upload that is decompressed, written to disk and parsed as its chunks arrive.
+
+    The decompressed log is written to path, so byte offsets kept in the
+    aggregates refer to the stored file. Its format (text, CSV or JSON lines) is
+    detected from the file name or the first decompressed bytes. Chunks must
+    arrive in order; a client resumes by asking for the offset (compressed bytes
+    received) and sending the rest from there.
+
+    Lines are folded into streaming aggregates when a cache is not given
+    (PARSE_AGGREGATES). With a cache they are parsed into the exact columnar
+    store instead, which is put in the cache when the upload finishes, so the
+    next analysis of the file neither parses nor re-hashes it (PARSE_CACHE).
+    With aggregate=False and no cache the file is only written (PARSE_NONE).
+    """
+
+    def __init__(self, filename: str, path: str, parser: Optional[LogParserEngine], chunk_lines: int,
+                 aggregate: bool = True, cache: Optional[ParsedLogCache] = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.part_path = f"{path}.{self.id}.part"
+        self.chunk_lines = chunk_lines
+        self.status = UPLOAD_RECEIVING
+        self.error = None
+        self.compression = None
+        self.received = 0
+        self.written = 0
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.parse_seconds = 0.0
+        self.parse_mode = PARSE_AGGREGATES if aggregate else PARSE_CACHE if cache is not None else PARSE_NONE
+        self.cache = cache if self.parse_mode == PARSE_CACHE else None
+        self.digest = hashlib.sha256() if self.cache is not None else None
+
+        self.aggregates = None
+        self.builder = None
+        if self.parse_mode == PARSE_AGGREGATES:
+            self.aggregates = StreamingFeatureAggregator()
+            self.aggregates.sources.append(path)
+            self.builder = LogColumnsBuilder(self.aggregates.vocabs)
+        elif self.parse_mode == PARSE_CACHE:
+            self.builder = LogColumnsBuilder()
+        # Without a parser, the current Config.LOG_PATTERNS for the fields the feature plan needs
+        # (the parser an analysis of the file uses, so cache entries are keyed the same)
+        self.parser = parser or LogParserEngine(schema=schema_for(build_feature_plan().fields))
+        if self.aggregates is not None:
+            self.aggregates.parser_version = self.parser.version
+        self.tail = b''
+        self.file = open(self.part_path, 'wb')
+        self.lock = threading.Lock()
+        # (size, mtime) of the stored file, to tell whether the aggregates still describe it
+        self.file_signature = None
+        self.parsed_rows = None
+        self.reader = None
+        self._decompressor = None
+
+    def append(self, data: bytes) -> None:
+        """Decompress, store and parse the next chunk of the upload"""
+        if self.received == 0 and data:
+            self.compression = detect_compression(self.filename, data)
+            self._decompressor = make_decompressor(self.compression)
+        self.received += len(data)
+        self.updated_at = time.time()
+        self._consume(self._decompress(data))
+
+    def _decompress(self, data: bytes) -> bytes:
+        if self._decompressor is None:
+            return data
+        output = [self._decompressor.decompress(data)]
+        # Concatenated gzip members or zstd frames (e.g. from pigz or appended archives) start a new decompressor
+        while getattr(self._decompressor, 'eof', False) and self._decompressor.unused_data:
+            data = self._decompressor.unused_data
+            self._decompressor = make_decompressor(self.compression)
+            output.append(self._decompressor.decompress(data))
+        return b''.join(output)
+
+    def _consume(self, data: bytes, final: bool = False) -> None:
+        """Write decompressed bytes and parse every complete line (and the last line when final)"""
+        if not data and not (final and self.tail):
+            return
+        self.file.write(data)
+        if self.digest is not None:
+            self.digest.update(data)
+        if self.builder is None:
+            self.written += len(data)
+            return
+        start = time.perf_counter()
+
+        buffer = self.tail + data
+        if self.reader is None:
+            self.reader = READERS[detect_format(self.path, buffer, self.parser)](self.parser)
+        lines = buffer.split(b'\n')
+        self.tail = b'' if final else lines.pop()
+        # The buffer starts with the previous chunk's unfinished line
+        offset = self.written - (len(buffer) - len(data))
+        for i, line in enumerate(lines):
+            length = len(line) if final and i == len(lines) - 1 else len(line) + 1
+            fields = self.reader.parse_line(line.decode('utf-8', errors='replace')) if line.strip() else None
+            if fields is not None:
+                self.builder.append(fields, 0, offset, length)
+                if self.aggregates is not None and len(self.builder) >= self.chunk_lines:
+                    self.aggregates.fold(self.builder.to_arrays())
+                    self.builder = LogColumnsBuilder(self.aggregates.vocabs)
+            offset += length
+        self.written += len(data)
+        self.parse_seconds += time.perf_counter() - start
+
+    def finish(self) -> None:
+        """Flush the decompressor and the last line, then move the file into place"""
+        if self._decompressor is not None:
+            if self.compression in ('gzip', 'bz2') and not self._decompressor.eof:
+                raise ValueError(f"Truncated {self.compression} upload")
+            if hasattr(self._decompressor, 'flush'):
+                self._consume(self._decompressor.flush())
+        self._consume(b'', final=True)
+        self.file.close()
+        os.replace(self.part_path, self.path)
+
+        rows = None
+        if self.aggregates is not None:
+            if len(self.builder):
+                self.aggregates.fold(self.builder.to_arrays())
+            self.aggregates.file_offsets[self.path] = self.written
+            rows = self.aggregates.rows
+        elif self.cache is not None:
+            store = self.builder.build([self.path])
+            self.cache.record_hash(self.path, self.digest.hexdigest())
+            self.cache.put(self.cache.key_for(self.path, self.parser.version), store)
+            rows = store.num_rows
+        self.builder = None
+        self.parsed_rows = rows
+        if self.written and rows == 0:
+            logger.warning(f"No log records found in upload {self.filename}; check that it matches the log "
+                           f"patterns or has a header naming the fields")
+        self.status = UPLOAD_COMPLETED
+        self.updated_at = time.time()
+        stat = os.stat(self.path)
+        self.file_signature = (stat.st_size, stat.st_mtime_ns)
+
+    def abort(self, error: Optional[str] = None) -> None:
+        """Stop the upload and remove its partial file"""
+        self.status = UPLOAD_FAILED
+        self.error = error
+        self.aggregates = None
+        self.builder = None
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = {
+            'upload_id': self.id,
+            'filename': os.path.basename(self.path),
+            'status': self.status,
+            'offset': self.received,
+            'decompressed_bytes': self.written,
+            'compression': self.compression,
+            'parse_mode': self.parse_mode,
+            'parse_seconds': self.parse_seconds,
+            'error': self.error
+        }
+        if self.aggregates is not None:
+            summary['parsed_logs'] = self.aggregates.rows + (len(self.builder) if self.builder else 0)
+            summary['users'] = self.aggregates.num_users
+        elif self.parse_mode == PARSE_CACHE:
+            summary['parsed_logs'] = self.parsed_rows if self.builder is None else len(self.builder)
+        return summary
+
+
+class UploadManager:
+    """Tracks streaming upload sessions and keeps the aggregates of recently completed ones.
+
+    Each upload is folded into aggregates only while Config.STREAMING_CONFIG is
+    enabled, since only streaming analyses use them. Otherwise it is parsed into
+    the parse cache when that is enabled, or just written.
+    """
+
+    def __init__(self, upload_folder: str, parser: Optional[LogParserEngine], chunk_lines: int,
+                 max_completed: int = 8, session_timeout: float = 3600):
+        self.upload_folder = upload_folder
+        self.parser = parser
+        self.chunk_lines = chunk_lines
+        self.max_completed = max_completed
+        self.session_timeout = session_timeout
+        self.sessions: 'OrderedDict[str, UploadSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, filename: str) -> UploadSession:
+        """Start an upload; compressed files are stored under their decompressed name"""
+        path = os.path.join(self.upload_folder, strip_compression_suffix(filename))
+        cache_config = Config.PARSE_CACHE_CONFIG
+        cache = ParsedLogCache(cache_config['cache_folder'], cache_config['max_bytes']) if cache_config['enabled'] else None
+        session = UploadSession(filename, path, self.parser, self.chunk_lines,
+                                aggregate=Config.STREAMING_CONFIG['enabled'], cache=cache)
+        with self._lock:
+            self._prune()
+            self.sessions[session.id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        return self.sessions.get(upload_id)
+
+    def remove(self, upload_id: str) -> Optional[UploadSession]:
+        """Abort and forget an upload"""
+        with self._lock:
+            session = self.sessions.pop(upload_id, None)
+        if session is not None and session.status == UPLOAD_RECEIVING:
+            with session.lock:
+                session.abort('cancelled')
+        return session
+
+    def _prune(self) -> None:
+        """Abort stale uploads and forget the oldest completed ones beyond max_completed"""
+        now = time.time()
+        for upload_id, session in list(self.sessions.items()):
+            if session.status == UPLOAD_RECEIVING and now - session.updated_at > self.session_timeout:
+                logger.info(f"Upload {upload_id} timed out")
+                with session.lock:
+                    session.abort('timed out')
+            if session.status == UPLOAD_FAILED:
+                del self.sessions[upload_id]
+
+        completed = [upload_id for upload_id, session in self.sessions.items() if session.status == UPLOAD_COMPLETED]
+        for upload_id in completed[:max(len(completed) - self.max_completed, 0)]:
+            del self.sessions[upload_id]
+
+    def completed_aggregates(self, log_files: List[str]) -> Optional[StreamingFeatureAggregator]:
+        """Aggregates parsed during upload for exactly these files, or None if any file is missing or changed"""
+        latest = {}
+        for session in list(self.sessions.values()):
+            if session.status == UPLOAD_COMPLETED:
+                latest[os.path.abspath(session.path)] = session
+
+        parts = []
+        for log_file in log_files:
+            session = latest.get(os.path.abspath(log_file))
+            try:
+                stat = os.stat(log_file)
+            except OSError:
+                return None
+            if session is None or session.file_signature != (stat.st_size, stat.st_mtime_ns):
+                return None
+            if session.aggregates is None:
+                # Uploaded while streaming was disabled
+                return None
+            if not session.aggregates.matches_config():
+                # Folded before the feature groups or sketch mode changed
+                return None
+            parts.append(session.aggregates)
+
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        aggregates = StreamingFeatureAggregator()
+        for part in parts:
+            aggregates.merge(part)
+        return aggregates
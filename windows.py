@@ -0,0 +1,333 @@
+import logging
+import math
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Tuple
+
+from feature_registry import FEATURE_GROUPS, FeaturePlan, build_feature_plan
+from log_store import ColumnarLogStore, TIMESTAMP_MISSING, INT_MISSING
+
+logger = logging.getLogger(__name__)
+
+# Per-(pane, user) sums that can be added when a pane enters a window and subtracted when it leaves
+_SUM_FIELDS = [
+    'total', 'night', 'weekend', 'failed_login', 'delete', 'post', 'admin_access',
+    'error', 'success', 'rt_count', 'rt_sum', 'rt_sq', 'slow'
+]
+_DISTINCT_FIELDS = ['days', 'actions', 'resources', 'status_codes', 'ips']
+# Feature group that reads each distinct count
+_DISTINCT_GROUPS = {'days': 'time', 'actions': 'action', 'resources': 'resource', 'status_codes': 'status', 'ips': 'ip'}
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """np.unique by sorting, which is much faster than its hash-based path for large int64 arrays"""
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) else values
+
+
+def _unique_inverse(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted unique values and the position of each input value among them"""
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    is_new = np.r_[True, sorted_values[1:] != sorted_values[:-1]] if len(values) else np.zeros(0, dtype=bool)
+    positions = np.empty(len(values), dtype=np.int64)
+    positions[order] = np.cumsum(is_new) - 1
+    return sorted_values[is_new], positions
+
+
+def _group_sums(values: np.ndarray, order: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    return np.add.reduceat(values.astype(np.int64)[order], starts) if len(starts) else np.zeros(0, dtype=np.int64)
+
+
+class PaneAggregates:
+    """Partial aggregates of a store's timestamped lines per (pane, user), sorted by pane then user.
+
+    Panes are the slices of time that every window is a whole number of, so
+    each line is aggregated once however many windows it belongs to. Distinct
+    values are kept as (pane, key) entries, where a key is a (user, value) pair;
+    only the fields whose feature group is in plan get entries.
+    """
+
+    def __init__(self, store: ColumnarLogStore, origin: int, pane_seconds: int, plan: FeaturePlan):
+        columns = store.columns
+        n_users = len(store.vocabs['user_id'])
+        valid = columns['timestamp'] != TIMESTAMP_MISSING
+        self.skipped_lines = int(np.count_nonzero(~valid))
+
+        timestamps = columns['timestamp'][valid]
+        users = columns['user_id'][valid].astype(np.int64)
+        panes = (timestamps - origin) // pane_seconds
+        group_keys = panes * n_users + users
+
+        order = np.lexsort((timestamps, group_keys))
+        sorted_keys = group_keys[order]
+        sorted_timestamps = timestamps[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(order) else order
+        ends = np.r_[starts[1:], len(order)] - 1
+
+        self.pane = sorted_keys[starts] // max(n_users, 1)
+        self.user = sorted_keys[starts] % max(n_users, 1)
+        self.first = sorted_timestamps[starts]
+        self.last = sorted_timestamps[ends]
+
+        # Largest gap between consecutive lines inside each group, -1 for single-line groups
+        gaps = np.diff(sorted_timestamps).astype(np.float64)
+        gaps[sorted_keys[1:] != sorted_keys[:-1]] = -1.0
+        self.gap = np.full(len(starts), -1.0)
+        multi = ends > starts
+        if multi.any():
+            self.gap[multi] = np.maximum.reduceat(gaps, starts[multi])
+
+        days = timestamps // 86400
+        hours = (timestamps // 3600) % 24
+        actions = columns['action'][valid]
+        action_vocab = store.vocabs['action']
+        resources = columns['resource'][valid]
+        is_admin = np.array(['/admin' in resource for resource in store.vocabs['resource']] + [False])
+        status = columns['status_code'][valid]
+        has_status = status != INT_MISSING
+        response_times = columns['response_time'][valid]
+        has_rt = response_times != INT_MISSING
+        rt = np.where(has_rt, response_times, 0).astype(np.int64)
+
+        def action_is(action: str) -> np.ndarray:
+            if action not in action_vocab:
+                return np.zeros(len(actions), dtype=bool)
+            return actions == action_vocab.index(action)
+
+        indicators = {
+            'total': np.ones(len(timestamps), dtype=bool),
+            'night': (hours >= 22) | (hours <= 6),
+            'weekend': (days + 3) % 7 >= 5,  # 1970-01-01 was a Thursday
+            'failed_login': action_is('FAILED_LOGIN'),
+            'delete': action_is('DELETE'),
+            'post': action_is('POST'),
+            'admin_access': is_admin[resources],
+            'error': has_status & (status >= 400),
+            'success': has_status & (status < 400),
+            'rt_count': has_rt,
+            'rt_sum': rt,
+            # Integer sums keep adding and subtracting panes exact
+            'rt_sq': rt * rt,
+            'slow': has_rt & (rt > 5000)
+        }
+        self.sums = {field: _group_sums(indicators[field], order, starts) for field in _SUM_FIELDS}
+        self.rt_max = np.fmax.reduceat(np.where(has_rt, rt, np.nan)[order], starts) if len(starts) else np.zeros(0)
+        self.has_response_times = bool(has_rt.any())
+
+        # Distinct (pane, user, value) entries per field
+        distinct_values = {
+            'days': (np.ones(len(days), dtype=bool), days),
+            'actions': (actions >= 0, actions),
+            'resources': (resources >= 0, resources),
+            'status_codes': (has_status, status),
+            'ips': (columns['ip_address'][valid] >= 0, columns['ip_address'][valid])
+        }
+        self.distinct: Dict[str, Dict[str, np.ndarray]] = {}
+        for field, (present, values) in distinct_values.items():
+            if _DISTINCT_GROUPS[field] not in plan:
+                continue
+            pair_keys = (users[present] << 32) | (values[present].astype(np.int64) & 0xFFFFFFFF)
+            keys, key_positions = _unique_inverse(pair_keys)
+            entries = _sorted_unique(panes[present] * max(len(keys), 1) + key_positions)
+            self.distinct[field] = {
+                'pane': entries // max(len(keys), 1),
+                'key': entries % max(len(keys), 1),
+                'key_user': keys >> 32
+            }
+
+    def group_range(self, first_pane: int, end_pane: int) -> Tuple[int, int]:
+        """Group rows of panes [first_pane, end_pane)"""
+        return int(np.searchsorted(self.pane, first_pane)), int(np.searchsorted(self.pane, end_pane))
+
+
+class WindowedFeatureExtractor:
+    """Computes the per-user features of every tumbling or sliding time window of a ColumnarLogStore.
+
+    Windows of window_seconds start every slide_seconds (slide_seconds equal to
+    window_seconds, the default, gives tumbling windows), aligned to multiples
+    of the slide since the epoch. Lines are aggregated once per pane of
+    gcd(window, slide) seconds. As the window advances, the panes that enter it
+    are added to the running per-user sums and distinct-value counts and the
+    panes that leave it are subtracted, so each step costs time proportional to
+    the panes that changed. Maximum response time, first/last timestamps and
+    idle gaps cannot be subtracted and are recombined from the window's panes.
+
+    Features match UserFeatureExtractor applied to the lines of each window
+    (lines without a timestamp belong to no window). One row is produced per
+    user and window containing at least one of the user's lines.
+    """
+
+    def __init__(self, window_seconds: int, slide_seconds: int = None):
+        slide_seconds = slide_seconds or window_seconds
+        if window_seconds <= 0 or slide_seconds <= 0:
+            raise ValueError('Window and slide lengths must be positive')
+        if slide_seconds > window_seconds:
+            raise ValueError('The slide cannot be longer than the window')
+        self.window_seconds = int(window_seconds)
+        self.slide_seconds = int(slide_seconds)
+        self.pane_seconds = math.gcd(self.window_seconds, self.slide_seconds)
+        self.stats = {'windows': 0, 'panes': 0, 'skipped_lines': 0}
+
+    def extract(self, store: ColumnarLogStore, plan: FeaturePlan = None) -> pd.DataFrame:
+        """Extract the features in plan of every (user, window) pair, with window_start and window_end columns"""
+        if plan is None:
+            plan = build_feature_plan()
+        valid = store.columns['timestamp'] != TIMESTAMP_MISSING
+        if not valid.any():
+            return pd.DataFrame(columns=plan.features + ['user_id', 'window_start', 'window_end'])
+
+        origin = int(store.columns['timestamp'][valid].min()) // self.slide_seconds * self.slide_seconds
+        panes = PaneAggregates(store, origin, self.pane_seconds, plan)
+        slide_panes = self.slide_seconds // self.pane_seconds
+        window_panes = self.window_seconds // self.pane_seconds
+        n_users = len(store.vocabs['user_id'])
+
+        sums = {field: np.zeros(n_users, dtype=np.int64) for field in _SUM_FIELDS}
+        distinct_counts = {field: np.zeros(n_users, dtype=np.int64) for field in _DISTINCT_FIELDS}
+        key_counts = {field: np.zeros(len(entries['key_user']), dtype=np.int64)
+                      for field, entries in panes.distinct.items()}
+
+        def apply(first_pane: int, end_pane: int, sign: int) -> None:
+            """Add (sign 1) or subtract (sign -1) panes [first_pane, end_pane) from the running state"""
+            if end_pane <= first_pane:
+                return
+            start, stop = panes.group_range(first_pane, end_pane)
+            users = panes.user[start:stop]
+            for field in _SUM_FIELDS:
+                np.add.at(sums[field], users, sign * panes.sums[field][start:stop])
+
+            for field, entries in panes.distinct.items():
+                start, stop = np.searchsorted(entries['pane'], [first_pane, end_pane])
+                keys, counts = np.unique(entries['key'][start:stop], return_counts=True)
+                before = key_counts[field][keys]
+                key_counts[field][keys] += sign * counts
+                # A key counts towards its user's distinct values while any pane in the window holds it
+                if sign > 0:
+                    changed = keys[before == 0]
+                else:
+                    changed = keys[key_counts[field][keys] == 0]
+                np.add.at(distinct_counts[field], entries['key_user'][changed], sign)
+
+        parts = []
+        current = None
+        for window in self._windows(_sorted_unique(panes.pane), slide_panes, window_panes):
+            first_pane = window * slide_panes
+            end_pane = first_pane + window_panes
+            if current is None:
+                apply(first_pane, end_pane, 1)
+            else:
+                apply(current[0], min(current[1], first_pane), -1)
+                apply(max(current[1], first_pane), end_pane, 1)
+            current = (first_pane, end_pane)
+
+            start, stop = panes.group_range(first_pane, end_pane)
+            if stop > start:
+                window_start = origin + window * self.slide_seconds
+                parts.append(self._window_features(panes, start, stop, sums, distinct_counts, window_start))
+
+        self.stats = {'windows': len(parts), 'panes': int(len(_sorted_unique(panes.pane))),
+                      'skipped_lines': panes.skipped_lines}
+        logger.info(f"Extracted features for {sum(len(part['user_id']) for part in parts)} user windows "
+                    f"in {len(parts)} windows of {self.window_seconds}s (slide {self.slide_seconds}s)")
+
+        # Sliding windows can produce many rows per user, so the parts are moved column by column
+        # into one float matrix (feature rows stored column-major) that the frame wraps without copying
+        response_time_features = next(group.features for group in FEATURE_GROUPS if group.name == 'response_time')
+        feature_names = [name for name in plan.features
+                         if panes.has_response_times or name not in response_time_features]
+        matrix = np.empty((len(feature_names), sum(len(part['user_id']) for part in parts)))
+        for row, name in enumerate(feature_names):
+            np.concatenate([part.pop(name) for part in parts], out=matrix[row])
+        user_codes = np.concatenate([part['user_id'] for part in parts])
+        window_starts = np.concatenate([part['window_start'] for part in parts])
+        del parts
+
+        feature_df = pd.DataFrame(matrix.T, columns=feature_names, copy=False)
+        # Categorical, as a user appears in many windows
+        feature_df['user_id'] = pd.Categorical.from_codes(user_codes, categories=store.vocabs['user_id'])
+        feature_df['window_start'] = pd.to_datetime(window_starts, unit='s')
+        feature_df['window_end'] = pd.to_datetime(window_starts + self.window_seconds, unit='s')
+        return feature_df
+
+    @staticmethod
+    def _windows(nonempty_panes: np.ndarray, slide_panes: int, window_panes: int) -> List[int]:
+        """Indices of the windows that contain at least one non-empty pane, in order"""
+        # Window w covers panes [w * slide_panes, w * slide_panes + window_panes)
+        first = -((window_panes - 1 - nonempty_panes) // slide_panes)
+        last = nonempty_panes // slide_panes
+        counts = last - first + 1
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return _sorted_unique(np.repeat(first, counts) + offsets).tolist()
+
+    def _window_features(self, panes: PaneAggregates, start: int, stop: int, sums, distinct_counts,
+                         window_start: int) -> Dict[str, np.ndarray]:
+        # Groups are in pane (time) order; a stable sort by user keeps each user's panes in time order
+        order = np.argsort(panes.user[start:stop], kind='stable') + start
+        users = panes.user[order]
+        heads = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        tails = np.r_[heads[1:], len(users)] - 1
+        active = users[heads]
+
+        first = panes.first[order][heads]
+        last = panes.last[order][tails]
+        # Panes do not overlap in time, so the largest gap is inside a pane or between consecutive panes
+        between = (panes.first[order][1:] - panes.last[order][:-1]).astype(np.float64)
+        between[users[1:] != users[:-1]] = -1.0
+        gaps = np.maximum(panes.gap[order], np.r_[-1.0, between])
+        max_gap = np.maximum.reduceat(gaps, heads)
+        rt_max = np.fmax.reduceat(panes.rt_max[order], heads)
+
+        state = {field: values[active] for field, values in sums.items()}
+        counts = {field: values[active] for field, values in distinct_counts.items()}
+        total = state['total']
+        denominator = total.astype(np.float64)
+        rt_count = state['rt_count']
+        rt_mean = state['rt_sum'] / np.maximum(rt_count, 1)
+        rt_variance = (state['rt_sq'] - state['rt_sum'] * rt_mean) / np.maximum(rt_count - 1, 1)
+
+        return {
+            'total_logs': total,
+            'unique_days': counts['days'],
+            'avg_logs_per_day': total / np.maximum(counts['days'], 1),
+            'night_activity_ratio': state['night'] / denominator,
+            'weekend_activity_ratio': state['weekend'] / denominator,
+            'failed_login_ratio': state['failed_login'] / denominator,
+            'delete_ratio': state['delete'] / denominator,
+            'admin_action_ratio': state['post'] / denominator,
+            'unique_actions': counts['actions'],
+            'unique_resources': counts['resources'],
+            'admin_access_ratio': state['admin_access'] / denominator,
+            'resource_diversity': counts['resources'] / denominator,
+            'error_rate': state['error'] / denominator,
+            'success_rate': state['success'] / denominator,
+            'unique_status_codes': counts['status_codes'],
+            'avg_response_time': np.where(rt_count > 0, rt_mean, np.nan),
+            'max_response_time': np.where(rt_count > 0, rt_max, np.nan),
+            'response_time_std': np.where(rt_count > 1, np.sqrt(np.maximum(rt_variance, 0.0)),
+                                          np.where(rt_count == 1, 0.0, np.nan)),
+            'slow_requests_ratio': np.where(rt_count > 0, state['slow'] / np.maximum(rt_count, 1), np.nan),
+            'unique_ips': counts['ips'],
+            'ip_diversity': counts['ips'] / denominator,
+            'avg_session_length': np.where(total > 1, (last - first) / np.maximum(total - 1, 1), 0.0),
+            'max_idle_time': np.where(total > 1, np.maximum(max_gap, 0.0), 0.0),
+            'user_id': active,
+            'window_start': np.full(len(active), window_start, dtype=np.int64)
+        }
+
+
+def user_window_series(window_df: pd.DataFrame, scores: np.ndarray, threshold: float,
+                       user_id: str) -> List[Dict[str, Any]]:
+    """Get one user's window scores in time order"""
+    user_ids = window_df['user_id'].cat.categories
+    if user_id not in user_ids:
+        return []
+    rows = np.flatnonzero(window_df['user_id'].cat.codes.to_numpy() == user_ids.get_loc(user_id))
+    starts = window_df['window_start'].iloc[rows].dt.strftime('%Y-%m-%dT%H:%M:%S').tolist()
+    ends = window_df['window_end'].iloc[rows].dt.strftime('%Y-%m-%dT%H:%M:%S').tolist()
+    total_logs = window_df['total_logs'].to_numpy()[rows].tolist()
+    return [
+        {'window_start': start, 'window_end': end, 'total_logs': int(count), 'score': float(score),
+         'classification': 'Abnormal' if score > threshold else 'Normal'}
+        for start, end, count, score in zip(starts, ends, total_logs, scores[rows].tolist())
+    ]